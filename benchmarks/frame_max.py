@@ -0,0 +1,192 @@
+"""
+Publish and consume throughput across ``frame_max`` settings and message sizes.
+
+The broker is faked in memory, so the numbers only measure asynqp's own
+overhead: splitting bodies into frames and writing them when publishing,
+parsing frames and assembling bodies when consuming.
+
+    python benchmarks/frame_max.py [--frame-max N ...] [--body-size N ...] [--volume BYTES]
+"""
+import argparse
+import asyncio
+import time
+
+import asynqp
+from asynqp import frames, message, protocol, routing, spec
+from asynqp.connection import open_connection
+
+
+class FakeBroker(object):
+    """
+    Answers the handshake and, once consuming, delivers messages in
+    batches as they are acked
+    """
+    read_size = 256 * 1024
+
+    def __init__(self, loop, body_size, batch=16):
+        self.loop = loop
+        self.protocol = None
+        self.reader = protocol.FrameReader()
+        self.body = b'x' * body_size
+        self.batch = batch
+        self.frame_max = None
+        self.deliveries = None
+        self.remaining = 0
+        self.in_flight = 0
+        # Don't spend time parsing what is published
+        self.swallow = False
+
+    # transport interface
+    def write(self, data):
+        if self.swallow:
+            return
+        if data.startswith(b'AMQP'):
+            self.send_method(0, spec.ConnectionStart(0, 9, {}, 'PLAIN AMQPLAIN', 'en_US'))
+            return
+        for frame in self.reader.read_frames(data):
+            if isinstance(frame, frames.MethodFrame):
+                self.handle(frame.channel_id, frame.payload)
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def handle(self, channel_id, method):
+        reply = {
+            # No limits of its own, the client's preferences win
+            spec.ConnectionStartOK: lambda: spec.ConnectionTune(0, 0, 0),
+            spec.ConnectionOpen: lambda: spec.ConnectionOpenOK(''),
+            spec.ConnectionClose: lambda: spec.ConnectionCloseOK(),
+            spec.ChannelOpen: lambda: spec.ChannelOpenOK(''),
+            spec.QueueDeclare: lambda: spec.QueueDeclareOK(method.queue, 0, 0),
+            spec.BasicConsume: lambda: spec.BasicConsumeOK('bench'),
+            spec.BasicCancel: lambda: spec.BasicCancelOK(method.consumer_tag),
+        }.get(type(method))
+        if isinstance(method, spec.ConnectionTuneOK):
+            self.frame_max = method.frame_max
+        if reply is not None:
+            self.loop.call_soon(self.send_method, channel_id, reply())
+        if isinstance(method, spec.BasicConsume):
+            self.deliveries = b''.join(
+                self.delivery(channel_id, tag) for tag in range(1, self.batch + 1))
+            self.loop.call_soon(self.pump)
+        elif isinstance(method, spec.BasicAck):
+            self.in_flight -= 1
+            if not self.in_flight:
+                self.loop.call_soon(self.pump)
+
+    def send_method(self, channel_id, method):
+        self.protocol.data_received(frames.MethodFrame(channel_id, method).serialise())
+
+    def delivery(self, channel_id, delivery_tag):
+        msg = asynqp.Message(self.body)
+        header = message.get_header_payload(msg, spec.BasicDeliver.method_type[0])
+        return b''.join([
+            frames.MethodFrame(channel_id, spec.BasicDeliver(
+                'bench', delivery_tag, False, '', 'bench')).serialise(),
+            frames.ContentHeaderFrame(channel_id, header).serialise(),
+        ] + [
+            frames.ContentBodyFrame(channel_id, payload).serialise()
+            for payload in message.get_frame_payloads(msg, self.frame_max - 8)
+        ])
+
+    def pump(self):
+        if self.remaining <= 0:
+            return
+        self.in_flight = self.batch
+        self.remaining -= self.batch
+        # In reads no bigger than the event loop's
+        for i in range(0, len(self.deliveries), self.read_size):
+            self.protocol.data_received(self.deliveries[i:i + self.read_size])
+
+
+async def open_fake_connection(loop, broker, frame_max):
+    dispatcher = routing.Dispatcher()
+    amqp = protocol.AMQP(dispatcher, loop)
+    broker.protocol = amqp
+    amqp.connection_made(broker)
+    return await open_connection(
+        loop, broker, amqp, dispatcher,
+        {'username': 'guest', 'password': 'guest', 'virtual_host': '/',
+         'frame_max': frame_max})
+
+
+async def publish(loop, frame_max, body_size, count):
+    broker = FakeBroker(loop, body_size)
+    connection = await open_fake_connection(loop, broker, frame_max)
+    channel = await connection.open_channel()
+    exchange = await channel.declare_exchange('', 'direct')
+    msg = asynqp.Message(b'x' * body_size)
+
+    broker.swallow = True
+    start = time.perf_counter()
+    for _ in range(count):
+        exchange.publish(msg, 'bench')
+    elapsed = time.perf_counter() - start
+    broker.swallow = False
+
+    await connection.close()
+    return elapsed
+
+
+async def consume(loop, frame_max, body_size, count):
+    broker = FakeBroker(loop, body_size)
+    connection = await open_fake_connection(loop, broker, frame_max)
+    channel = await connection.open_channel()
+    queue = await channel.declare_queue('bench')
+    done = asyncio.Future(loop=loop)
+    received = 0
+
+    def on_message(msg):
+        nonlocal received
+        msg.ack()
+        received += 1
+        if received == count:
+            done.set_result(None)
+
+    # Round up to whole batches, the extra messages are not counted
+    broker.remaining = count + broker.batch
+    start = time.perf_counter()
+    consumer = await queue.consume(on_message)
+    await done
+    elapsed = time.perf_counter() - start
+
+    broker.remaining = 0
+    await consumer.cancel()
+    await connection.close()
+    return elapsed
+
+
+def report(kind, frame_max, body_size, count, elapsed):
+    print("{:8} frame_max={:<8} {:>9} byte messages: {:9.0f} msgs/sec {:8.1f} MB/sec".format(
+        kind, frame_max, body_size, count / elapsed, count * body_size / elapsed / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frame-max', type=int, nargs='+', default=[4096, 131072, 1048576])
+    parser.add_argument('--body-size', type=int, nargs='+', default=[1000, 100000, 10000000])
+    parser.add_argument('--volume', type=int, default=200000000,
+                        help="bytes of message bodies to send per run")
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for body_size in args.body_size:
+        count = min(100000, max(16, args.volume // body_size))
+        for frame_max in args.frame_max:
+            elapsed = loop.run_until_complete(publish(loop, frame_max, body_size, count))
+            report('publish', frame_max, body_size, count, elapsed)
+            elapsed = loop.run_until_complete(consume(loop, frame_max, body_size, count))
+            report('consume', frame_max, body_size, count, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Per-publish CPU of Exchange.publish against a prepared Publisher.
+
+The broker is faked in memory and what is published is thrown away, so
+the numbers only measure asynqp's own work of building and writing frames.
+
+    python benchmarks/prepared_publish.py [--count N] [--body-size N]
+"""
+import argparse
+import asyncio
+import time
+
+import asynqp
+from frame_max import FakeBroker, open_fake_connection
+
+PROPERTIES = {
+    'content_type': 'application/json',
+    'delivery_mode': 2,
+    'headers': {'source': 'benchmark'},
+}
+
+
+async def run(loop, count, body_size):
+    broker = FakeBroker(loop, body_size)
+    connection = await open_fake_connection(loop, broker, 131072)
+    channel = await connection.open_channel()
+    exchange = await channel.declare_exchange('', 'direct')
+    body = b'x' * body_size
+
+    broker.swallow = True
+    start = time.perf_counter()
+    for _ in range(count):
+        exchange.publish(asynqp.Message(body, **PROPERTIES), 'bench')
+    plain = time.perf_counter() - start
+
+    publisher = exchange.prepare_publisher('bench', **PROPERTIES)
+    start = time.perf_counter()
+    for _ in range(count):
+        publisher.publish(body)
+    prepared = time.perf_counter() - start
+    broker.swallow = False
+
+    await connection.close()
+    return plain, prepared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--body-size', type=int, default=100)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    plain, prepared = loop.run_until_complete(run(loop, args.count, args.body_size))
+    for kind, elapsed in (('publish', plain), ('prepared', prepared)):
+        print("{:8} {:9.0f} msgs/sec {:6.2f} us/msg".format(
+            kind, args.count / elapsed, elapsed / args.count * 1e6))
+    print("{:.1f}x less time per publish".format(plain / prepared))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Throughput of ``async for msg in consumer`` on a saturated stream.
+
+The broker is faked in memory, so the numbers only measure asynqp's own
+overhead: frame parsing, message assembly and handing messages to the consumer.
+
+    python benchmarks/queued_consumer.py [--messages N] [--body-size N] [--prefetch N]
+"""
+import argparse
+import asyncio
+import time
+
+import asynqp
+from asynqp import frames, message, protocol, routing, spec
+from asynqp.connection import open_connection
+
+
+class FakeBroker(object):
+    """
+    Answers the handshake, then keeps ``prefetch`` unacked deliveries in flight,
+    like a broker with ``basic.qos`` would
+    """
+    def __init__(self, loop, body_size, prefetch, batch=64):
+        self.loop = loop
+        self.protocol = None
+        self.reader = protocol.FrameReader()
+        self.paused = False
+        self.streaming = False
+        self.prefetch = prefetch
+        self.in_flight = 0
+        self.batch = batch
+        self.body = b'x' * body_size
+        self.deliveries = None
+
+    # transport interface
+    def write(self, data):
+        if data.startswith(b'AMQP'):
+            self.send_method(0, spec.ConnectionStart(0, 9, {}, 'PLAIN AMQPLAIN', 'en_US'))
+            return
+        for frame in self.reader.read_frames(data):
+            if isinstance(frame, frames.MethodFrame):
+                self.handle(frame.channel_id, frame.payload)
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+        self.loop.call_soon(self.pump)
+
+    def close(self):
+        pass
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def handle(self, channel_id, method):
+        reply = {
+            spec.ConnectionStartOK: lambda: spec.ConnectionTune(0, 131072, 0),
+            spec.ConnectionOpen: lambda: spec.ConnectionOpenOK(''),
+            spec.ConnectionClose: lambda: spec.ConnectionCloseOK(),
+            spec.ChannelOpen: lambda: spec.ChannelOpenOK(''),
+            spec.ChannelClose: lambda: spec.ChannelCloseOK(),
+            spec.QueueDeclare: lambda: spec.QueueDeclareOK(method.queue, 0, 0),
+            spec.BasicConsume: lambda: spec.BasicConsumeOK('bench'),
+            spec.BasicCancel: lambda: spec.BasicCancelOK(method.consumer_tag),
+        }.get(type(method))
+        if reply is not None:
+            self.loop.call_soon(self.send_method, channel_id, reply())
+        if isinstance(method, spec.BasicConsume):
+            self.deliveries = b''.join(
+                self.delivery(channel_id, tag) for tag in range(1, self.batch + 1))
+            self.streaming = True
+            self.loop.call_soon(self.pump)
+        elif isinstance(method, spec.BasicCancel):
+            self.streaming = False
+        elif isinstance(method, spec.BasicAck):
+            self.in_flight -= 1
+            if self.in_flight == self.prefetch // 2:
+                self.loop.call_soon(self.pump)
+
+    def send_method(self, channel_id, method):
+        self.protocol.data_received(frames.MethodFrame(channel_id, method).serialise())
+
+    def delivery(self, channel_id, delivery_tag):
+        msg = asynqp.Message(self.body)
+        header = message.get_header_payload(msg, spec.BasicDeliver.method_type[0])
+        return b''.join([
+            frames.MethodFrame(channel_id, spec.BasicDeliver(
+                'bench', delivery_tag, False, '', 'bench')).serialise(),
+            frames.ContentHeaderFrame(channel_id, header).serialise(),
+            frames.ContentBodyFrame(channel_id, msg.body).serialise(),
+        ])
+
+    def pump(self):
+        while self.streaming and not self.paused and self.in_flight < self.prefetch:
+            self.in_flight += self.batch
+            self.protocol.data_received(self.deliveries)
+
+
+async def run(loop, count, body_size, prefetch):
+    broker = FakeBroker(loop, body_size, prefetch)
+    dispatcher = routing.Dispatcher()
+    amqp = protocol.AMQP(dispatcher, loop)
+    broker.protocol = amqp
+    amqp.connection_made(broker)
+    connection = await open_connection(
+        loop, broker, amqp, dispatcher,
+        {'username': 'guest', 'password': 'guest', 'virtual_host': '/'})
+
+    channel = await connection.open_channel()
+    queue = await channel.declare_queue('bench')
+    consumer = await queue.queued_consumer()
+
+    received = 0
+    start = time.perf_counter()
+    async for msg in consumer:
+        msg.ack()
+        received += 1
+        if received == count:
+            break
+    elapsed = time.perf_counter() - start
+
+    await consumer.cancel()
+    await connection.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--body-size', type=int, default=64)
+    parser.add_argument('--prefetch', type=int, default=1024)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    elapsed = loop.run_until_complete(run(loop, args.messages, args.body_size, args.prefetch))
+    print("{} messages of {} bytes in {:.2f}s: {:.0f} msgs/sec".format(
+        args.messages, args.body_size, elapsed, args.messages / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+'''
+Example consumer and publisher on a connection which recovers by itself.
+The queue, its binding and the consumer are restored after
+the connection to rabbitmq is broken and comes back.
+Note that no attempt is made to re-send messages that are
+generated while the connection is down.
+'''
+import asyncio
+import asynqp
+
+
+def on_message(msg):
+    print('Received: {}'.format(msg.body.decode()))
+    msg.ack()
+
+
+@asyncio.coroutine
+def start(loop):
+    connection = yield from asynqp.connect_recovering(
+        'localhost', 5672, username='guest', password='guest', loop=loop)
+    channel = yield from connection.open_channel()
+    exchange = yield from channel.declare_exchange('test.exchange', 'direct')
+    queue = yield from channel.declare_queue('test.queue')
+    yield from queue.bind(exchange, 'test.routing.key')
+    yield from queue.consume(on_message)
+
+    while True:
+        if connection.is_recovering():
+            print('Connection lost, waiting for it to recover')
+            yield from connection.wait_recovered()
+        exchange.publish(asynqp.Message('hello'), 'test.routing.key')
+        yield from asyncio.sleep(1, loop=loop)
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(start(loop))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,25 @@
 import socket
 import asyncio
 from .exceptions import *  # noqa
-from .message import Message, IncomingMessage
+from .message import Message, IncomingMessage, BodyStream
 from .connection import Connection
-from .channel import Channel
-from .exchange import Exchange
-from .queue import Queue, QueueBinding, Consumer, QueuedConsumer
+from .channel import Channel, DeclaredTopology, DeclarationCache
+from .exchange import Exchange, Publisher
+from .queue import Queue, QueueBinding, Consumer, QueuedConsumer, ExecutorConsumer
+from .sharedmem import SharedMemoryPool
+from .pool import ChannelPool, ConnectionPool
+from .poller import QueuePoller
+from .recovery import RecoveringConnection
+from .rpc import RpcClient, RpcServer, LatencyHistogram
 
 
 __all__ = [
-    "Message", "IncomingMessage",
-    "Connection", "Channel", "Exchange", "Queue",
-    "QueueBinding", "Consumer", "QueuedConsumer",
-    "connect", "connect_and_open_channel"
+    "Message", "IncomingMessage", "BodyStream",
+    "Connection", "Channel", "DeclaredTopology", "DeclarationCache", "Exchange", "Publisher", "Queue",
+    "QueueBinding", "Consumer", "QueuedConsumer", "ExecutorConsumer",
+    "SharedMemoryPool", "ChannelPool", "ConnectionPool", "QueuePoller", "RecoveringConnection",
+    "RpcClient", "RpcServer", "LatencyHistogram",
+    "connect", "connect_and_open_channel", "connect_pool", "connect_recovering"
 ]
 __all__ += exceptions.__all__
 
@@ -22,7 +29,8 @@ def connect(host='localhost',
             port=5672,
             username='guest', password='guest',
             virtual_host='/', *,
-            loop=None, sock=None, **kwargs):
+            loop=None, sock=None, declaration_cache=False,
+            frame_max=None, channel_max=None, heartbeat=None, **kwargs):
     """
     Connect to an AMQP server on the given host and port.
 
@@ -39,6 +47,18 @@ def connect(host='localhost',
     :keyword socket sock: A :func:`~socket.socket` instance to use for the connection.
         This is passed on to :meth:`loop.create_connection() <asyncio.BaseEventLoop.create_connection>`.
         If ``sock`` is supplied then ``host`` and ``port`` will be ignored.
+    :keyword bool declaration_cache: If true, exchanges and queues which are declared
+        again with the same arguments are not re-declared on the broker.
+        See :class:`DeclarationCache`.
+    :keyword int frame_max: the largest frame size in bytes to agree to. The broker
+        proposes its own limit, and the lower of the two is used. Large frames suit
+        bulk transfers, small ones keep big messages from holding up others on the
+        connection. Defaults to the broker's proposal.
+    :keyword int channel_max: the most channels to agree to. The lower of this and
+        the broker's limit is used. Defaults to the broker's proposal.
+    :keyword int heartbeat: the heartbeat interval in seconds. The lower of this and
+        the broker's proposal is used, ``0`` turns heartbeats off.
+        Defaults to the broker's proposal.
 
     Further keyword arguments are passed on to :meth:`loop.create_connection() <asyncio.BaseEventLoop.create_connection>`.
 
@@ -46,12 +66,16 @@ def connect(host='localhost',
 
     :return: the :class:`Connection` object.
     """
+    from . import spec
     from .protocol import AMQP
     from .routing import Dispatcher
     from .connection import open_connection
 
     loop = asyncio.get_event_loop() if loop is None else loop
 
+    if frame_max is not None and frame_max < spec.FRAME_MIN_SIZE:
+        raise ValueError("frame_max must be at least {}".format(spec.FRAME_MIN_SIZE))
+
     if sock is None:
         kwargs['host'] = host
         kwargs['port'] = port
@@ -74,7 +98,11 @@ def connect(host='localhost',
     connection_info = {
         'username': username,
         'password': password,
-        'virtual_host': virtual_host
+        'virtual_host': virtual_host,
+        'declaration_cache': declaration_cache,
+        'frame_max': frame_max,
+        'channel_max': channel_max,
+        'heartbeat': heartbeat
     }
     connection = yield from open_connection(
         loop, transport, protocol, dispatcher, connection_info)
@@ -104,3 +132,82 @@ def connect_and_open_channel(host='localhost',
     connection = yield from connect(host, port, username, password, virtual_host, loop=loop, **kwargs)
     channel = yield from connection.open_channel()
     return connection, channel
+
+
+@asyncio.coroutine
+def connect_pool(size,
+                 host='localhost',
+                 port=5672,
+                 username='guest', password='guest',
+                 virtual_host='/', *,
+                 addresses=None, policy='least_buffered',
+                 retry_interval=1, return_handler=None,
+                 loop=None, **kwargs):
+    """
+    Open a :class:`ConnectionPool` of ``size`` connections to one or more AMQP servers.
+    This function is a :ref:`coroutine <coroutine>`.
+
+    Parameters not listed here are the same as :func:`connect`.
+
+    :param int size: the number of connections in the pool.
+    :keyword list addresses: ``(host, port)`` pairs of broker nodes. Connections
+        are spread over them, and a lost connection is re-established to the next
+        node in the list. Defaults to ``[(host, port)]``.
+    :keyword str policy: ``'least_buffered'`` or ``'round_robin'``.
+        See :attr:`ConnectionPool.policy`.
+    :keyword float retry_interval: the delay in seconds between attempts to
+        replace a lost connection.
+    :keyword callable return_handler: set as the return handler
+        (see :meth:`Channel.set_return_handler`) of the channels used by
+        :meth:`ConnectionPool.publish`.
+
+    :return: the :class:`ConnectionPool` object.
+    """
+    loop = asyncio.get_event_loop() if loop is None else loop
+    if addresses is None:
+        addresses = [(host, port)]
+
+    @asyncio.coroutine
+    def connect_member(index, attempt):
+        host, port = addresses[(index + attempt) % len(addresses)]
+        return (yield from connect(
+            host, port, username, password, virtual_host, loop=loop, **kwargs))
+
+    pool = ConnectionPool(
+        connect_member, size, policy=policy, retry_interval=retry_interval,
+        return_handler=return_handler, loop=loop)
+    yield from pool.open()
+    return pool
+
+
+@asyncio.coroutine
+def connect_recovering(host='localhost',
+                       port=5672,
+                       username='guest', password='guest',
+                       virtual_host='/', *,
+                       min_delay=0.1, max_delay=30,
+                       loop=None, **kwargs):
+    """
+    Connect to an AMQP server, and reconnect whenever the connection is lost.
+    This function is a :ref:`coroutine <coroutine>`.
+
+    Parameters not listed here are the same as :func:`connect`.
+
+    :keyword float min_delay: the delay in seconds before the second attempt to
+        reconnect. The first one is made right away.
+    :keyword float max_delay: the delay doubles with each failed attempt,
+        up to this many seconds.
+
+    :return: the :class:`RecoveringConnection` object.
+    """
+    loop = asyncio.get_event_loop() if loop is None else loop
+
+    @asyncio.coroutine
+    def reconnect():
+        return (yield from connect(
+            host, port, username, password, virtual_host, loop=loop, **kwargs))
+
+    connection = RecoveringConnection(
+        reconnect, min_delay=min_delay, max_delay=max_delay, loop=loop)
+    yield from connection.open()
+    return connection
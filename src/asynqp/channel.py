@@ -1,4 +1,7 @@
 import asyncio
+import collections
+import copy
+import heapq
 import re
 
 from . import frames
@@ -8,13 +11,16 @@ from . import exceptions
 from . import exchange
 from . import message
 from . import routing
+from . import rpc
 from .exceptions import (
-    UndeliverableMessage, AMQPError, ChannelClosed)
+    UndeliverableMessage, AMQPError, AMQPChannelError, ChannelClosed)
 from .log import log
 
 
 VALID_QUEUE_NAME_RE = re.compile(r'^(?!amq\.)(\w|[-.:])*$', flags=re.A)
 VALID_EXCHANGE_NAME_RE = re.compile(r'^(?!amq\.)(\w|[-.:])+$', flags=re.A)
+# Channel ids are 16 bit, a `channel_max` of 0 means no limit
+MAX_CHANNEL_ID = 65535
 
 
 class Channel(object):
@@ -27,6 +33,12 @@ class Channel(object):
 
     Channels are created using :meth:`Connection.open_channel() <Connection.open_channel>`.
 
+    Several coroutines can use a channel at once. Their synchronous methods
+    (declarations, bindings, deletes and so on) are all sent right away,
+    and the replies are handed back in the order the methods were sent, so
+    the calls don't wait for each other's round trips. Cancelling one of the
+    calls doesn't disturb the others.
+
     .. attribute::id
 
         the numerical ID of the channel
@@ -76,18 +88,19 @@ class Channel(object):
         if name == '':
             return exchange.Exchange(self.reader, self.synchroniser, self.sender, name, 'direct', True, False, False)
 
-        if not VALID_EXCHANGE_NAME_RE.match(name):
-            raise ValueError(
-                "Invalid exchange name.\n"
-                "Valid names consist of letters, digits, hyphen, underscore, "
-                "period, or colon, and do not begin with 'amq.'")
-
-        self.sender.send_ExchangeDeclare(
-            name, type, passive, durable, auto_delete, internal, nowait,
-            arguments or {})
-        if not nowait:
-            yield from self.synchroniser.await(spec.ExchangeDeclareOK)
-            self.reader.ready()
+        _check_exchange_name(name)
+
+        arguments = arguments or {}
+        cache = self.sender.cache_for(auto_delete, arguments)
+        declaration = (type, passive, durable, auto_delete, internal, arguments)
+        if cache is None or not cache.is_declared('exchange', name, declaration):
+            self.sender.send_ExchangeDeclare(
+                name, type, passive, durable, auto_delete, internal, nowait,
+                arguments)
+            if not nowait:
+                yield from self.synchroniser.await(spec.ExchangeDeclareOK)
+                if cache is not None:
+                    cache.declared('exchange', name, declaration)
         ex = exchange.Exchange(
             self.reader, self.synchroniser, self.sender, name, type, durable,
             auto_delete, internal)
@@ -123,6 +136,99 @@ class Channel(object):
             arguments if arguments is not None else {})
         return q
 
+    @asyncio.coroutine
+    def declare_topology(self, *, exchanges=(), queues=(), bindings=()):
+        """
+        Declare many exchanges, queues and bindings at once.
+
+        All the declarations are sent to the broker right away, and only then
+        are their -OK replies awaited, so the whole topology costs a single
+        round trip instead of one per declaration.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :keyword exchanges: dicts of keyword arguments to :meth:`declare_exchange`
+            (without ``nowait``), for example ``{'name': 'my.exchange', 'type': 'topic'}``.
+        :keyword queues: dicts of keyword arguments to :meth:`declare_queue`
+            (without ``nowait``), for example ``{'name': 'my.queue', 'durable': False}``.
+        :keyword bindings: dicts with the keys ``queue``, ``exchange``, ``routing_key``
+            and optionally ``arguments``. ``queue`` and ``exchange`` are either the
+            name of one declared in the same call, or a :class:`Queue` or
+            :class:`Exchange` object.
+
+        Exchanges are declared first, then queues, then bindings.
+        The broker closes the channel when it refuses a declaration, and
+        ignores everything sent after it. Errors are therefore not raised but
+        reported in :attr:`DeclaredTopology.errors`.
+
+        :return: a :class:`DeclaredTopology`
+        """
+        # Check everything before sending anything, so a typo doesn't leave
+        # half of the topology declared
+        steps = []
+        exchange_names = set()
+        for item in exchanges:
+            args = _exchange_declaration(**item)
+            _check_exchange_name(args[0])
+            exchange_names.add(args[0])
+            steps.append((item, spec.ExchangeDeclareOK, self.sender.send_ExchangeDeclare, args))
+        queue_names = set()
+        for item in queues:
+            args = _queue_declaration(**item)
+            queue._check_queue_name(args[0])
+            # A server-generated name can't be referred to in a binding
+            if args[0]:
+                queue_names.add(args[0])
+            steps.append((item, spec.QueueDeclareOK, self.sender.send_QueueDeclare, args))
+        for item in bindings:
+            args = _binding(**item)
+            for name_or_object, names in ((item['queue'], queue_names),
+                                          (item['exchange'], exchange_names)):
+                if isinstance(name_or_object, str) and name_or_object not in names:
+                    raise ValueError(
+                        "{!r} is not declared by this call".format(name_or_object))
+            steps.append((item, spec.QueueBindOK, self.sender.send_QueueBind, args))
+
+        futures = []
+        for item, ok_method, send, args in steps:
+            send(*args)
+            futures.append(self.synchroniser.await(ok_method))
+
+        topology = DeclaredTopology()
+        for (item, ok_method, _, args), fut in zip(steps, futures):
+            try:
+                result = yield from fut
+            except AMQPError as exc:
+                # The channel is closed, all declarations after this one
+                # fail with the same error
+                topology.errors.append((item, exc))
+                continue
+
+            if ok_method is spec.ExchangeDeclareOK:
+                name, type, passive, durable, auto_delete, internal, _, arguments = args
+                topology.exchanges[name] = exchange.Exchange(
+                    self.reader, self.synchroniser, self.sender, name, type,
+                    durable, auto_delete, internal)
+                cache = self.sender.cache_for(auto_delete, arguments)
+                if cache is not None:
+                    cache.declared('exchange', name, (
+                        type, passive, durable, auto_delete, internal, arguments))
+            elif ok_method is spec.QueueDeclareOK:
+                name, durable, exclusive, auto_delete, passive, _, arguments = args
+                topology.queues[result] = self.queue_factory.create(
+                    result, durable, exclusive, auto_delete, arguments)
+                cache = self.sender.cache_for(auto_delete, arguments)
+                if cache is not None and name:
+                    cache.declared('queue', name, (
+                        durable, exclusive, auto_delete, passive, arguments))
+            else:
+                topology.bindings.append(queue.QueueBinding(
+                    self.reader, self.sender, self.synchroniser,
+                    _lookup(topology.queues, item['queue']),
+                    _lookup(topology.exchanges, item['exchange']),
+                    item['routing_key']))
+        return topology
+
     @asyncio.coroutine
     def set_qos(self, prefetch_size=0, prefetch_count=0, apply_globally=False):
         """
@@ -151,7 +257,6 @@ class Channel(object):
         """
         self.sender.send_BasicQos(prefetch_size, prefetch_count, apply_globally)
         yield from self.synchroniser.await(spec.BasicQosOK)
-        self.reader.ready()
 
     def set_return_handler(self, handler):
         """
@@ -167,6 +272,53 @@ class Channel(object):
         """
         self.basic_return_consumer.set_callback(handler)
 
+    @asyncio.coroutine
+    def rpc_client(self, *, timeout=None):
+        """
+        Start an :class:`RpcClient` on this channel.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :keyword float timeout: the default timeout of a call in seconds,
+            ``None`` to wait for replies forever.
+
+        :return: the :class:`RpcClient`
+        """
+        client = rpc.RpcClient(self, timeout=timeout, loop=self._loop)
+        yield from client.start()
+        return client
+
+    @asyncio.coroutine
+    def rpc_server(self, queue, handler, *, concurrency=16, executor=None,
+                   requeue_on_error=False):
+        """
+        Start an :class:`RpcServer` answering the requests on ``queue``.
+
+        The channel's prefetch count is set to ``concurrency`` (see :meth:`set_qos`),
+        so the broker doesn't deliver requests the server won't handle yet.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :param Queue queue: the queue to consume requests from. It must have been
+            declared on this channel.
+        :param callable handler: a coroutine function accepting a request
+            (an :class:`~asynqp.message.IncomingMessage`) and returning the reply.
+            With an ``executor`` it is a plain function, run in the executor.
+            A reply of ``None`` means no reply.
+        :keyword int concurrency: the maximum number of requests handled at once.
+        :keyword concurrent.futures.Executor executor: an executor to run ``handler`` in.
+        :keyword bool requeue_on_error: If true, requests for which the handler
+            raised are requeued by the broker.
+
+        :return: the :class:`RpcServer`
+        """
+        yield from self.set_qos(prefetch_count=concurrency)
+        server = rpc.RpcServer(
+            self, handler, concurrency=concurrency, executor=executor,
+            requeue_on_error=requeue_on_error, loop=self._loop)
+        server._set_consumer_handle((yield from queue._consume(server)))
+        return server
+
     def is_closed(self):
         return self._closing or self._closed
 
@@ -180,6 +332,8 @@ class Channel(object):
         # If we aren't already closed ask for server to close
         if not self.is_closed():
             self._closing = True
+            # A full consumer must not hold back the CloseOK
+            self.reader.drain()
             # Let the ChannelActor do the actual close operations.
             # It will do the work on CloseOK
             try:
@@ -195,27 +349,156 @@ class Channel(object):
                 log.warn("Called `close` on already closing channel...")
 
 
+class DeclaredTopology(object):
+    """
+    The result of :meth:`Channel.declare_topology`.
+
+    .. attribute:: exchanges
+
+        a dict of the declared :class:`Exchanges <Exchange>` by name
+
+    .. attribute:: queues
+
+        a dict of the declared :class:`Queues <Queue>` by name.
+        Queues with a server-generated name are stored under that name.
+
+    .. attribute:: bindings
+
+        a list of the declared :class:`QueueBindings <QueueBinding>`
+
+    .. attribute:: errors
+
+        a list of ``(item, exception)`` pairs, for the items which were not declared.
+        The first one is the item which the broker refused. The broker closed the
+        channel then, so the items after it failed with the same exception.
+    """
+    def __init__(self):
+        self.exchanges = {}
+        self.queues = {}
+        self.bindings = []
+        self.errors = []
+
+
+def _check_exchange_name(name):
+    if not VALID_EXCHANGE_NAME_RE.match(name):
+        raise ValueError(
+            "Invalid exchange name.\n"
+            "Valid names consist of letters, digits, hyphen, underscore, "
+            "period, or colon, and do not begin with 'amq.'")
+
+
+# Turn the items passed to `declare_topology` into arguments for the sender,
+# with the same defaults as `declare_exchange`, `declare_queue` and `bind`
+
+def _exchange_declaration(name, type, *, durable=True, auto_delete=False,
+                          passive=False, internal=False, arguments=None):
+    return (name, type, passive, durable, auto_delete, internal, False,
+            arguments or {})
+
+
+def _queue_declaration(name='', *, durable=True, exclusive=False,
+                       auto_delete=False, passive=False, arguments=None):
+    return (name, durable, exclusive, auto_delete, passive, False,
+            arguments if arguments is not None else {})
+
+
+def _binding(queue, exchange, routing_key, *, arguments=None):
+    return (_name(queue), _name(exchange), routing_key, False, arguments or {})
+
+
+def _name(name_or_object):
+    if isinstance(name_or_object, str):
+        return name_or_object
+    return name_or_object.name
+
+
+def _lookup(declared, name_or_object):
+    if isinstance(name_or_object, str):
+        return declared[name_or_object]
+    return name_or_object
+
+
+class DeclarationCache(object):
+    """
+    Remembers the exchanges and queues which were successfully declared on
+    a connection, and the arguments they were declared with. Declaring one
+    of them again with the very same arguments returns right away, without
+    a round trip to the broker.
+
+    An exchange or queue is forgotten when it is deleted. The whole cache
+    is cleared when the broker closes a channel with an error, since the
+    broker's state may have changed behind our back. A new connection
+    starts with an empty cache.
+
+    Exchanges and queues which the broker may delete by itself are never
+    cached: those declared with ``auto_delete=True``, and queues with an
+    ``x-expires`` argument. Neither are server-named queues.
+
+    Enabled by passing ``declaration_cache=True`` to :func:`asynqp.connect() <connect>`.
+    """
+    def __init__(self):
+        # (kind, name) -> arguments of the declaration
+        self._declared = {}
+
+    def is_declared(self, kind, name, declaration):
+        key = (kind, name)
+        return key in self._declared and self._declared[key] == declaration
+
+    def declared(self, kind, name, declaration):
+        # Copy, so later changes to an `arguments` dict can't leak in
+        self._declared[(kind, name)] = copy.deepcopy(declaration)
+
+    def forget(self, kind, name):
+        self._declared.pop((kind, name), None)
+
+    def clear(self):
+        """ Forget all declarations """
+        self._declared.clear()
+
+
 class ChannelFactory(object):
-    def __init__(self, loop, protocol, dispatcher, connection_info):
+    def __init__(self, loop, protocol, dispatcher, connection_info,
+                 declaration_cache=None):
         self.loop = loop
         self.protocol = protocol
         self.dispatcher = dispatcher
         self.connection_info = connection_info
+        self.declaration_cache = declaration_cache
         self.next_channel_id = 0
+        # Ids of closed channels, lowest first
+        self.free_channel_ids = []
+
+    def allocate_id(self):
+        if self.free_channel_ids:
+            return heapq.heappop(self.free_channel_ids)
+        channel_max = self.connection_info.get('channel_max') or MAX_CHANNEL_ID
+        if self.next_channel_id >= channel_max:
+            raise AMQPError(
+                "Can't open more than channel_max={} channels".format(channel_max))
+        self.next_channel_id += 1
+        return self.next_channel_id
+
+    def release_id(self, channel_id):
+        """ The channel is closed on both ends, its id can be reused """
+        self.dispatcher.remove_handler(channel_id)
+        self.protocol.update_reading()
+        heapq.heappush(self.free_channel_ids, channel_id)
 
     @asyncio.coroutine
     def open(self):
-        self.next_channel_id += 1
-        channel_id = self.next_channel_id
+        channel_id = self.allocate_id()
         synchroniser = routing.Synchroniser(loop=self.loop)
 
-        sender = ChannelMethodSender(channel_id, self.protocol, self.connection_info)
+        sender = ChannelMethodSender(
+            channel_id, self.protocol, self.connection_info,
+            self.declaration_cache)
         basic_return_consumer = BasicReturnConsumer(loop=self.loop)
         consumers = queue.Consumers(self.loop)
         consumers.add_consumer(basic_return_consumer)
 
         actor = ChannelActor(synchroniser, sender, loop=self.loop)
-        reader = routing.QueuedReader(actor, loop=self.loop)
+        reader = routing.QueuedReader(
+            actor, loop=self.loop, flow_control=self.protocol)
 
         queue_factory = queue.QueueFactory(
             sender, synchroniser, reader, consumers, loop=self.loop)
@@ -227,21 +510,21 @@ class ChannelFactory(object):
         actor.message_receiver = MessageReceiver(synchroniser, sender, consumers, reader)
         actor.consumers = consumers
         actor.channel = channel
+        actor.channel_factory = self
+        actor.reader = reader
 
         self.dispatcher.add_handler(channel_id, reader.feed)
+        # A new channel must be able to read its ChannelOpenOK
+        self.protocol.update_reading()
         try:
             sender.send_ChannelOpen()
             reader.ready()
             yield from synchroniser.await(spec.ChannelOpenOK)
         except:
-            # don't rollback self.next_channel_id;
-            # another call may have entered this method
-            # concurrently while we were yielding
-            # and we don't want to end up with duplicate channels.
-            # If we leave self.next_channel_id incremented, the worst
-            # that happens is we end up with non-sequential channel numbers.
-            # Small price to pay to keep this method re-entrant.
+            # Don't reuse the id: if we gave up waiting, the server may still
+            # answer to the ChannelOpen on it.
             self.dispatcher.remove_handler(channel_id)
+            self.protocol.update_reading()
             raise
 
         reader.ready()
@@ -255,6 +538,8 @@ class ChannelActor(routing.Actor):
         self.channel = None
         self.consumers = None
         self.message_receiver = None
+        self.channel_factory = None
+        self.reader = None
 
     def handle(self, frame):
         # From docs on `close`:
@@ -267,45 +552,71 @@ class ChannelActor(routing.Actor):
             if isinstance(frame.payload, close_methods) or isinstance(frame, frames.PoisonPillFrame):
                 return super().handle(frame)
             else:
+                # Read on, the CloseOK may be right behind it
+                self.reader.ready()
                 return
         return super().handle(frame)
 
+    # Replies to synchronous methods. Several requests may be in flight on
+    # the channel, the synchroniser wakes them in the order they were sent.
+    #
+    # Most replies only carry a result, so we read on right away and don't
+    # wait for the request's coroutine to be scheduled.
+    # After the others the coroutine has to set up some state before the
+    # next frame may be handled, it calls `ready()` itself. Unless it was
+    # cancelled and won't.
+
+    def _notify(self, method, result=None):
+        self.synchroniser.notify(method, result)
+        self.reader.ready()
+
+    def _notify_and_hold(self, method, result=None):
+        if not self.synchroniser.notify(method, result):
+            self.reader.ready()
+
     def handle_ChannelOpenOK(self, frame):
         self.synchroniser.notify(spec.ChannelOpenOK)
 
     def handle_QueueDeclareOK(self, frame):
-        self.synchroniser.notify(spec.QueueDeclareOK, frame.payload.queue)
+        self._notify(spec.QueueDeclareOK, frame.payload.queue)
 
     def handle_ExchangeDeclareOK(self, frame):
-        self.synchroniser.notify(spec.ExchangeDeclareOK)
+        self._notify(spec.ExchangeDeclareOK)
 
     def handle_ExchangeDeleteOK(self, frame):
-        self.synchroniser.notify(spec.ExchangeDeleteOK)
+        self._notify(spec.ExchangeDeleteOK)
 
     def handle_QueueBindOK(self, frame):
-        self.synchroniser.notify(spec.QueueBindOK)
+        self._notify(spec.QueueBindOK)
 
     def handle_QueueUnbindOK(self, frame):
-        self.synchroniser.notify(spec.QueueUnbindOK)
+        self._notify(spec.QueueUnbindOK)
 
     def handle_QueuePurgeOK(self, frame):
-        self.synchroniser.notify(spec.QueuePurgeOK)
+        self._notify(spec.QueuePurgeOK)
 
     def handle_QueueDeleteOK(self, frame):
-        self.synchroniser.notify(spec.QueueDeleteOK)
+        self._notify(spec.QueueDeleteOK)
 
     def handle_BasicGetEmpty(self, frame):
+        self.sender.pending_gets.popleft()
         # Send result=None to notify Empty message
-        self.synchroniser.notify(spec.BasicGetEmpty, None)
+        self._notify_and_hold(spec.BasicGetEmpty, None)
 
     def handle_BasicConsumeOK(self, frame):
-        self.synchroniser.notify(spec.BasicConsumeOK, frame.payload.consumer_tag)
+        tag = frame.payload.consumer_tag
+        if not self.synchroniser.notify(spec.BasicConsumeOK, tag):
+            # The `consume` call was cancelled, don't leave the consumer
+            # running on the broker
+            queue._abandon_consumer(
+                tag, self.consumers, self.sender, self.synchroniser,
+                self.reader, loop=self._loop)
 
     def handle_BasicCancelOK(self, frame):
-        self.synchroniser.notify(spec.BasicCancelOK)
+        self._notify_and_hold(spec.BasicCancelOK)
 
     def handle_BasicQosOK(self, frame):
-        self.synchroniser.notify(spec.BasicQosOK)
+        self._notify(spec.BasicQosOK)
 
     # Message receiving hanlers
 
@@ -345,8 +656,14 @@ class ChannelActor(routing.Actor):
         # No need for additional checks
 
         self.sender.send_CloseOK()
+        if self.sender.declaration_cache is not None:
+            self.sender.declaration_cache.clear()
         exc = exceptions._get_exception_type(frame.payload.reply_code)
         self._close_all(exc)
+        # If we sent a Close too, the server will still answer it with
+        # a CloseOK on this channel
+        if not self.channel._closing:
+            self.channel_factory.release_id(self.channel.id)
 
     def handle_ChannelCloseOK(self, frame):
         """ AMQP server closed channel as per our request """
@@ -356,16 +673,21 @@ class ChannelActor(routing.Actor):
 
         exc = ChannelClosed()
         self._close_all(exc)
+        self.channel_factory.release_id(self.channel.id)
 
     def _close_all(self, exc):
         # Make sure all `close` calls don't deadlock
         self.channel._closed = True
+        # Nothing is waiting for this channel's frames anymore
+        self.reader.drain()
         # If there were anyone who expected an `*-OK` kill them, as no data
         # will follow after close. Any new calls should also raise an error.
         self.synchroniser.killall(exc)
         self.sender.killall(exc)
         # Cancel all consumers with same error
         self.consumers.error(exc)
+        if self.message_receiver is not None:
+            self.message_receiver.error(exc)
 
 
 class MessageReceiver(object):
@@ -376,6 +698,7 @@ class MessageReceiver(object):
         self.reader = reader
         self.message_builder = None
         self.is_getok_message = None
+        self.get_no_ack = None
 
     def receive_getOK(self, frame):
         payload = frame.payload
@@ -388,6 +711,7 @@ class MessageReceiver(object):
         )
         # Send message to synchroniser when done
         self.is_getok_message = True
+        self.get_no_ack = self.sender.pending_gets.popleft()
         self.reader.ready()
 
     def receive_deliver(self, frame):
@@ -398,7 +722,9 @@ class MessageReceiver(object):
             payload.redelivered,
             payload.exchange,
             payload.routing_key,
-            payload.consumer_tag
+            payload.consumer_tag,
+            self.consumers.get_body_allocator(payload.consumer_tag),
+            self.consumers.get_body_stream(payload.consumer_tag)
         )
         # Delivers message to consumers when done
         self.is_getok_message = False
@@ -422,18 +748,36 @@ class MessageReceiver(object):
     def receive_header(self, frame):
         assert self.message_builder is not None, "Received unexpected header"
         self.message_builder.set_header(frame.payload)
+        if self.message_builder.stream is not None:
+            # Streamed bodies are read by the consumer as they arrive
+            builder = self.message_builder
+            self.consumers.deliver(builder.consumer_tag, builder.build())
+            if builder.done():
+                builder.body._feed_eof()
+                self.message_builder = None
         self.reader.ready()
 
     def receive_body(self, frame):
         assert self.message_builder is not None, "Received unexpected body"
         self.message_builder.add_body_chunk(frame.payload)
+        if self.message_builder.stream is not None:
+            if self.message_builder.done():
+                self.message_builder.body._feed_eof()
+                self.message_builder = None
+            # The stream pauses the reader if too much of it is unread
+            self.reader.ready()
+            return
         if self.message_builder.done():
             msg = self.message_builder.build()
             tag = self.message_builder.consumer_tag
             if self.is_getok_message:
-                self.synchroniser.notify(spec.BasicGetOK, (tag, msg))
                 # Dont call ready() if message arrive after GetOk. It's the
-                # ``Queue.get`` method's responsibility
+                # ``Queue.get`` method's responsibility, unless it was cancelled
+                if not self.synchroniser.notify(spec.BasicGetOK, (tag, msg)):
+                    # Nobody is going to get it, so it goes back to the queue
+                    if not self.get_no_ack:
+                        self.sender.send_BasicReject(msg.delivery_tag, True)
+                    self.reader.ready()
             else:
                 self.consumers.deliver(tag, msg)
                 self.reader.ready()
@@ -443,11 +787,48 @@ class MessageReceiver(object):
         # If message is not done yet we still need more frames. Wait for them
         self.reader.ready()
 
+    def error(self, exc):
+        builder = self.message_builder
+        if builder is not None and isinstance(builder.body, message.BodyStream):
+            # The rest of the body will never arrive
+            builder.body._set_exception(exc)
+            self.message_builder = None
+
 
 class ChannelMethodSender(routing.Sender):
-    def __init__(self, channel_id, protocol, connection_info):
+    # Roughly how many bytes of a streamed body to send per write
+    stream_write_size = 256 * 1024
+
+    def __init__(self, channel_id, protocol, connection_info,
+                 declaration_cache=None):
         super().__init__(channel_id, protocol)
         self.connection_info = connection_info
+        self.declaration_cache = declaration_cache
+        # Frames sent while a body is being streamed, which must not come
+        # between the body's frames. None when not streaming.
+        self._held = None
+        self._stream_lock = None
+        # no_ack of every BasicGet not answered yet, oldest first
+        self.pending_gets = collections.deque()
+
+    def send_method(self, method):
+        if self._held is not None and self._exception is None:
+            self._held.append(frames.MethodFrame(self.channel_id, method))
+            return
+        super().send_method(method)
+
+    def send_frames(self, frames):
+        if self._held is not None and self._exception is None:
+            self._held.extend(frames)
+            return
+        super().send_frames(frames)
+
+    def cache_for(self, auto_delete, arguments):
+        """ The declaration cache for a declaration, None if it must not be cached """
+        # The broker deletes auto-delete and expiring declarations by itself
+        if auto_delete or 'x-expires' in arguments:
+            return None
+        return self.declaration_cache
 
     def send_ChannelOpen(self):
         self.send_method(spec.ChannelOpen(''))
@@ -456,13 +837,15 @@ class ChannelMethodSender(routing.Sender):
         self.send_method(spec.ExchangeDeclare(0, name, type, passive, durable, auto_delete, internal, nowait, arguments))
 
     def send_ExchangeDelete(self, name, if_unused):
+        if self.declaration_cache is not None:
+            self.declaration_cache.forget('exchange', name)
         self.send_method(spec.ExchangeDelete(0, name, if_unused, False))
 
     def send_QueueDeclare(self, name, durable, exclusive, auto_delete, passive, nowait, arguments):
         self.send_method(spec.QueueDeclare(0, name, passive, durable, exclusive, auto_delete, nowait, arguments))
 
-    def send_QueueBind(self, queue_name, exchange_name, routing_key, arguments):
-        self.send_method(spec.QueueBind(0, queue_name, exchange_name, routing_key, False, arguments))
+    def send_QueueBind(self, queue_name, exchange_name, routing_key, nowait, arguments):
+        self.send_method(spec.QueueBind(0, queue_name, exchange_name, routing_key, nowait, arguments))
 
     def send_QueueUnbind(self, queue_name, exchange_name, routing_key, arguments):
         self.send_method(spec.QueueUnbind(0, queue_name, exchange_name, routing_key, arguments))
@@ -471,11 +854,68 @@ class ChannelMethodSender(routing.Sender):
         self.send_method(spec.QueuePurge(0, queue_name, False))
 
     def send_QueueDelete(self, queue_name, if_unused, if_empty):
+        if self.declaration_cache is not None:
+            self.declaration_cache.forget('queue', queue_name)
         self.send_method(spec.QueueDelete(0, queue_name, if_unused, if_empty, False))
 
     def send_BasicPublish(self, exchange_name, routing_key, mandatory, message):
-        self.send_method(spec.BasicPublish(0, exchange_name, routing_key, mandatory, False))
-        self.send_content(message)
+        self.send_frames(self.publish_frames(exchange_name, routing_key, mandatory, message))
+
+    @asyncio.coroutine
+    def send_BasicPublishStream(self, exchange_name, routing_key, mandatory, msg, source):
+        if self._stream_lock is None:
+            self._stream_lock = asyncio.Lock(loop=self.protocol._loop)
+        with (yield from self._stream_lock):
+            if self._exception is not None:
+                raise self._exception
+            self._held = []
+            try:
+                yield from self._stream_body(exchange_name, routing_key, mandatory, msg, source)
+            finally:
+                held, self._held = self._held, None
+            if held:
+                self.send_frames(held)
+
+    @asyncio.coroutine
+    def _stream_body(self, exchange_name, routing_key, mandatory, msg, source):
+        method = spec.BasicPublish(0, exchange_name, routing_key, mandatory, False)
+        header_payload = message.ContentHeaderPayload(
+            spec.BasicPublish.method_type[0], source.length, list(msg._properties.values()))
+        batch = [frames.MethodFrame(self.channel_id, method),
+                 frames.ContentHeaderFrame(self.channel_id, header_payload)]
+        frame_body_size = self.connection_info['frame_max'] - 8
+        remaining = source.length
+        if not remaining:
+            yield from _check_source_ended(source)
+            self.protocol.send_frames(batch)
+            return
+
+        started = False
+        try:
+            while remaining:
+                chunk = yield from source.read(min(frame_body_size, remaining))
+                if not chunk:
+                    raise ValueError("The body ended {} bytes short of its length".format(remaining))
+                remaining -= len(chunk)
+                batch.append(frames.ContentBodyFrame(self.channel_id, chunk))
+                if len(batch) * frame_body_size >= self.stream_write_size or not remaining:
+                    if not remaining:
+                        # Before the message is complete, and can't be
+                        # taken back anymore
+                        yield from _check_source_ended(source)
+                    if self._exception is not None:
+                        raise self._exception
+                    started = True
+                    self.protocol.send_frames(batch)
+                    batch = []
+                    # Don't buffer up more than the transport would
+                    yield from self.protocol._drain_helper()
+        except BaseException:
+            if started and self._exception is None:
+                # The broker expects the rest of the body next, so nothing
+                # else can be sent on the channel
+                self.killall(AMQPChannelError("A message body was cut short, the channel is unusable"))
+            raise
 
     def send_BasicConsume(self, queue_name, no_local, no_ack, exclusive, arguments):
         self.send_method(spec.BasicConsume(0, queue_name, '', no_local, no_ack, exclusive, False, arguments))
@@ -485,6 +925,13 @@ class ChannelMethodSender(routing.Sender):
 
     def send_BasicGet(self, queue_name, no_ack):
         self.send_method(spec.BasicGet(0, queue_name, no_ack))
+        self.pending_gets.append(no_ack)
+
+    def send_BasicGets(self, queue_name, no_ack, count):
+        # All in one write
+        get = frames.MethodFrame(self.channel_id, spec.BasicGet(0, queue_name, no_ack))
+        self.send_frames([get] * count)
+        self.pending_gets.extend([no_ack] * count)
 
     def send_BasicAck(self, delivery_tag):
         self.send_method(spec.BasicAck(delivery_tag, False))
@@ -496,19 +943,22 @@ class ChannelMethodSender(routing.Sender):
         self.send_method(spec.ChannelClose(status_code, msg, class_id, method_id))
 
     def send_CloseOK(self):
-        self.send_method(spec.ChannelCloseOK())
+        # Not held back by a streamed body: the broker has closed the
+        # channel already, and discards the rest of the body
+        super().send_method(spec.ChannelCloseOK())
 
     def send_BasicQos(self, prefetch_size, prefetch_count, apply_globally):
         self.send_method(spec.BasicQos(prefetch_size, prefetch_count, apply_globally))
 
-    def send_content(self, msg):
+    def publish_frames(self, exchange_name, routing_key, mandatory, msg):
+        """ The frames publishing ``msg``. Sent together, they cost a single write """
+        method = spec.BasicPublish(0, exchange_name, routing_key, mandatory, False)
         header_payload = message.get_header_payload(msg, spec.BasicPublish.method_type[0])
-        header_frame = frames.ContentHeaderFrame(self.channel_id, header_payload)
-        self.protocol.send_frame(header_frame)
-
+        result = [frames.MethodFrame(self.channel_id, method),
+                  frames.ContentHeaderFrame(self.channel_id, header_payload)]
         for payload in message.get_frame_payloads(msg, self.connection_info['frame_max'] - 8):
-            frame = frames.ContentBodyFrame(self.channel_id, payload)
-            self.protocol.send_frame(frame)
+            result.append(frames.ContentBodyFrame(self.channel_id, payload))
+        return result
 
 
 class BasicReturnConsumer(object):
@@ -530,3 +980,9 @@ class BasicReturnConsumer(object):
 
     def default_behaviour(self, msg):
         raise UndeliverableMessage(msg)
+
+
+@asyncio.coroutine
+def _check_source_ended(source):
+    if (yield from source.read(1)):
+        raise ValueError("The body is longer than its length of {} bytes".format(source.length))
@@ -3,7 +3,9 @@ import sys
 from . import spec
 from . import routing
 from . import frames
-from .channel import ChannelFactory
+from .channel import ChannelFactory, DeclarationCache
+from .pool import ChannelPool
+from .poller import QueuePoller
 from .exceptions import (
     AMQPConnectionError, ConnectionClosed)
 from .log import log
@@ -25,7 +27,14 @@ class Connection(object):
 
     .. attribute:: closed
 
-        a :class:`~asyncio.Future` which is done when the handshake to close the connection has finished
+        a :class:`~asyncio.Future` which is done when the connection has been closed,
+        by either side or because it was lost. Its result is the exception
+        describing why, e.g. :class:`~asynqp.exceptions.ConnectionLostError`.
+
+    .. attribute:: declaration_cache
+
+        the :class:`DeclarationCache` of the connection,
+        or ``None`` if it was not enabled
 
     .. attribute:: transport
 
@@ -36,9 +45,14 @@ class Connection(object):
         The :class:`~asyncio.Protocol` which is paired with the transport
     """
     def __init__(self, loop, transport, protocol, synchroniser, sender, dispatcher, connection_info):
+        self._loop = loop
+        self.closed = asyncio.Future(loop=loop)
         self.synchroniser = synchroniser
         self.sender = sender
-        self.channel_factory = ChannelFactory(loop, protocol, dispatcher, connection_info)
+        self.declaration_cache = (
+            DeclarationCache() if connection_info.get('declaration_cache') else None)
+        self.channel_factory = ChannelFactory(
+            loop, protocol, dispatcher, connection_info, self.declaration_cache)
         self.connection_info = connection_info
 
         self.transport = transport
@@ -64,6 +78,49 @@ class Connection(object):
         channel = yield from self.channel_factory.open()
         return channel
 
+    @asyncio.coroutine
+    def channel_pool(self, size, max_size=None, *, idle_timeout=60):
+        """
+        Open a pool of channels on this connection.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :param int size: the number of channels to open right away and keep open.
+        :param int max_size: the maximum number of channels open at once.
+            Defaults to ``size``.
+        :keyword float idle_timeout: channels above ``size`` are closed after being
+            idle for this many seconds.
+
+        :return: a :class:`ChannelPool`
+        """
+        pool = ChannelPool(
+            self, size, size if max_size is None else max_size,
+            idle_timeout=idle_timeout, loop=self._loop)
+        try:
+            yield from pool.fill()
+        except:
+            yield from pool.close()
+            raise
+        return pool
+
+    def queue_poller(self, callback, *, min_interval=0.01, max_interval=5, no_ack=False):
+        """
+        Create a poller for queues declared on this connection's channels.
+
+        :param callable callback: a callback to be called with each message
+            (an :class:`~asynqp.message.IncomingMessage`)
+        :keyword float min_interval: the delay in seconds before polling
+            a queue again after it was first found empty.
+        :keyword float max_interval: the longest delay in seconds between two
+            polls of an empty queue.
+        :keyword bool no_ack: if true, the broker does not require acknowledgement of receipt of the messages.
+
+        :return: a :class:`QueuePoller`
+        """
+        return QueuePoller(
+            callback, min_interval=min_interval, max_interval=max_interval,
+            no_ack=no_ack, protocol=self.protocol, loop=self._loop)
+
     def is_closed(self):
         return self._closing or self._closed_with is not None
 
@@ -76,6 +133,8 @@ class Connection(object):
         """
         if not self.is_closed():
             self._closing = True
+            # Full consumers must not keep the CloseOK from being read
+            self.protocol.keep_reading()
             # Let the ConnectionActor do the actual close operations.
             # It will do the work on CloseOK
             try:
@@ -89,8 +148,6 @@ class Connection(object):
         else:
             if self._closing:
                 log.warn("Called `close` on already closing connection...")
-        # finish all pending tasks
-        yield from self.protocol.heartbeat_monitor.wait_closed()
 
     @asyncio.coroutine
     def drain_buffers(self):
@@ -126,10 +183,18 @@ def open_connection(loop, transport, protocol, dispatcher, connection_info):
         reader.ready()
 
         frame = yield from synchroniser.await(spec.ConnectionTune)
-        # just agree with whatever the server wants. Make this configurable in future
-        connection_info['frame_max'] = frame.payload.frame_max
-        heartbeat_interval = frame.payload.heartbeat
-        sender.send_TuneOK(frame.payload.channel_max, frame.payload.frame_max, heartbeat_interval)
+        tune = frame.payload
+        frame_max = _negotiate(tune.frame_max, connection_info.get('frame_max'))
+        channel_max = _negotiate(tune.channel_max, connection_info.get('channel_max'))
+        heartbeat_interval = connection_info.get('heartbeat')
+        if heartbeat_interval != 0:
+            # 0 turns heartbeats off
+            heartbeat_interval = _negotiate(tune.heartbeat, heartbeat_interval)
+        connection_info['frame_max'] = frame_max
+        connection_info['channel_max'] = channel_max
+        connection_info['heartbeat'] = heartbeat_interval
+        sender.send_TuneOK(channel_max, frame_max, heartbeat_interval)
+        protocol.set_frame_max(frame_max)
 
         sender.send_Open(connection_info['virtual_host'])
         protocol.start_heartbeat(heartbeat_interval)
@@ -143,6 +208,15 @@ def open_connection(loop, transport, protocol, dispatcher, connection_info):
     return connection
 
 
+def _negotiate(server_value, client_value):
+    """ The lower of the two wins, with 0 meaning no limit """
+    if client_value is None:
+        return server_value
+    if not server_value or not client_value:
+        return server_value or client_value
+    return min(server_value, client_value)
+
+
 class ConnectionActor(routing.Actor):
     def __init__(self, synchroniser, sender, protocol, connection, dispatcher, *, loop=None):
         super().__init__(synchroniser, sender, loop=loop)
@@ -207,6 +281,8 @@ class ConnectionActor(routing.Actor):
     def _close_all(self, exc):
         # Make sure all `close` calls don't deadlock
         self.connection._closed_with = exc
+        if not self.connection.closed.done():
+            self.connection.closed.set_result(exc)
         # Close heartbeat
         self.protocol.heartbeat_monitor.stop()
         # If there were anyone who expected an `*-OK` kill them, as no data
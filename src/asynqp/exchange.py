@@ -1,5 +1,12 @@
 import asyncio
+import struct
+from . import frames
 from . import spec
+from .message import Message, ContentHeaderPayload, open_body_source, _byte_view
+
+# Frame type, channel id and payload size
+_FRAME_HEADER = struct.Struct('!BHL')
+_FRAME_END = bytes([spec.FRAME_END])
 
 
 class Exchange(object):
@@ -41,6 +48,71 @@ class Exchange(object):
         """
         self.sender.send_BasicPublish(self.name, routing_key, mandatory, message)
 
+    @asyncio.coroutine
+    def publish_stream(self, source, routing_key, *, length=None, mandatory=True, **properties):
+        """
+        Publish a message whose body is read from ``source`` as it is sent,
+        so it never has to be in memory as a whole:
+
+        .. code-block:: python
+
+            await exchange.publish_stream('/var/backups/db.tar', 'backups',
+                                          content_type='application/x-tar')
+
+        The body is sent a few frames at a time, waiting whenever the
+        transport's write buffer is full. Anything else sent on the channel
+        meanwhile is held back until the whole body has been sent.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :param source: the body of the message. Either the path of a file,
+            which is read through memory maps of a window of it at a time;
+            an object supporting the buffer protocol, such as a
+            :class:`bytearray` or :class:`mmap.mmap`; or an async iterator of
+            bytes-like chunks of the body.
+        :param str routing_key: the routing key with which to publish the message
+        :keyword int length: the length of the body in bytes. Required
+            if ``source`` is an async iterator, which must produce exactly that many bytes.
+        :keyword bool mandatory: as for :meth:`publish`
+        :keyword properties: the message's properties, as for :class:`Message`
+
+        :raises ValueError: if an async iterator produces more or less than ``length`` bytes.
+            The message is not published then. If part of its body was sent
+            already, the channel can't be used anymore.
+        """
+        msg = Message(b'', **properties)
+        body = open_body_source(source, length)
+        try:
+            yield from self.sender.send_BasicPublishStream(self.name, routing_key, mandatory, msg, body)
+        finally:
+            body.close()
+
+    def prepare_publisher(self, routing_key, *, mandatory=True, **properties):
+        """
+        Prepare to publish many messages with the same routing key and properties
+        on the exchange. The frames of such messages only differ in the body,
+        so everything else is serialised once, up front:
+
+        .. code-block:: python
+
+            publisher = exchange.prepare_publisher('metrics', content_type='application/json')
+            for sample in samples:
+                publisher.publish(json.dumps(sample).encode())
+
+        :param str routing_key: the routing key with which to publish the messages
+        :keyword bool mandatory: as for :meth:`publish`
+        :keyword properties: the messages' properties, as for :class:`Message`.
+            Unlike with :class:`Message`, ``timestamp`` is left out unless given,
+            as it would be the same for every message.
+
+        :return: a :class:`Publisher`
+        """
+        properties.setdefault('timestamp', None)
+        msg = Message(b'', **properties)
+        if properties['timestamp'] is None:
+            msg._properties['timestamp'] = None
+        return Publisher(self.sender, self.name, routing_key, mandatory, msg)
+
     @asyncio.coroutine
     def delete(self, *, if_unused=True):
         """
@@ -53,4 +125,45 @@ class Exchange(object):
         """
         self.sender.send_ExchangeDelete(self.name, if_unused)
         yield from self.synchroniser.await(spec.ExchangeDeleteOK)
-        self.reader.ready()
+
+
+class Publisher(object):
+    """
+    Publishes messages with a fixed exchange, routing key and properties,
+    from frames serialised in advance.
+
+    Publishers are created using :meth:`Exchange.prepare_publisher() <Exchange.prepare_publisher>`.
+    """
+    def __init__(self, sender, exchange_name, routing_key, mandatory, msg):
+        self.sender = sender
+        channel_id = sender.channel_id
+        self._frame_body_size = sender.connection_info['frame_max'] - 8
+
+        method_frame = frames.MethodFrame(
+            channel_id, spec.BasicPublish(0, exchange_name, routing_key, mandatory, False))
+        header_frame = frames.ContentHeaderFrame(channel_id, ContentHeaderPayload(
+            spec.BasicPublish.method_type[0], 0, list(msg._properties.values())))
+        header = header_frame.serialise()
+        # The body length follows the frame header, class id and weight
+        self._head = method_frame.serialise() + header[:11]
+        self._header_rest = header[19:]
+        self._channel_id = channel_id
+
+    def publish(self, body):
+        """
+        Publish a message.
+
+        :param bytes body: the body of the message, or any other buffer as
+            for :class:`Message`
+        """
+        if not isinstance(body, bytes):
+            body = _byte_view(body)
+        length = len(body)
+        parts = [self._head, struct.pack('!Q', length), self._header_rest]
+        frame_body_size = self._frame_body_size
+        for offset in range(0, length, frame_body_size):
+            chunk = body[offset:offset + frame_body_size]
+            parts.append(_FRAME_HEADER.pack(spec.FRAME_BODY, self._channel_id, len(chunk)))
+            parts.append(chunk)
+            parts.append(_FRAME_END)
+        self.sender.send_frames([frames.SerialisedFrames(b''.join(parts))])
@@ -3,6 +3,8 @@ from . import spec
 from . import serialisation
 from . import message
 
+_FRAME_END = serialisation.pack_octet(spec.FRAME_END)
+
 
 def read(frame_type, channel_id, raw_payload):
     if frame_type == MethodFrame.frame_type:
@@ -24,20 +26,23 @@ class Frame(object):
         self.payload = payload
 
     def serialise(self):
-        frame = serialisation.pack_octet(self.frame_type)
-        frame += serialisation.pack_short(self.channel_id)
+        return b''.join(self.serialised_parts())
 
-        if isinstance(self.payload, bytes):
+    def serialised_parts(self):
+        """ The serialised frame in pieces. Bodies are left as they are, so
+            joining the pieces of several frames copies a body just once.
+        """
+        if isinstance(self.payload, (bytes, bytearray, memoryview)):
             body = self.payload
         else:
             bytesio = BytesIO()
             self.payload.write(bytesio)
             body = bytesio.getvalue()
 
-        frame += serialisation.pack_long(len(body)) + body
-        frame += serialisation.pack_octet(spec.FRAME_END)
-
-        return frame
+        header = (serialisation.pack_octet(self.frame_type)
+                  + serialisation.pack_short(self.channel_id)
+                  + serialisation.pack_long(len(body)))
+        return (header, body, _FRAME_END)
 
     def __eq__(self, other):
         return (self.frame_type == other.frame_type
@@ -66,6 +71,18 @@ class HeartbeatFrame(Frame):
         pass
 
 
+class SerialisedFrames(object):
+    """ One or more frames which were serialised already """
+    def __init__(self, data):
+        self.data = data
+
+    def serialise(self):
+        return self.data
+
+    def serialised_parts(self):
+        return (self.data,)
+
+
 class PoisonPillFrame(Frame):
     channel_id = 0
     payload = b''
@@ -1,9 +1,15 @@
+import asyncio
+import collections
 import json
+import mmap
+import os
+import tempfile
 from collections import OrderedDict
 from datetime import datetime
 from io import BytesIO
 from . import amqptypes
 from . import serialisation
+from .compat import PY_35
 
 
 class Message(object):
@@ -17,6 +23,10 @@ class Message(object):
     :param body: :func:`bytes` , :class:`str` or :class:`dict` representing the body of the message.
         Strings will be encoded according to the content_encoding parameter;
         dicts will be converted to a string using JSON.
+        Any other C-contiguous object supporting the buffer protocol, such as a
+        :class:`bytearray`, :class:`memoryview` or numpy array, is sent
+        without being copied first; the body is then a :class:`memoryview`
+        of its bytes. Don't modify such a body until the message is published.
     :param dict headers: a dictionary of message headers
     :param str content_type: MIME content type
         (defaults to 'application/json' if :code:`body` is a :class:`dict`,
@@ -72,8 +82,10 @@ class Message(object):
 
         if isinstance(body, bytes):
             self.body = body
-        else:
+        elif isinstance(body, str):
             self.body = body.encode(content_encoding)
+        else:
+            self.body = _byte_view(body)
 
         timestamp = timestamp if timestamp is not None else datetime.now()
 
@@ -107,7 +119,17 @@ class Message(object):
 
         :return: the parsed JSON.
         """
-        return json.loads(self.body.decode(self.content_encoding))
+        return json.loads(str(self.body, self.content_encoding))
+
+
+def _byte_view(buffer):
+    """ A flat view of the bytes of ``buffer``, whatever its format and shape """
+    view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+    if view.format == 'B' and view.ndim == 1 and view.c_contiguous:
+        return view
+    if not view.c_contiguous:
+        raise TypeError("A message body must be a C-contiguous buffer")
+    return view.cast('B')
 
 
 class IncomingMessage(Message):
@@ -138,32 +160,322 @@ class IncomingMessage(Message):
     def ack(self):
         """
         Acknowledge the message.
+
+        A body which was spilled to disk can't be read anymore afterwards.
         """
         self.sender.send_BasicAck(self.delivery_tag)
+        self._release_spilled_body()
 
     def reject(self, *, requeue=True):
         """
         Reject the message.
 
+        A body which was spilled to disk can't be read anymore afterwards.
+
         :keyword bool requeue: if true, the broker will attempt to requeue the
             message and deliver it to an alternate consumer.
         """
         self.sender.send_BasicReject(self.delivery_tag, requeue)
+        self._release_spilled_body()
+
+    def _release_spilled_body(self):
+        body = self.body
+        if not isinstance(body, memoryview) or not isinstance(body.obj, _SpilledBody):
+            return
+        spilled = body.obj
+        body.release()
+        try:
+            spilled.close()
+        except BufferError:
+            # Some other view of it is still alive, it's unmapped when that
+            # is garbage collected
+            pass
+
+
+class _SpilledBody(mmap.mmap):
+    """ A message body in a temporary file, see :func:`spill_body` """
+
+
+def spill_body(threshold, body_length):
+    """
+    A body allocator (see :meth:`Queue.consume`) which keeps bodies of up to
+    ``threshold`` bytes in memory, and larger ones in a memory-mapped temporary file.
+    The file has no name, it's deleted as soon as the map is closed.
+    """
+    if body_length <= threshold:
+        return None
+    with tempfile.TemporaryFile() as f:
+        f.truncate(body_length)
+        # The map keeps the file open on its own
+        return _SpilledBody(f.fileno(), body_length)
+
+
+class BodyStream(object):
+    """
+    The body of a message delivered to a streaming consumer
+    (see :meth:`Queue.consume() <asynqp.Queue.consume>`), read chunk by chunk
+    as it arrives from the broker:
+
+    .. code-block:: python
+
+        async def on_message(msg):
+            with open(path, 'wb') as f:
+                async for chunk in msg.body:
+                    f.write(chunk)
+            msg.ack()
+
+    The body must be read to the end or discarded, as nothing else is read
+    on the channel while too much of it is waiting to be read.
+
+    .. attribute:: length
+
+        the length of the whole body in bytes
+    """
+    def __init__(self, length, *, reader, max_buffered_bytes, loop):
+        self.length = length
+        self._reader = reader
+        self._max_bytes = max_buffered_bytes
+        self._loop = loop
+        self._chunks = collections.deque()
+        self._buffered_bytes = 0
+        self._reader_paused = False
+        self._eof = False
+        self._discarded = False
+        self._exc = None
+        self._waiter = None
+
+    def _feed(self, chunk):
+        if self._discarded:
+            return
+        self._chunks.append(chunk)
+        self._buffered_bytes += len(chunk)
+        if not self._reader_paused and self._buffered_bytes >= self._max_bytes:
+            self._reader_paused = True
+            self._reader.pause()
+        self._wake_waiter()
+
+    def _feed_eof(self):
+        self._eof = True
+        self._wake_waiter()
+
+    def _set_exception(self, exc):
+        self._exc = exc
+        # Nothing more will arrive, so don't keep the connection blocked
+        self._resume_reader()
+        self._wake_waiter()
+
+    def _wake_waiter(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _resume_reader(self):
+        if self._reader_paused:
+            self._reader_paused = False
+            self._reader.resume()
+
+    @asyncio.coroutine
+    def read_chunk(self):
+        """
+        Read the next chunk of the body.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :return: the chunk as :class:`bytes`, or ``b''`` once the whole body has been read.
+        :raises AMQPError: if the channel was closed before the whole body arrived.
+        """
+        while not self._chunks:
+            if self._eof or self._discarded:
+                return b''
+            if self._exc is not None:
+                raise self._exc
+            if self._waiter is not None:
+                raise RuntimeError("read_chunk() called while another coroutine is waiting for a chunk")
+            self._waiter = asyncio.Future(loop=self._loop)
+            try:
+                yield from self._waiter
+            finally:
+                self._waiter = None
+
+        chunk = self._chunks.popleft()
+        self._buffered_bytes -= len(chunk)
+        if self._reader_paused and self._buffered_bytes <= self._max_bytes // 2:
+            self._resume_reader()
+        return chunk
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Read the rest of the body.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :return: :class:`bytes`
+        """
+        chunks = []
+        while True:
+            chunk = yield from self.read_chunk()
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def discard(self):
+        """
+        Drop the rest of the body without reading it.
+        """
+        self._discarded = True
+        self._chunks.clear()
+        self._buffered_bytes = 0
+        self._resume_reader()
+        self._wake_waiter()
+
+    # Python 3.5 API
+
+    if PY_35:
+
+        @asyncio.coroutine
+        def __aiter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __anext__(self):
+            chunk = yield from self.read_chunk()
+            if not chunk:
+                raise StopAsyncIteration
+            return chunk
 
 
 def get_header_payload(message, class_id):
     return ContentHeaderPayload(class_id, len(message.body), list(message._properties.values()))
 
 
+def get_plain_properties(message):
+    """ Message properties as builtin Python values, so they can be pickled
+        cheaply and passed back into :class:`Message` on the other side.
+    """
+    properties = {}
+    for name, value in message._properties.items():
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            value = datetime(*value.timetuple()[:6])
+        else:
+            # ShortStr, Octet and Table are subclasses of str, int and dict
+            value = type(value).__mro__[1](value)
+        properties[name] = value
+    return properties
+
+
 # NB: the total frame size will be 8 bytes larger than frame_body_size
 def get_frame_payloads(message, frame_body_size):
-    frames = []
-    remaining = message.body
-    while remaining:
-        frame = remaining[:frame_body_size]
-        remaining = remaining[frame_body_size:]
-        frames.append(frame)
-    return frames
+    # Slicing off the rest of the body for every frame would be quadratic
+    body = message.body
+    return [body[i:i + frame_body_size] for i in range(0, len(body), frame_body_size)]
+
+
+def open_body_source(source, length=None):
+    """ A source of a body to publish in chunks, see :meth:`Exchange.publish_stream` """
+    if isinstance(source, str):
+        return _FileSource(source)
+    if hasattr(source, '__aiter__'):
+        if length is None:
+            raise TypeError("The length of a body read from an async iterator must be given")
+        return _IteratorSource(source, length)
+    return _BufferSource(source)
+
+
+class _BufferSource(object):
+    def __init__(self, buffer):
+        self._view = _byte_view(buffer)
+        self.length = len(self._view)
+        self._offset = 0
+
+    @asyncio.coroutine
+    def read(self, size):
+        chunk = self._view[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return chunk
+
+    def close(self):
+        self._view = None
+
+
+class _FileSource(object):
+    # Map this much of the file at a time. A multiple of the allocation
+    # granularity on every platform, as mmap offsets have to be.
+    window_size = 16 * 1024 * 1024
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self.length = os.fstat(self._file.fileno()).st_size
+        self._window = None
+        self._window_offset = 0
+        self._offset = 0
+
+    @asyncio.coroutine
+    def read(self, size):
+        if self._offset >= self.length:
+            return b''
+        if self._window is None or self._offset - self._window_offset >= len(self._window):
+            self._map_window()
+        start = self._offset - self._window_offset
+        chunk = self._window[start:start + size]
+        self._offset += len(chunk)
+        return chunk
+
+    def _map_window(self):
+        self._window = None
+        self._window_offset = self._offset
+        mapped = mmap.mmap(
+            self._file.fileno(), min(self.window_size, self.length - self._offset),
+            access=mmap.ACCESS_READ, offset=self._offset)
+        # The map is closed when the last slice of it is garbage collected
+        self._window = memoryview(mapped)
+
+    def close(self):
+        self._window = None
+        self._file.close()
+
+
+class _IteratorSource(object):
+    def __init__(self, iterable, length):
+        self._iterable = iterable
+        self._iterator = None
+        self.length = length
+        self._pending = memoryview(b'')
+
+    @asyncio.coroutine
+    def read(self, size):
+        while not self._pending:
+            chunk = yield from self._next_chunk()
+            if chunk is None:
+                return b''
+            self._pending = _byte_view(chunk)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    @asyncio.coroutine
+    def _next_chunk(self):
+        if self._iterator is None:
+            self._iterator = yield from _await(self._iterable.__aiter__())
+        try:
+            return (yield from _await(self._iterator.__anext__()))
+        except StopAsyncIteration:
+            return None
+
+    def close(self):
+        self._pending = None
+
+
+@asyncio.coroutine
+def _await(obj):
+    # Awaitables which aren't generators can't be yielded from directly,
+    # and before Python 3.5.2 __aiter__ returned an awaitable
+    if hasattr(obj, '__await__'):
+        return (yield from obj.__await__())
+    if asyncio.iscoroutine(obj):
+        return (yield from obj)
+    return obj
 
 
 class ContentHeaderPayload(object):
@@ -220,31 +532,54 @@ class ContentHeaderPayload(object):
 
 
 class MessageBuilder(object):
-    def __init__(self, sender, delivery_tag, redelivered, exchange_name, routing_key, consumer_tag=None):
+    def __init__(self, sender, delivery_tag, redelivered, exchange_name, routing_key, consumer_tag=None,
+                 allocate_body=None, stream=None):
         self.sender = sender
         self.delivery_tag = delivery_tag
         self.body = b''
         self.consumer_tag = consumer_tag
         self.exchange_name = exchange_name
         self.routing_key = routing_key
+        # Optional callable, which may return a writable buffer of the given
+        # size for the body to be assembled in, instead of a bytes object
+        self.allocate_body = allocate_body
+        # Optional callable, which returns a BodyStream of the given length
+        # for the body to be fed into as it arrives
+        self.stream = stream
+        self.received = 0
 
     def set_header(self, header):
         self.body_length = header.body_length
         self.properties = {}
         for name, prop in zip(IncomingMessage.property_types, header.properties):
             self.properties[name] = prop
+        if self.stream is not None:
+            self.body = self.stream(self.body_length)
+        elif self.allocate_body is not None:
+            buffer = self.allocate_body(self.body_length)
+            if buffer is not None:
+                self.body = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
 
     def add_body_chunk(self, chunk):
-        self.body += chunk
+        if self.stream is not None:
+            self.body._feed(chunk)
+        elif isinstance(self.body, memoryview):
+            self.body[self.received:self.received + len(chunk)] = chunk
+        else:
+            self.body += chunk
+        self.received += len(chunk)
 
     def done(self):
-        return len(self.body) == self.body_length
+        return self.received == self.body_length
 
     def build(self):
-        return IncomingMessage(
-            self.body,
+        msg = IncomingMessage(
+            b'' if self.stream is not None else self.body,
             sender=self.sender,
             delivery_tag=self.delivery_tag,
             exchange_name=self.exchange_name,
             routing_key=self.routing_key,
             **self.properties)
+        if self.stream is not None:
+            msg.body = self.body
+        return msg
@@ -0,0 +1,163 @@
+import functools
+import heapq
+import itertools
+
+from . import spec
+from .exceptions import AMQPError
+
+
+class QueuePoller(object):
+    """
+    Polls many queues with ``basic.get``, for queues which see too few
+    messages to be worth a consumer each.
+
+    Queue pollers are created using :meth:`Connection.queue_poller() <Connection.queue_poller>`.
+
+    .. code-block:: python
+
+        poller = connection.queue_poller(handle_message)
+        for name in queue_names:
+            queue = await channels[hash(name) % len(channels)].declare_queue(name)
+            poller.add(queue)
+
+    A queue which turns out to be empty is polled again after a delay,
+    which doubles with every empty poll up to ``max_interval``. Once a message
+    arrives the queue is polled again right away, and the delay starts over
+    at ``min_interval``. A queue is polled on the channel it was declared on;
+    a channel can carry the polls of any number of queues.
+
+    All the queues are polled off a single timer, there is no task per queue.
+
+    The ``callback`` is called with each message, like a consumer callback
+    (see :meth:`Queue.consume`). If it has an ``on_error`` method, that is
+    called with the exception when a queue can't be polled anymore because
+    its channel was closed.
+
+    .. attribute:: min_interval
+
+        the delay in seconds after the first empty poll of a queue
+
+    .. attribute:: max_interval
+
+        the longest delay in seconds between two polls of a queue
+    """
+    def __init__(self, callback, *, min_interval=0.01, max_interval=5,
+                 no_ack=False, protocol=None, loop):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.no_ack = no_ack
+        # The connection whose queues may be added, any if None
+        self._protocol = protocol
+        self._loop = loop
+        # queue -> _PolledQueue
+        self._queues = {}
+        # (due time, sequence number, _PolledQueue), removed entries are skipped
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self._timer_due = None
+        self._closed = False
+
+    def add(self, queue):
+        """
+        Start polling a queue.
+
+        :param Queue queue: the queue to poll, declared on a channel of
+            the poller's connection
+        """
+        if self._closed:
+            raise RuntimeError("Queue poller is closed")
+        if self._protocol is not None and queue.sender.protocol is not self._protocol:
+            raise ValueError(
+                "Queue {} was declared on another connection".format(queue.name))
+        if queue in self._queues:
+            return
+        polled = _PolledQueue(queue)
+        self._queues[queue] = polled
+        self._schedule_poll(polled, self._loop.time())
+
+    def remove(self, queue):
+        """
+        Stop polling a queue. A poll in progress still delivers its message.
+
+        :param Queue queue: the queue to stop polling
+        """
+        polled = self._queues.pop(queue, None)
+        if polled is not None:
+            polled.removed = True
+
+    def close(self):
+        """
+        Stop polling all queues.
+        """
+        self._closed = True
+        for queue in list(self._queues):
+            self.remove(queue)
+        self._schedule = []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_poll(self, polled, due):
+        heapq.heappush(self._schedule, (due, next(self._sequence), polled))
+        if self._timer is None or due < self._timer_due:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self._loop.call_at(due, self._fire)
+            self._timer_due = due
+
+    def _fire(self):
+        self._timer = None
+        now = self._loop.time()
+        while self._schedule and self._schedule[0][0] <= now:
+            _, _, polled = heapq.heappop(self._schedule)
+            if not polled.removed:
+                self._poll(polled)
+        if self._schedule and self._timer is None:
+            due = self._schedule[0][0]
+            self._timer = self._loop.call_at(due, self._fire)
+            self._timer_due = due
+
+    def _poll(self, polled):
+        queue = polled.queue
+        try:
+            queue.sender.send_BasicGet(queue.name, self.no_ack)
+        except AMQPError as exc:
+            self._lost(polled, exc)
+            return
+        fut = queue.synchroniser.await(spec.BasicGetOK, spec.BasicGetEmpty)
+        fut.add_done_callback(functools.partial(self._polled, polled))
+
+    def _polled(self, polled, fut):
+        exc = fut.exception()
+        if exc is not None:
+            self._lost(polled, exc)
+            return
+        polled.queue.reader.ready()
+
+        tag_msg = fut.result()
+        now = self._loop.time()
+        if tag_msg is None:
+            polled.interval = min(self.max_interval, polled.interval * 2 or self.min_interval)
+        else:
+            polled.interval = 0
+            self._loop.call_soon(self.callback, tag_msg[1])
+        if not polled.removed:
+            self._schedule_poll(polled, now + polled.interval)
+
+    def _lost(self, polled, exc):
+        if polled.removed:
+            return
+        self.remove(polled.queue)
+        if hasattr(self.callback, 'on_error'):
+            self.callback.on_error(exc)
+
+
+class _PolledQueue(object):
+    __slots__ = ('queue', 'interval', 'removed')
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.interval = 0
+        self.removed = False
@@ -0,0 +1,412 @@
+import asyncio
+import collections
+
+from .compat import _UserCoroutine, PY_35
+from .exceptions import AMQPConnectionError
+from .log import log
+
+POLICIES = ('least_buffered', 'round_robin')
+
+
+class ChannelPool(object):
+    """
+    A pool of open :class:`Channels <Channel>` on a single :class:`Connection`.
+
+    Leasing a channel from the pool is free as long as one is idle, so code
+    which wants a channel of its own for every request doesn't pay for
+    a ``Channel.Open`` round trip each time.
+
+    Channel pools are created using :meth:`Connection.channel_pool() <Connection.channel_pool>`.
+
+    :class:`ChannelPool` is used with :meth:`acquire`:
+
+    .. code-block:: python
+
+        pool = await connection.channel_pool(4, 16)
+        async with pool.acquire() as channel:
+            exchange = await channel.declare_exchange('my.exchange', 'topic')
+            exchange.publish(msg, 'routing.key')
+
+    A channel which was closed while leased (for example by a channel error
+    from the broker) is dropped on release and replaced in the background.
+    Channels opened above ``size`` are closed once they have been idle for
+    ``idle_timeout`` seconds.
+
+    .. attribute:: size
+
+        the number of channels kept open
+
+    .. attribute:: max_size
+
+        the maximum number of channels open at once. :meth:`acquire` waits for
+        a channel to be released when all of them are leased.
+    """
+    def __init__(self, connection, size, max_size, *, idle_timeout=60, loop):
+        if size < 0 or max_size < max(size, 1):
+            raise ValueError("Expected 0 <= size <= max_size and max_size >= 1")
+        self.connection = connection
+        self.size = size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._loop = loop
+        # (channel, time it was released) pairs, the most recently used last
+        self._idle = collections.deque()
+        self._in_use = set()
+        self._opening = 0
+        self._waiters = collections.deque()
+        self._tasks = set()
+        self._reap_handle = None
+        self._closed = False
+
+    @asyncio.coroutine
+    def fill(self):
+        """
+        Open channels until there are ``size`` of them.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        missing = self.size - self._total()
+        channels = yield from asyncio.gather(
+            *[self._open() for _ in range(missing)], loop=self._loop)
+        for channel in channels:
+            self._put_idle(channel)
+
+    def acquire(self):
+        """
+        Lease a channel from the pool. The channel is returned to the pool
+        by :meth:`release`, or when leaving the ``async with`` block.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :return: an open :class:`Channel`
+        """
+        return _ChannelContext(self, self._acquire())
+
+    @asyncio.coroutine
+    def _acquire(self):
+        while True:
+            if self._closed:
+                raise RuntimeError("Channel pool is closed")
+
+            while self._idle:
+                # Reuse the most recently released channel, so the extra ones
+                # stay idle long enough to be reaped
+                channel, _ = self._idle.pop()
+                if not channel.is_closed():
+                    self._in_use.add(channel)
+                    return channel
+                self._replenish()
+
+            if self._total() < self.max_size:
+                channel = yield from self._open()
+                self._in_use.add(channel)
+                return channel
+
+            waiter = asyncio.Future(loop=self._loop)
+            self._waiters.append(waiter)
+            try:
+                yield from waiter
+            except asyncio.CancelledError:
+                # Don't lose a wakeup meant for this call
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_waiter()
+                raise
+
+    def release(self, channel):
+        """
+        Return a leased channel to the pool.
+
+        :param Channel channel: a channel returned by :meth:`acquire`
+        """
+        self._in_use.remove(channel)
+        if channel.is_closed():
+            self._replenish()
+        elif self._closed:
+            self._spawn(channel.close())
+        else:
+            self._idle.append((channel, self._loop.time()))
+            self._schedule_reap()
+        self._wake_waiter()
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close all idle channels and stop leasing them.
+        Channels which are leased are closed when they are released.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._reap_handle is not None:
+            self._reap_handle.cancel()
+            self._reap_handle = None
+        while self._waiters:
+            self._wake_waiter()
+
+        idle = [channel for channel, _ in self._idle]
+        self._idle.clear()
+        yield from asyncio.gather(*[c.close() for c in idle], loop=self._loop)
+        if self._tasks:
+            yield from asyncio.wait(list(self._tasks), loop=self._loop)
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    @asyncio.coroutine
+    def _open(self):
+        self._opening += 1
+        try:
+            return (yield from self.connection.open_channel())
+        finally:
+            self._opening -= 1
+
+    def _put_idle(self, channel):
+        if self._closed:
+            self._spawn(channel.close())
+            return
+        self._idle.append((channel, self._loop.time()))
+        self._wake_waiter()
+
+    def _replenish(self):
+        # Replace lost channels in the background, so the next `acquire` won't
+        # have to wait for them
+        if not self._closed and self._total() < self.size:
+            self._spawn(self._open_idle())
+
+    @asyncio.coroutine
+    def _open_idle(self):
+        try:
+            channel = yield from self._open()
+        except Exception as exc:
+            # The connection is probably gone. `acquire` will report it.
+            log.warning("Could not replace a pooled channel: %r", exc)
+            return
+        self._put_idle(channel)
+
+    def _spawn(self, coro):
+        task = asyncio.async(coro, loop=self._loop)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _wake_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _schedule_reap(self):
+        if (self.idle_timeout and self._reap_handle is None and
+                self._total() > self.size):
+            self._reap_handle = self._loop.call_later(
+                self.idle_timeout, self._reap)
+
+    def _reap(self):
+        self._reap_handle = None
+        deadline = self._loop.time() - self.idle_timeout
+        # Least recently used channels are on the left
+        while self._idle and self._total() > self.size:
+            channel, released_at = self._idle[0]
+            if released_at > deadline:
+                break
+            self._idle.popleft()
+            if not channel.is_closed():
+                self._spawn(channel.close())
+        self._schedule_reap()
+
+
+class ConnectionPool(object):
+    """
+    A fixed number of :class:`Connections <Connection>`, possibly to different
+    broker nodes, which share the channels and publishes of an application.
+
+    A single connection is a single socket, serviced by a single process on
+    the broker. Spreading publishes over several connections lifts that ceiling.
+
+    Connection pools are created using :func:`asynqp.connect_pool() <connect_pool>`.
+
+    Every member connection has a channel of its own, which :meth:`publish` uses.
+    A member whose connection or channel has closed is skipped, and reconnected
+    in the background.
+
+    .. attribute:: policy
+
+        how a member is picked: ``'least_buffered'`` picks the connection with
+        the least data waiting in its transport's write buffer,
+        ``'round_robin'`` takes turns.
+    """
+    def __init__(self, connect, size, *, policy='least_buffered',
+                 retry_interval=1, return_handler=None, loop):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of {}".format(POLICIES))
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        # coroutine function (member index, attempt) -> Connection
+        self._connect = connect
+        self.size = size
+        self.policy = policy
+        self.retry_interval = retry_interval
+        self._return_handler = return_handler
+        self._loop = loop
+        # (connection, publishing channel) pairs, None while (re)connecting
+        self._members = [None] * size
+        self._reconnecting = {}
+        self._next = 0
+        self._closed = False
+
+    @asyncio.coroutine
+    def open(self):
+        """
+        Connect all members of the pool.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        results = yield from asyncio.gather(
+            *[self._open_member(i, 0) for i in range(self.size)],
+            loop=self._loop, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        for index, result in enumerate(results):
+            if not isinstance(result, Exception):
+                self._members[index] = result
+        if errors:
+            yield from self.close()
+            raise errors[0]
+
+    def connection(self):
+        """
+        Pick an open connection from the pool.
+
+        :return: a :class:`Connection`
+        """
+        return self._pick()[0]
+
+    @asyncio.coroutine
+    def open_channel(self):
+        """
+        Open a new channel on a connection picked from the pool.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :return: The new :class:`Channel` object.
+        """
+        return (yield from self.connection().open_channel())
+
+    def publish(self, exchange_name, message, routing_key, *, mandatory=True):
+        """
+        Publish a message on a connection picked from the pool.
+
+        :param str exchange_name: the name of the exchange to publish to
+        :param asynqp.Message message: the message to send
+        :param str routing_key: the routing key with which to publish the message
+        """
+        _, channel = self._pick()
+        channel.sender.send_BasicPublish(exchange_name, routing_key, mandatory, message)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close all connections in the pool.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for task in self._reconnecting.values():
+            task.cancel()
+        self._reconnecting.clear()
+        connections = [m[0] for m in self._members if m is not None]
+        self._members = [None] * self.size
+        yield from asyncio.gather(
+            *[c.close() for c in connections], loop=self._loop)
+
+    def _pick(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        live = []
+        for index, member in enumerate(self._members):
+            if member is None:
+                continue
+            connection, channel = member
+            if connection.is_closed() or channel.is_closed():
+                self._members[index] = None
+                self._reconnect(index, connection)
+            else:
+                live.append(member)
+        if not live:
+            raise AMQPConnectionError("No connection in the pool is open")
+
+        if self.policy == 'round_robin':
+            self._next = (self._next + 1) % len(live)
+            return live[self._next]
+        return min(live, key=lambda m: m[0].transport.get_write_buffer_size())
+
+    @asyncio.coroutine
+    def _open_member(self, index, attempt):
+        connection = yield from self._connect(index, attempt)
+        try:
+            channel = yield from self._open_publish_channel(connection)
+        except:
+            yield from connection.close()
+            raise
+        return connection, channel
+
+    @asyncio.coroutine
+    def _open_publish_channel(self, connection):
+        channel = yield from connection.open_channel()
+        if self._return_handler is not None:
+            channel.set_return_handler(self._return_handler)
+        return channel
+
+    def _reconnect(self, index, dead):
+        task = asyncio.async(self._replace_member(index, dead), loop=self._loop)
+        self._reconnecting[index] = task
+
+    @asyncio.coroutine
+    def _replace_member(self, index, dead):
+        member = None
+        if not dead.is_closed():
+            # Only the channel was closed, the connection can be reused
+            try:
+                member = dead, (yield from self._open_publish_channel(dead))
+            except Exception:
+                asyncio.async(dead.close(), loop=self._loop)
+
+        attempt = 1
+        while member is None:
+            try:
+                member = yield from self._open_member(index, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("Could not reconnect pool member %d: %r", index, exc)
+                attempt += 1
+                yield from asyncio.sleep(self.retry_interval, loop=self._loop)
+
+        del self._reconnecting[index]
+        self._members[index] = member
+
+
+class _ChannelContext(_UserCoroutine):
+    """ Coroutine proxy, that can be used as async context manager
+    """
+    __slots__ = ('_pool', '_channel')
+
+    def __init__(self, pool, coro):
+        super().__init__(coro)
+        self._pool = pool
+        self._channel = None
+
+    if PY_35:
+
+        @asyncio.coroutine
+        def __aenter__(self):
+            self._channel = yield from self._coro
+            return self._channel
+
+        @asyncio.coroutine
+        def __aexit__(self, exc_type, exc, tb):
+            self._pool.release(self._channel)
@@ -1,8 +1,9 @@
 import asyncio
 import struct
+import weakref
 from . import spec
 from . import frames
-from .exceptions import AMQPError, ConnectionLostError
+from .exceptions import AMQPError, AMQPConnectionError, ConnectionLostError
 from .log import log
 
 
@@ -51,42 +52,57 @@ class FlowControl(asyncio.Protocol):
             raise ConnectionResetError('Connection lost')
         if not self._paused:
             return
+        # Several writers may wait at once, e.g. streaming on several channels
         waiter = self._drain_waiter
-        assert waiter is None or waiter.cancelled()
-        waiter = asyncio.Future(loop=self._loop)
-        self._drain_waiter = waiter
-        yield from waiter
+        if waiter is None or waiter.cancelled():
+            waiter = asyncio.Future(loop=self._loop)
+            self._drain_waiter = waiter
+        yield from asyncio.shield(waiter, loop=self._loop)
 
 
 class AMQP(FlowControl):
+    # The longest time in seconds the socket is left unread while every
+    # channel is paused
+    max_pause = 1
+
     def __init__(self, dispatcher, loop):
         super().__init__(loop=loop)
         self.dispatcher = dispatcher
-        self.partial_frame = b''
-        self.frame_reader = FrameReader()
+        # Until tuning, the spec only allows frames of the minimum size
+        self.frame_reader = FrameReader(spec.FRAME_MIN_SIZE)
         self.heartbeat_monitor = HeartbeatMonitor(self, loop)
+        # When a frame was last written, see HeartbeatMonitor
+        self.last_sent = 0
         self._closed = False
+        # Number of channels, which stopped reading frames
+        self._paused_readers = 0
+        # True while no channel is processing frames
+        self.reading_paused = False
+        # Whether the transport is actually paused. It is resumed now and
+        # then while reading is paused, see _poll()
+        self._transport_paused = False
+        self._poll_handle = None
+        self._polling = False
+        # Set once the connection is closing, its CloseOK must get through
+        self._keep_reading = False
 
     def connection_made(self, transport):
         self.transport = transport
+        self.last_sent = self._loop.time()
 
     def data_received(self, data):
-        while data:
-            # the spec says 'any octet may substitute for a heartbeat'
-            self.heartbeat_monitor.heartbeat_received()
-
-            try:
-                result = self.frame_reader.read_frame(data)
-            except AMQPError:
-                self.close()
-                raise
-
-            if result is None:  # incomplete frame, wait for the rest
-                return
-            frame, remainder = result
-
+        # the spec says 'any octet may substitute for a heartbeat'
+        self.heartbeat_monitor.heartbeat_received()
+        try:
+            received = self.frame_reader.read_frames(data)
+        except AMQPError:
+            self.close()
+            raise
+        for frame in received:
             self.dispatcher.dispatch(frame)
-            data = remainder
+        if self._polling:
+            self._polling = False
+            self.update_reading()
 
     def send_method(self, channel, method):
         frame = frames.MethodFrame(channel, method)
@@ -94,15 +110,84 @@ class AMQP(FlowControl):
 
     def send_frame(self, frame):
         self.transport.write(frame.serialise())
+        # Any frame will do instead of a heartbeat
+        self.last_sent = self._loop.time()
+
+    def send_frames(self, frames):
+        """ Send several frames with a single write """
+        self.transport.write(b''.join([part for frame in frames for part in frame.serialised_parts()]))
+        self.last_sent = self._loop.time()
 
     def send_protocol_header(self):
         self.transport.write(b'AMQP\x00\x00\x09\x01')
 
+    def reader_paused(self):
+        """ Called by a channel's reader, when it stops releasing frames """
+        self._paused_readers += 1
+        self.update_reading()
+
+    def reader_resumed(self):
+        self._paused_readers -= 1
+        self.update_reading()
+
+    def update_reading(self):
+        """ Stop reading from the socket while no channel is processing frames,
+            so the frames don't pile up in memory instead.
+
+            The connection's own frames can't be told apart before they are
+            read, so reading is never paused for more than
+            :attr:`max_pause` seconds at a time (half the heartbeat interval
+            if that is shorter), and never once the connection is closing.
+            Whatever is read meanwhile is queued up by the paused channels.
+        """
+        # Channel 0 is the connection itself, which never pauses
+        channels = len(self.dispatcher) - 1
+        self.reading_paused = (
+            channels > 0 and self._paused_readers >= channels and
+            not self._keep_reading)
+        self._pause_transport(self.reading_paused and not self._polling)
+
+    def keep_reading(self):
+        """ Never pause reading again, for example to read a ConnectionCloseOK """
+        self._keep_reading = True
+        self.update_reading()
+
+    def _pause_transport(self, pause):
+        if pause == self._transport_paused or self._closed:
+            return
+        self._transport_paused = pause
+        if pause:
+            self.transport.pause_reading()
+            delay = self.max_pause
+            if self.heartbeat_monitor.interval:
+                delay = min(delay, self.heartbeat_monitor.interval / 2)
+            self._poll_handle = self._loop.call_later(delay, self._poll)
+        else:
+            self.transport.resume_reading()
+            self._cancel_poll()
+
+    def _cancel_poll(self):
+        if self._poll_handle is not None:
+            self._poll_handle.cancel()
+            self._poll_handle = None
+
+    def _poll(self):
+        # Read once, so the server's heartbeats and ConnectionClose are
+        # seen while the channels are paused
+        self._poll_handle = None
+        self._polling = True
+        self._pause_transport(False)
+
+    def set_frame_max(self, frame_max):
+        """ Refuse incoming frames larger than the negotiated ``frame_max``, 0 for no limit """
+        self.frame_reader.max_frame_size = frame_max or None
+
     def start_heartbeat(self, heartbeat_interval):
         self.heartbeat_monitor.start(heartbeat_interval)
 
     def connection_lost(self, exc):
         super().connection_lost(exc)
+        self._cancel_poll()
         # If self._closed=True - we closed the transport ourselves. No need to
         # dispatch PoisonPillFrame, as we should have closed everything already
         if not self._closed:
@@ -125,97 +210,158 @@ class AMQP(FlowControl):
     def close(self):
         assert not self._closed, "Why do we close it 2-ce?"
         self._closed = True
+        self._cancel_poll()
         self.transport.close()
 
 
 class FrameReader(object):
-    def __init__(self):
-        self.partial_frame = b''
-
-    def read_frame(self, data):
-        data = self.partial_frame + data
-        self.partial_frame = b''
-
-        if len(data) < 7:
-            self.partial_frame = data
-            return
-
-        frame_header = data[:7]
-        frame_type, channel_id, size = struct.unpack('!BHL', frame_header)
-
-        if len(data) < size + 8:
-            self.partial_frame = data
-            return
-
-        raw_payload = data[7:7 + size]
-        frame_end = data[7 + size]
-
-        if frame_end != spec.FRAME_END:
-            raise AMQPError("Frame end byte was incorrect")
-
-        frame = frames.read(frame_type, channel_id, raw_payload)
-        remainder = data[8 + size:]
-
-        return frame, remainder
+    """
+    Splits the bytes read off the socket into frames.
+
+    Frames of more than ``max_frame_size`` bytes are refused as soon as their
+    header arrives, so a bad frame size can't make the reader buffer gigabytes.
+    ``None`` means no limit.
+    """
+    def __init__(self, max_frame_size=None):
+        self.max_frame_size = max_frame_size
+        # An incomplete frame, in the pieces it arrived in
+        self._partial = []
+        self._partial_size = 0
+        # The size the incomplete frame needs, to be read any further
+        self._needed = 0
+
+    def read_frames(self, data):
+        """ The frames completed by ``data``. The rest is kept for the next call. """
+        if self._partial:
+            # Don't join the pieces until the frame is complete, a large
+            # frame would be copied on every read otherwise
+            self._partial.append(data)
+            self._partial_size += len(data)
+            if self._partial_size < self._needed:
+                return []
+            data = b''.join(self._partial)
+            self._partial = []
+
+        result = []
+        offset = 0
+        end = len(data)
+        while offset < end:
+            if end - offset < 7:
+                self._keep(data, offset, 7)
+                break
+            frame_type, channel_id, size = struct.unpack_from('!BHL', data, offset)
+            if self.max_frame_size is not None and size + 8 > self.max_frame_size:
+                raise AMQPConnectionError("Frame of {} bytes is larger than the frame_max of {}".format(
+                    size + 8, self.max_frame_size))
+            if end - offset < size + 8:
+                self._keep(data, offset, size + 8)
+                break
+
+            if data[offset + 7 + size] != spec.FRAME_END:
+                raise AMQPError("Frame end byte was incorrect")
+            result.append(frames.read(frame_type, channel_id, data[offset + 7:offset + 7 + size]))
+            offset += size + 8
+        return result
+
+    def _keep(self, data, offset, needed):
+        rest = data[offset:]
+        self._partial = [rest]
+        self._partial_size = len(rest)
+        self._needed = needed
 
 
 class HeartbeatMonitor(object):
+    """
+    Sends heartbeats and checks the server's, in the ticks of the loop's
+    :class:`HeartbeatScheduler`.
+
+    A heartbeat is only sent when nothing else was written for a while,
+    so a busy connection never sends any.
+    """
     def __init__(self, protocol, loop):
         self.protocol = protocol
         self.loop = loop
-        self.send_hb_task = None
-        self.monitor_task = None
+        self.interval = 0
         self._last_received = 0
+        self._scheduler = None
 
     def start(self, interval):
         if interval <= 0:
             return
-        self.send_hb_task = asyncio.async(self.send_heartbeat(interval), loop=self.loop)
-        self.monitor_task = asyncio.async(self.monitor_heartbeat(interval), loop=self.loop)
+        self.interval = interval
+        self._last_received = self.loop.time()
+        self._scheduler = HeartbeatScheduler.for_loop(self.loop)
+        self._scheduler.add(self)
 
     def stop(self):
-        if self.send_hb_task is not None:
-            self.send_hb_task.cancel()
-        if self.monitor_task is not None:
-            self.monitor_task.cancel()
-
-    @asyncio.coroutine
-    def wait_closed(self):
-        if self.send_hb_task is not None:
-            try:
-                yield from self.send_hb_task
-            except asyncio.CancelledError:
-                pass
-        if self.monitor_task is not None:
-            try:
-                yield from self.monitor_task
-            except asyncio.CancelledError:
-                pass
+        if self._scheduler is not None:
+            self._scheduler.remove(self)
+            self._scheduler = None
+
+    def check(self, now):
+        """ Called by the scheduler every half interval """
+        # As spec states:
+        # If a peer detects no incoming traffic (i.e. received octets) for
+        # two heartbeat intervals or longer, it should close the connection
+        if now - self._last_received > self.interval * 2:
+            self.stop()
+            self.protocol.heartbeat_timeout()
+            return
 
-    @asyncio.coroutine
-    def send_heartbeat(self, interval):
-        # XXX: Add `last_sent` frame monitoring to not send heartbeats
-        #      if traffic was going through socket
-        while True:
+        # The next check is half an interval away, it may be too late then
+        if now - self.protocol.last_sent >= self.interval / 2:
             self.protocol.send_frame(frames.HeartbeatFrame())
-            yield from asyncio.sleep(interval, loop=self.loop)
-
-    @asyncio.coroutine
-    def monitor_heartbeat(self, interval):
-        self._last_received = self.loop.time()
-        no_beat_for = 0
-        while True:
-            # As spec states:
-            # If a peer detects no incoming traffic (i.e. received octets) for
-            # two heartbeat intervals or longer, it should close the connection
-            yield from asyncio.sleep(
-                interval * 2 - no_beat_for, loop=self.loop)
-
-            no_beat_for = self.loop.time() - self._last_received
-            if no_beat_for > interval * 2:
-                self.protocol.heartbeat_timeout()
-                self.send_hb_task.cancel()
-                return
 
     def heartbeat_received(self):
         self._last_received = self.loop.time()
+
+
+class HeartbeatScheduler(object):
+    """
+    Checks the heartbeats of all connections on an event loop.
+
+    Connections are bucketed by heartbeat interval, and each bucket has
+    a single timer, which checks all of its connections every half interval.
+    Thousands of connections thus cost a handful of timers rather than
+    thousands of them.
+    """
+    _schedulers = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_loop(cls, loop):
+        scheduler = cls._schedulers.get(loop)
+        if scheduler is None:
+            scheduler = cls._schedulers[loop] = cls(loop)
+        return scheduler
+
+    def __init__(self, loop):
+        self.loop = loop
+        # interval -> set of HeartbeatMonitors
+        self._buckets = {}
+        # interval -> TimerHandle of the bucket's next tick
+        self._timers = {}
+
+    def add(self, monitor):
+        interval = monitor.interval
+        bucket = self._buckets.get(interval)
+        if bucket is None:
+            bucket = self._buckets[interval] = set()
+            self._timers[interval] = self.loop.call_later(interval / 2, self._tick, interval)
+        bucket.add(monitor)
+
+    def remove(self, monitor):
+        interval = monitor.interval
+        bucket = self._buckets.get(interval)
+        if bucket is None:
+            return
+        bucket.discard(monitor)
+        if not bucket:
+            del self._buckets[interval]
+            self._timers.pop(interval).cancel()
+
+    def _tick(self, interval):
+        self._timers[interval] = self.loop.call_later(interval / 2, self._tick, interval)
+        now = self.loop.time()
+        # Checks may remove monitors
+        for monitor in list(self._buckets[interval]):
+            monitor.check(now)
@@ -1,8 +1,13 @@
 import asyncio
+import collections
+import concurrent.futures
+import functools
 import re
 import sys
 from operator import delitem
 from . import spec
+from . import message
+from . import sharedmem
 from .exceptions import Deleted, AMQPError, ConsumerCancelled
 from .compat import _UserCoroutine
 
@@ -54,7 +59,7 @@ class Queue(object):
         self.deleted = False
 
     @asyncio.coroutine
-    def bind(self, exchange, routing_key, *, arguments=None):
+    def bind(self, exchange, routing_key, *, nowait=False, arguments=None):
         """
         Bind a queue to an exchange, with the supplied routing key.
 
@@ -65,6 +70,7 @@ class Queue(object):
 
         :param asynqp.Exchange exchange: the :class:`Exchange` to bind to
         :param str routing_key: the routing key under which to bind
+        :keyword bool nowait: If true, will not wait for a bind-ok to arrive.
         :keyword dict arguments: Table of optional parameters for extensions to the AMQP protocol. See :ref:`extensions`.
 
         :return: The new :class:`QueueBinding` object
@@ -72,13 +78,13 @@ class Queue(object):
         if self.deleted:
             raise Deleted("Queue {} was deleted".format(self.name))
 
-        self.sender.send_QueueBind(self.name, exchange.name, routing_key, arguments or {})
-        yield from self.synchroniser.await(spec.QueueBindOK)
-        b = QueueBinding(self.reader, self.sender, self.synchroniser, self, exchange, routing_key)
-        self.reader.ready()
-        return b
+        self.sender.send_QueueBind(self.name, exchange.name, routing_key, nowait, arguments or {})
+        if not nowait:
+            yield from self.synchroniser.await(spec.QueueBindOK)
+        return QueueBinding(self.reader, self.sender, self.synchroniser, self, exchange, routing_key)
 
-    def consume(self, callback, *, no_local=False, no_ack=False, exclusive=False, arguments=None):
+    def consume(self, callback, *, no_local=False, no_ack=False, exclusive=False, arguments=None,
+                stream=False, max_buffered_bytes=1048576, spill_threshold=None):
         """
         Start a consumer on the queue. Messages will be delivered asynchronously to the consumer.
         The callback function will be called whenever a new message arrives on the queue.
@@ -90,6 +96,25 @@ class Queue(object):
         * ``callback.on_cancel()``: called with no parameters when the consumer is successfully cancelled.
         * ``callback.on_error(exc)``: called when the channel is closed due to an error.
           The argument passed is the exception which caused the error.
+        * ``callback.allocate_body(body_length)``: called when a message's content header arrives.
+          May return a writable buffer of ``body_length`` bytes to assemble the body in,
+          in which case the message's ``body`` is a :class:`memoryview` over that buffer.
+          If it returns ``None`` the body is assembled as :class:`bytes`.
+
+        If ``stream`` is true, the callback is called as soon as a message's
+        content header arrives, and the message's ``body`` is a
+        :class:`~asynqp.message.BodyStream` to read the body from as it arrives.
+        No more than ``max_buffered_bytes`` of it are held in memory: beyond
+        that, nothing more is read on the channel until the body is read.
+        The body must therefore be read to the end or discarded before the
+        next message can arrive.
+
+        If ``spill_threshold`` is given, bodies larger than that many bytes
+        are written to a memory-mapped temporary file as they arrive, instead
+        of being held in memory. The message's ``body`` is then a
+        :class:`memoryview` over the map, which the OS pages in as it is read.
+        The file is deleted once the message is acked or rejected, or
+        otherwise when the body is garbage collected.
 
         This method is a :ref:`coroutine <coroutine>`.
 
@@ -100,31 +125,50 @@ class Queue(object):
         :keyword bool no_ack: If true, messages delivered to the consumer don't require acknowledgement.
         :keyword bool exclusive: If true, only this consumer can access the queue.
         :keyword dict arguments: Table of optional parameters for extensions to the AMQP protocol. See :ref:`extensions`.
+        :keyword bool stream: If true, deliver messages before their bodies have arrived.
+        :keyword int max_buffered_bytes: The most bytes of a streamed body to
+            read ahead of the consumer.
+        :keyword int spill_threshold: The size in bytes above which bodies are
+            kept on disk rather than in memory.
 
         :return: The newly created :class:`Consumer` object.
         """
         return _ConsumerContext(self._consume(
             callback, no_local=no_local, no_ack=no_ack,
-            exclusive=exclusive, arguments=arguments))
+            exclusive=exclusive, arguments=arguments,
+            stream_buffer=max_buffered_bytes if stream else None,
+            spill_threshold=spill_threshold))
 
     @asyncio.coroutine
     def _consume(self, callback, *, no_local=False, no_ack=False,
-                 exclusive=False, arguments=None):
+                 exclusive=False, arguments=None, stream_buffer=None,
+                 spill_threshold=None):
         if self.deleted:
             raise Deleted("Queue {} was deleted".format(self.name))
 
         self.sender.send_BasicConsume(
             self.name, no_local, no_ack, exclusive, arguments or {})
-        tag = yield from self.synchroniser.await(spec.BasicConsumeOK)
+        fut = self.synchroniser.await(spec.BasicConsumeOK)
+        try:
+            tag = yield from fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The consumer got started right before we were cancelled
+                _abandon_consumer(
+                    fut.result(), self.consumers, self.sender,
+                    self.synchroniser, self.reader, loop=self._loop)
+            raise
         consumer = Consumer(
             tag, callback, self.sender, self.synchroniser, self.reader,
-            loop=self._loop)
+            loop=self._loop, stream_buffer=stream_buffer,
+            spill_threshold=spill_threshold)
         self.consumers.add_consumer(consumer)
         self.reader.ready()
         return consumer
 
     def queued_consumer(self, *, no_local=False, no_ack=False, exclusive=False,
-                        arguments=None):
+                        arguments=None, max_buffered_messages=0,
+                        max_buffered_bytes=0, spill_threshold=None):
         """
         Start a consumer on the queue. Messages will be delivered and stored
         in a queue-like :class:`QueuedConsumer` object. Example:
@@ -149,6 +193,19 @@ class Queue(object):
             queue.
         :keyword dict arguments: Table of optional parameters for extensions to
             the AMQP protocol. See :ref:`extensions`.
+        :keyword int max_buffered_messages: If non-zero, stop reading frames
+            on the channel once this many messages are waiting in the consumer.
+            Reading resumes once the buffer is drained to half of that.
+        :keyword int max_buffered_bytes: The same as ``max_buffered_messages``,
+            but limits the total size of the buffered message bodies.
+        :keyword int spill_threshold: The size in bytes above which bodies are
+            kept on disk rather than in memory, see :meth:`consume`.
+        :note: While the buffer is full nothing else is read on the channel
+            either, so don't wait for other methods on the same channel
+            (e.g. :meth:`Queue.bind`) before draining the consumer.
+            If all channels are full, the connection stops reading from the
+            socket altogether. This bounds memory use regardless of the
+            prefetch count.
         :note: If created with ``no_ack=True``, the consumer will not purge
             messages on channel/connection errors. If ``no_ack=False`` such an
             error will reject messages, so they will be removed from queue
@@ -158,13 +215,94 @@ class Queue(object):
         """
         return _ConsumerContext(self._queued_consumer(
             no_local=no_local, no_ack=no_ack, exclusive=exclusive,
-            arguments=arguments))
+            arguments=arguments, max_buffered_messages=max_buffered_messages,
+            max_buffered_bytes=max_buffered_bytes,
+            spill_threshold=spill_threshold))
 
     @asyncio.coroutine
     def _queued_consumer(
             self, *, no_local=False, no_ack=False, exclusive=False,
-            arguments=None):
-        consumer = QueuedConsumer(loop=self._loop, no_ack=no_ack)
+            arguments=None, max_buffered_messages=0, max_buffered_bytes=0,
+            spill_threshold=None):
+        consumer = QueuedConsumer(
+            loop=self._loop, no_ack=no_ack, reader=self.reader,
+            max_buffered_messages=max_buffered_messages,
+            max_buffered_bytes=max_buffered_bytes)
+        handle = yield from self._consume(
+            consumer, no_local=no_local, no_ack=no_ack, exclusive=exclusive,
+            arguments=arguments, spill_threshold=spill_threshold)
+        consumer._set_consumer_handle(handle)
+        return consumer
+
+    def executor_consumer(self, handler, executor, *, ordered_ack=False,
+                          requeue_on_error=True, shared_memory=None,
+                          no_local=False, no_ack=False, exclusive=False,
+                          arguments=None):
+        """
+        Start a consumer on the queue, which runs ``handler`` for each message
+        in a :mod:`concurrent.futures` executor instead of on the event loop.
+        Use this for CPU-heavy handlers, which would otherwise block the loop
+        (and heartbeats along with it).
+
+        Once the handler returns the message is acked. If it raises, the message
+        is rejected and the exception is passed to the event loop's exception
+        handler. Example:
+
+        .. code-block:: python
+
+            def handle(msg):
+                data = json.loads(zlib.decompress(msg.body))
+                validate(data)
+
+            executor = concurrent.futures.ThreadPoolExecutor(8)
+            consumer = yield from queue.executor_consumer(handle, executor)
+
+        If ``executor`` is a :class:`~concurrent.futures.ProcessPoolExecutor`
+        only the message body and properties are sent to the worker process,
+        and the handler receives a plain :class:`~asynqp.Message`.
+        In that case ``handler`` must be picklable (i.e. a module-level function).
+        To avoid copying large bodies through a pipe, pass a
+        :class:`~asynqp.SharedMemoryPool` as ``shared_memory``; the
+        worker then gets a message whose body is a :class:`memoryview` over
+        shared memory, valid only until the handler returns.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :param callable handler: a function accepting a single message argument.
+        :param concurrent.futures.Executor executor: the executor to run
+            ``handler`` in.
+        :keyword bool ordered_ack: If true, messages are acked (or rejected)
+            in the order they were delivered, even if handlers finish out of order.
+        :keyword bool requeue_on_error: If true, messages for which the handler
+            raised are requeued by the broker.
+        :keyword SharedMemoryPool shared_memory: pool of shared memory segments
+            for large bodies. Only used with a process pool executor.
+        :keyword bool no_local: If true, the server will not deliver messages
+            that were published by this connection.
+        :keyword bool no_ack: If true, messages delivered to the consumer don't
+            require acknowledgement.
+        :keyword bool exclusive: If true, only this consumer can access the
+            queue.
+        :keyword dict arguments: Table of optional parameters for extensions to
+            the AMQP protocol. See :ref:`extensions`.
+
+        :return: The newly created :class:`ExecutorConsumer` object.
+        """
+        return _ConsumerContext(self._executor_consumer(
+            handler, executor, ordered_ack=ordered_ack,
+            requeue_on_error=requeue_on_error, shared_memory=shared_memory,
+            no_local=no_local, no_ack=no_ack, exclusive=exclusive,
+            arguments=arguments))
+
+    @asyncio.coroutine
+    def _executor_consumer(
+            self, handler, executor, *, ordered_ack=False,
+            requeue_on_error=True, shared_memory=None, no_local=False,
+            no_ack=False, exclusive=False, arguments=None):
+        consumer = ExecutorConsumer(
+            handler, executor, loop=self._loop, no_ack=no_ack,
+            ordered_ack=ordered_ack, requeue_on_error=requeue_on_error,
+            shared_memory=shared_memory)
         handle = yield from self._consume(
             consumer, no_local=no_local, no_ack=no_ack, exclusive=exclusive,
             arguments=arguments)
@@ -187,7 +325,8 @@ class Queue(object):
             raise Deleted("Queue {} was deleted".format(self.name))
 
         self.sender.send_BasicGet(self.name, no_ack)
-        tag_msg = yield from self.synchroniser.await(spec.BasicGetOK, spec.BasicGetEmpty)
+        tag_msg = yield from _await_and_hold(
+            self.synchroniser, self.reader, spec.BasicGetOK, spec.BasicGetEmpty)
 
         if tag_msg is not None:
             consumer_tag, msg = tag_msg
@@ -197,6 +336,59 @@ class Queue(object):
         self.reader.ready()
         return msg
 
+    @asyncio.coroutine
+    def get_many(self, count, *, no_ack=False):
+        """
+        Get up to ``count`` messages from the queue in one round trip.
+
+        All ``count`` requests are sent to the broker at once and the replies
+        are matched in order, so draining a queue this way is not limited to
+        one message per round trip like :meth:`get`.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :param int count: the number of messages to ask for
+        :keyword bool no_ack: if true, the broker does not require acknowledgement of receipt of the messages.
+
+        :return: a list of :class:`~asynqp.message.IncomingMessage`, in the order they
+            were taken from the queue. It is shorter than ``count``, possibly empty,
+            if the queue ran empty.
+        """
+        if self.deleted:
+            raise Deleted("Queue {} was deleted".format(self.name))
+        if count < 1:
+            raise ValueError("count must be positive")
+
+        self.sender.send_BasicGets(self.name, no_ack, count)
+        waiters = [self.synchroniser.await(spec.BasicGetOK, spec.BasicGetEmpty)
+                   for _ in range(count)]
+
+        messages = []
+        for i, waiter in enumerate(waiters):
+            try:
+                tag_msg = yield from waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.reader.ready()
+                    # The reply came in, but we won't return it
+                    if waiter.exception() is None and waiter.result() is not None:
+                        messages.append(waiter.result()[1])
+                _abandon_gets(waiters[i + 1:])
+                # Don't keep what nobody is going to get
+                if not no_ack:
+                    for msg in messages:
+                        msg.reject(requeue=True)
+                raise
+            except Exception:
+                _abandon_gets(waiters[i + 1:])
+                raise
+            self.reader.ready()
+            # A message may be published after the queue ran empty, so the
+            # replies after a BasicGetEmpty may still carry messages
+            if tag_msg is not None:
+                messages.append(tag_msg[1])
+        return messages
+
     @asyncio.coroutine
     def purge(self):
         """
@@ -206,7 +398,6 @@ class Queue(object):
         """
         self.sender.send_QueuePurge(self.name)
         yield from self.synchroniser.await(spec.QueuePurgeOK)
-        self.reader.ready()
 
     @asyncio.coroutine
     def delete(self, *, if_unused=True, if_empty=True):
@@ -226,7 +417,6 @@ class Queue(object):
         self.sender.send_QueueDelete(self.name, if_unused, if_empty)
         yield from self.synchroniser.await(spec.QueueDeleteOK)
         self.deleted = True
-        self.reader.ready()
 
 
 class QueueBinding(object):
@@ -274,7 +464,6 @@ class QueueBinding(object):
         self.sender.send_QueueUnbind(self.queue.name, self.exchange.name, self.routing_key, arguments or {})
         yield from self.synchroniser.await(spec.QueueUnbindOK)
         self.deleted = True
-        self.reader.ready()
 
 
 class Consumer(object):
@@ -297,7 +486,8 @@ class Consumer(object):
 
         Boolean. True if the consumer has been successfully cancelled.
     """
-    def __init__(self, tag, callback, sender, synchroniser, reader, *, loop):
+    def __init__(self, tag, callback, sender, synchroniser, reader, *, loop,
+                 stream_buffer=None, spill_threshold=None):
         self._loop = loop
         self.tag = tag
         self.callback = callback
@@ -305,6 +495,10 @@ class Consumer(object):
         self.cancelled = False
         self.synchroniser = synchroniser
         self.reader = reader
+        # Bytes of a streamed body to buffer, None if bodies aren't streamed
+        self.stream_buffer = stream_buffer
+        # Size above which bodies are spilled to disk, None to never spill
+        self.spill_threshold = spill_threshold
         self.cancelled_future = asyncio.Future(loop=self._loop)
 
     @asyncio.coroutine
@@ -314,9 +508,14 @@ class Consumer(object):
 
         This method is a :ref:`coroutine <coroutine>`.
         """
+        # A full QueuedConsumer would hold back the BasicCancelOK
+        release_reader = getattr(self.callback, '_release_reader', None)
+        if release_reader is not None:
+            release_reader()
         try:
             self.sender.send_BasicCancel(self.tag)
-            yield from self.synchroniser.await(spec.BasicCancelOK)
+            yield from _await_and_hold(
+                self.synchroniser, self.reader, spec.BasicCancelOK)
         except AMQPError:
             pass
         else:
@@ -351,24 +550,72 @@ class QueueFactory(object):
     @asyncio.coroutine
     def declare(self, name, durable, exclusive, auto_delete, passive, nowait,
                 arguments):
-        if not VALID_QUEUE_NAME_RE.match(name):
-            raise ValueError(
-                "Not a valid queue name.\n"
-                "Valid names consist of letters, digits, hyphen, underscore, "
-                "period, or colon, and do not begin with 'amq.'")
-        if not name and nowait:
-            raise ValueError("Declaring the queue without `name` and with "
-                             "`nowait` is forbidden")
-
-        self.sender.send_QueueDeclare(
-            name, durable, exclusive, auto_delete, passive, nowait, arguments)
-        if not nowait:
-            name = yield from self.synchroniser.await(spec.QueueDeclareOK)
-            self.reader.ready()
-        q = Queue(self.reader, self.consumers, self.synchroniser, self.sender,
-                  name, durable, exclusive, auto_delete, arguments,
-                  loop=self._loop)
-        return q
+        _check_queue_name(name, nowait)
+
+        # A server-named queue is a new queue every time
+        cache = self.sender.cache_for(auto_delete, arguments) if name else None
+        declaration = (durable, exclusive, auto_delete, passive, arguments)
+        if cache is None or not cache.is_declared('queue', name, declaration):
+            self.sender.send_QueueDeclare(
+                name, durable, exclusive, auto_delete, passive, nowait, arguments)
+            if not nowait:
+                name = yield from self.synchroniser.await(spec.QueueDeclareOK)
+                if cache is not None:
+                    cache.declared('queue', name, declaration)
+        return self.create(name, durable, exclusive, auto_delete, arguments)
+
+    def create(self, name, durable, exclusive, auto_delete, arguments):
+        return Queue(self.reader, self.consumers, self.synchroniser, self.sender,
+                     name, durable, exclusive, auto_delete, arguments,
+                     loop=self._loop)
+
+
+@asyncio.coroutine
+def _await_and_hold(synchroniser, reader, *methods):
+    # For replies after which the caller calls `ready()` itself. If the
+    # caller got cancelled right after the reply came in, it won't.
+    fut = synchroniser.await(*methods)
+    try:
+        return (yield from fut)
+    except asyncio.CancelledError:
+        if fut.done() and not fut.cancelled():
+            reader.ready()
+        raise
+
+
+def _abandon_gets(waiters):
+    # The channel actor lets replies to cancelled waiters through by itself
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.cancel()
+        elif not waiter.cancelled():
+            # Retrieve the exception of a dead channel
+            waiter.exception()
+
+
+def _abandon_consumer(tag, consumers, sender, synchroniser, reader, *, loop):
+    """ Cancel a consumer which nobody is going to get, after its BasicConsumeOK """
+    # Messages delivered before the cancel goes through go back to the queue
+    consumer = Consumer(
+        tag, _requeue, sender, synchroniser, reader, loop=loop)
+    consumers.add_consumer(consumer)
+    asyncio.async(consumer.cancel(), loop=loop)
+    reader.ready()
+
+
+def _requeue(msg):
+    msg.reject(requeue=True)
+
+
+def _check_queue_name(name, nowait=False):
+    if not VALID_QUEUE_NAME_RE.match(name):
+        raise ValueError(
+            "Not a valid queue name.\n"
+            "Valid names consist of letters, digits, hyphen, underscore, "
+            "period, or colon, and do not begin with 'amq.'")
+    if not name and nowait:
+        raise ValueError("Declaring the queue without `name` and with "
+                         "`nowait` is forbidden")
 
 
 class Consumers(object):
@@ -381,6 +628,26 @@ class Consumers(object):
         # so the consumer gets garbage collected when it is cancelled
         consumer.cancelled_future.add_done_callback(lambda fut: delitem(self.consumers, fut.result().tag))
 
+    def get_body_allocator(self, tag):
+        consumer = self.consumers.get(tag)
+        if consumer is None:
+            return None
+        # Look the hook up on the type, so plain functions (and mocks) don't
+        # get mistaken for consumers which allocate their own bodies
+        if getattr(type(consumer.callback), 'allocate_body', None) is not None:
+            return consumer.callback.allocate_body
+        if consumer.spill_threshold is not None:
+            return functools.partial(message.spill_body, consumer.spill_threshold)
+        return None
+
+    def get_body_stream(self, tag):
+        consumer = self.consumers.get(tag)
+        if consumer is None or consumer.stream_buffer is None:
+            return None
+        return functools.partial(
+            message.BodyStream, reader=consumer.reader,
+            max_buffered_bytes=consumer.stream_buffer, loop=self.loop)
+
     def deliver(self, tag, msg):
         assert tag in self.consumers, "Message got delivered to a non existent consumer"
         consumer = self.consumers[tag]
@@ -434,18 +701,40 @@ class QueuedConsumer:
         Boolean. True if the consumer has been successfully cancelled.
     """
 
-    def __init__(self, *, loop, no_ack):
+    def __init__(self, *, loop, no_ack, reader=None, max_buffered_messages=0,
+                 max_buffered_bytes=0):
         self.loop = loop
-        self._queue = asyncio.Queue(loop=loop)
+        self._buffer = collections.deque()
         self._exc = None
-        self._waiters = []
+        # Futures of ``get()`` calls waiting for a message
+        self._waiters = collections.deque()
         self._cancelled = False
         self._no_ack = no_ack
+        self._reader = reader
+        self._max_messages = max_buffered_messages
+        self._max_bytes = max_buffered_bytes
+        self._buffered_bytes = 0
+        self._reader_paused = False
+        # Set once the buffer must not pause the reader anymore
+        self._reader_released = False
+        # State of a pending ``getmany()`` call
+        self._batch_waiter = None
+        self._batch_limits = (None, None)
+        self._batch_expired = False
 
     # Magical ``consume()`` interface for callbacks
 
     def __call__(self, msg):
-        self._queue.put_nowait(msg)
+        self._buffer.append(msg)
+        self._buffered_bytes += len(msg.body)
+        if (not self._reader_paused and not self._reader_released and
+                self._over_high_water()):
+            self._reader_paused = True
+            self._reader.pause()
+        if self._waiters:
+            self._wake_waiter()
+        if self._batch_waiter is not None and self._batch_ready():
+            self._wake_batch_waiter()
 
     def on_error(self, exc):
         # So future calls raise error
@@ -453,22 +742,85 @@ class QueuedConsumer:
         if not self._no_ack:
             # Purge all messages, that were in queue. They are to be treated as
             # nack'ed
-            while True:
-                try:
-                    self._queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    break
-
-        # All pending waiters if any must be killed with the same exception
-        for waiter in self._waiters:
-            waiter.set_exception(exc)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+        # Nothing more will arrive, so don't keep the connection blocked
+        self._release_reader()
+        # All pending waiters will see the error
+        self._wake_all_waiters()
+        self._wake_batch_waiter()
 
     def on_cancel(self):
         self._cancelled = True
+        self._release_reader()
+        self._wake_all_waiters()
+        self._wake_batch_waiter()
 
     def _set_consumer_handle(self, consumer):
         self._consumer = consumer
 
+    def _over_high_water(self):
+        return ((self._max_messages and len(self._buffer) >= self._max_messages) or
+                (self._max_bytes and self._buffered_bytes >= self._max_bytes))
+
+    def _under_low_water(self):
+        return ((not self._max_messages or len(self._buffer) <= self._max_messages // 2) and
+                (not self._max_bytes or self._buffered_bytes <= self._max_bytes // 2))
+
+    def _release_reader(self):
+        # Once the consumer is cancelled or dead, the frames following its
+        # messages must be read regardless of the buffer
+        self._reader_released = True
+        self._resume_reader()
+
+    def _resume_reader(self):
+        if self._reader_paused:
+            self._reader_paused = False
+            self._reader.resume()
+
+    def _taken(self, msg):
+        self._buffered_bytes -= len(msg.body)
+        if self._reader_paused and self._under_low_water():
+            self._resume_reader()
+
+    def _batch_ready(self):
+        if not self._buffer:
+            return False
+        max_items, max_bytes = self._batch_limits
+        # A full buffer won't take the messages which would fill the batch
+        if self._batch_expired or self._reader_paused or (max_items is None and max_bytes is None):
+            return True
+        return ((max_items is not None and len(self._buffer) >= max_items) or
+                (max_bytes is not None and self._buffered_bytes >= max_bytes))
+
+    def _wake_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _wake_all_waiters(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _wake_batch_waiter(self):
+        waiter = self._batch_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _batch_window_expired(self):
+        self._batch_expired = True
+        if self._batch_ready():
+            self._wake_batch_waiter()
+
+    def _get_nowait(self):
+        msg = self._buffer.popleft()
+        self._taken(msg)
+        return msg
+
     # Public API
 
     @property
@@ -490,7 +842,7 @@ class QueuedConsumer:
 
     def empty(self):
         """ Check if no messages arrived on the consumer """
-        return self._queue.empty()
+        return not self._buffer
 
     @asyncio.coroutine
     def get(self):
@@ -507,43 +859,96 @@ class QueuedConsumer:
         # If there are items in queue - just return them, as we don't interact
         # with server. If created with no_ack=False messages will be purged
         # anyway on error.
-        if not self._queue.empty():
-            return self._queue.get_nowait()
-
-        if self._exc:
-            raise self._exc
-        if self._cancelled:
-            raise ConsumerCancelled()
-
-        task = asyncio.async(self._queue.get(), loop=self.loop)
-        self._waiters.append(task)
-        # waiters will never be big. You will not want to call `.get()`
-        # too many times. This code serves for the case when you really want
-        # to call it 2 and more in parallel.
-        task.add_done_callback(lambda t, w=self._waiters: w.remove(t))
-        return task
+        while not self._buffer:
+            if self._exc:
+                raise self._exc
+            if self._cancelled:
+                raise ConsumerCancelled()
+            # A bare future rather than a task: nothing is scheduled unless
+            # the buffer actually runs empty
+            waiter = asyncio.Future(loop=self.loop)
+            self._waiters.append(waiter)
+            try:
+                yield from waiter
+            except asyncio.CancelledError:
+                # Don't lose a wakeup meant for this call
+                if waiter.done() and not waiter.cancelled() and self._buffer:
+                    self._wake_waiter()
+                raise
+        return self._get_nowait()
 
     @asyncio.coroutine
-    def getmany(self):
+    def getmany(self, *, max_items=None, max_bytes=None, timeout=None):
         """
             Get all accumulated messages. If no messages arrived yet - wait
             for at least 1 message.
             This coroutine is usefull when we can perform *bulk* processing
             of messages. For example inserting it into a DB in bulk.
 
+            With ``max_items`` or ``max_bytes`` it waits for a whole batch
+            instead: it returns once the batch is full, or once ``timeout``
+            seconds have passed (with at least 1 message). It also returns
+            once the consumer's buffer is full, if that holds fewer messages
+            or bytes than a batch. This trades a bounded
+            amount of latency for bigger batches:
+
+            .. code-block:: python
+
+                while True:
+                    batch = yield from consumer.getmany(
+                        max_items=1000, max_bytes=2 ** 20, timeout=0.5)
+                    insert_into_db(batch)
+
+            Only one ``getmany()`` call may wait at a time.
+
             This method is a :ref:`coroutine <coroutine>`.
 
+            :keyword int max_items: the batch is full with this many messages.
+                No more messages than this are returned.
+            :keyword int max_bytes: the batch is full once the bodies of its
+                messages add up to at least this many bytes.
+            :keyword float timeout: how long to wait for the batch to fill up.
+                ``None`` means wait until it is full.
+
             :return: a ``list`` of :class:`IncomingMessage`
                 objects
         """
-        if self._queue.empty():
-            msg = yield from self.get()
-            return [msg]
-        else:
-            res = []
-            while not self.empty():
-                res.append(self._queue.get_nowait())
-            return res
+        if self._batch_waiter is not None:
+            raise RuntimeError("getmany() is already waiting for a batch")
+
+        self._batch_limits = (max_items, max_bytes)
+        timer = None
+        try:
+            while not self._batch_ready():
+                if not self._buffer:
+                    if self._exc:
+                        raise self._exc
+                    if self._cancelled:
+                        raise ConsumerCancelled()
+                elif self._exc or self._cancelled:
+                    # No more messages will arrive, return the last ones
+                    break
+                if timeout is not None and timer is None:
+                    timer = self.loop.call_later(timeout, self._batch_window_expired)
+                self._batch_waiter = asyncio.Future(loop=self.loop)
+                yield from self._batch_waiter
+        finally:
+            self._batch_waiter = None
+            self._batch_expired = False
+            if timer is not None:
+                timer.cancel()
+
+        batch = []
+        size = 0
+        while self._buffer:
+            if max_items is not None and len(batch) >= max_items:
+                break
+            if max_bytes is not None and size >= max_bytes:
+                break
+            msg = self._get_nowait()
+            batch.append(msg)
+            size += len(msg.body)
+        return batch
 
     # Python 3.5 API
 
@@ -553,9 +958,174 @@ class QueuedConsumer:
         def __aiter__(self):
             return self
 
+        # Avoid wrapping ``get()`` in another coroutine for every message
+        __anext__ = get
+
         @asyncio.coroutine
-        def __anext__(self):
-            return (yield from self.get())
+        def __aenter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __aexit__(self, exc_type, exc, tb):
+            yield from self.cancel()
+
+
+def _run_detached(handler, body, properties):
+    """ Runs in a worker process. Rebuilds the message from its reduced form """
+    if not isinstance(body, sharedmem.SharedBody):
+        return handler(message.Message(body, **properties))
+
+    segment, view = body.open()
+    try:
+        return handler(message.Message(view, **properties))
+    finally:
+        view.release()
+        segment.close()
+
+
+class ExecutorConsumer:
+    """
+    A consumer which runs its handler in a :mod:`concurrent.futures` executor
+    and acknowledges messages once the handler has finished.
+
+    ExecutorConsumer is created using
+    :meth:`Queue.executor_consumer() <Queue.executor_consumer>`.
+
+    .. attribute :: tag
+
+        A string representing the *consumer tag* used by the server to identify
+            this consumer.
+
+    .. attribute :: cancelled
+
+        Boolean. True if the consumer has been successfully cancelled.
+    """
+
+    def __init__(self, handler, executor, *, loop, no_ack, ordered_ack,
+                 requeue_on_error, shared_memory=None):
+        self.loop = loop
+        self.handler = handler
+        self.executor = executor
+        self._no_ack = no_ack
+        self._ordered_ack = ordered_ack
+        self._requeue_on_error = requeue_on_error
+        self._detach = isinstance(
+            executor, concurrent.futures.ProcessPoolExecutor)
+        self._shared_memory = shared_memory if self._detach else None
+        # Segments holding bodies of messages not yet passed to the executor
+        self._segments = {}
+        # (message, future, segment) in delivery order
+        self._pending = collections.deque()
+        self._exc = None
+
+    # Magical ``consume()`` interface for callbacks
+
+    def __call__(self, msg):
+        if self._detach:
+            segment = self._segments.pop(id(msg.body), None)
+            if segment is not None:
+                body = sharedmem.SharedBody(segment.name, len(msg.body))
+            else:
+                body = msg.body
+            fut = self.loop.run_in_executor(
+                self.executor, _run_detached, self.handler,
+                body, message.get_plain_properties(msg))
+        else:
+            segment = None
+            fut = self.loop.run_in_executor(self.executor, self.handler, msg)
+        self._pending.append((msg, fut, segment))
+        fut.add_done_callback(self._handler_done)
+
+    def allocate_body(self, body_length):
+        pool = self._shared_memory
+        if pool is None or body_length < pool.threshold:
+            return None
+        segment = pool.acquire(body_length)
+        buffer = segment.buf[:body_length]
+        self._segments[id(buffer)] = segment
+        return buffer
+
+    def on_error(self, exc):
+        # Unacked messages will be redelivered by the broker, nothing to do
+        # with them here
+        self._exc = exc
+        # Messages which were being assembled will never be delivered
+        for segment in self._segments.values():
+            self._shared_memory.release(segment)
+        self._segments.clear()
+
+    def _set_consumer_handle(self, consumer):
+        self._consumer = consumer
+
+    def _handler_done(self, fut):
+        if self._ordered_ack:
+            while self._pending and self._pending[0][1].done():
+                self._settle(*self._pending.popleft())
+        else:
+            for i, (msg, pending_fut, segment) in enumerate(self._pending):
+                if pending_fut is fut:
+                    del self._pending[i]
+                    self._settle(msg, fut, segment)
+                    break
+
+    def _settle(self, msg, fut, segment):
+        try:
+            self._ack_or_reject(msg, fut)
+        finally:
+            if segment is not None:
+                msg.body.release()
+                self._shared_memory.release(segment)
+
+    def _ack_or_reject(self, msg, fut):
+        exc = None if fut.cancelled() else fut.exception()
+        if exc is not None:
+            self.loop.call_exception_handler({
+                'message': 'Exception in consumer handler',
+                'exception': exc,
+                'future': fut,
+            })
+        if self._no_ack or self._exc is not None:
+            return
+        if exc is None and not fut.cancelled():
+            msg.ack()
+        else:
+            msg.reject(requeue=self._requeue_on_error)
+
+    # Public API
+
+    @property
+    def tag(self):
+        return self._consumer.tag
+
+    @property
+    def cancelled(self):
+        return self._consumer.cancelled
+
+    @asyncio.coroutine
+    def cancel(self):
+        """
+        Cancel the consumer and stop recieving messages. Waits for handlers,
+        that are already running, to finish and their messages to be acked.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        yield from self._consumer.cancel()
+        yield from self.join()
+
+    @asyncio.coroutine
+    def join(self):
+        """
+        Wait until all delivered messages have been handled.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        while self._pending:
+            yield from asyncio.wait(
+                [fut for _, fut, _ in self._pending], loop=self.loop)
+
+    # Python 3.5 API
+
+    if PY_35:
 
         @asyncio.coroutine
         def __aenter__(self):
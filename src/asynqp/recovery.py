@@ -0,0 +1,388 @@
+import asyncio
+import random
+
+from .queue import _ConsumerContext
+from .log import log
+
+
+class RecoveringConnection(object):
+    """
+    A :class:`Connection` which reconnects by itself when the connection to
+    the broker is lost, and restores what was set up on it.
+
+    Recovering connections are created using :func:`asynqp.connect_recovering() <connect_recovering>`.
+
+    Channels opened on a recovering connection record the exchanges and queues
+    declared on them, queue bindings, QoS settings, return handlers and
+    consumers started with :meth:`Queue.consume`. Once the connection is lost
+    (or closed by the broker) it is re-established with a jittered exponential
+    backoff, and all of that is replayed on the new connection.
+    Declarations are replayed with ``nowait`` and pipelined, so a recovery costs
+    a handful of round trips regardless of the size of the topology.
+    Declaring a named exchange or queue, or a binding, again on the same
+    channel replaces the earlier record, so it is replayed only once.
+
+    The channel, exchange, queue and consumer objects handed out stay valid
+    across recoveries. While the connection is down, calls on them raise
+    the error which closed the connection. Use :meth:`wait_recovered` to wait
+    for the connection to come back.
+
+    Consumer callbacks get ``on_error`` called when the connection is lost,
+    and go on receiving messages once it has been recovered.
+
+    .. attribute:: connection
+
+        the current underlying :class:`Connection`
+
+    .. attribute:: recovery_time
+
+        how long in seconds the last recovery took, from noticing the connection was lost
+        to having restored everything on the new one. ``None`` if it never recovered.
+    """
+    def __init__(self, connect, *, min_delay=0.1, max_delay=30, loop):
+        # coroutine function, which returns a new Connection
+        self._connect = connect
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._loop = loop
+        self.connection = None
+        self.recovery_time = None
+        self._channels = []
+        self._recovery = None
+        self._closing = False
+
+    @asyncio.coroutine
+    def open(self):
+        """
+        Connect for the first time. Errors are not retried.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        self._attach((yield from self._connect()))
+
+    @asyncio.coroutine
+    def open_channel(self):
+        """
+        Open a new channel on this connection.
+
+        This method is a :ref:`coroutine <coroutine>`.
+
+        :return: The new :class:`RecoveringChannel` object.
+        """
+        channel = yield from self.connection.open_channel()
+        proxy = RecoveringChannel(self, channel)
+        self._channels.append(proxy)
+        return proxy
+
+    def is_recovering(self):
+        """
+        :return: ``True`` while the connection is down and being recovered.
+        """
+        return self._recovery is not None and not self._recovery.done()
+
+    @asyncio.coroutine
+    def wait_recovered(self):
+        """
+        Wait until the connection has been recovered. Returns right away if it is not down.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        if self.is_recovering():
+            yield from asyncio.shield(self._recovery, loop=self._loop)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the connection and stop recovering it.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        self._closing = True
+        if self._recovery is not None:
+            self._recovery.cancel()
+        yield from self.connection.close()
+
+    def _attach(self, connection):
+        self.connection = connection
+        connection.closed.add_done_callback(self._connection_closed)
+
+    def _connection_closed(self, future):
+        if self._closing:
+            return
+        log.warning("Connection closed unexpectedly (%r), recovering", future.result())
+        self._recovery = asyncio.async(self._recover(), loop=self._loop)
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.min_delay * 2 ** (attempt - 1))
+        # Don't let all clients of a failed broker come back at once
+        return random.uniform(delay / 2, delay)
+
+    @asyncio.coroutine
+    def _recover(self):
+        started = self._loop.time()
+        attempt = 0
+        while True:
+            # The first attempt is immediate, the broker may be back already
+            if attempt:
+                yield from asyncio.sleep(self._backoff(attempt), loop=self._loop)
+            attempt += 1
+            connection = None
+            try:
+                connection = yield from self._connect()
+                yield from self._restore(connection)
+                break
+            except asyncio.CancelledError:
+                if connection is not None:
+                    asyncio.async(connection.close(), loop=self._loop)
+                raise
+            except Exception as exc:
+                log.warning("Recovery attempt %d failed: %r", attempt, exc)
+                if connection is not None and not connection.is_closed():
+                    yield from connection.close()
+
+        self._attach(connection)
+        self.recovery_time = self._loop.time() - started
+        log.info("Connection recovered in %.3fs", self.recovery_time)
+
+    @asyncio.coroutine
+    def _restore(self, connection):
+        channels = list(self._channels)
+        new_channels = yield from asyncio.gather(
+            *[connection.open_channel() for _ in channels], loop=self._loop)
+        yield from asyncio.gather(
+            *[c._restore_channel(new) for c, new in zip(channels, new_channels)],
+            loop=self._loop)
+
+        # The order matters: a queue can only be bound once it is declared.
+        # Each step is pipelined on every channel, only the last declaration
+        # on a channel waits for its -OK. Channels are independent of each
+        # other though, so wait for all of them before the next step.
+        yield from _replay([c._exchange_steps() for c in channels], self._loop)
+        yield from _replay([c._queue_steps() for c in channels], self._loop)
+        yield from _replay([c._binding_steps() for c in channels], self._loop)
+
+        yield from asyncio.gather(
+            *[consumer._restore() for c in channels for q in c._queues for consumer in q._consumers],
+            loop=self._loop)
+
+    def _forget_exchange(self, name):
+        for channel in self._channels:
+            for queue in channel._queues:
+                queue._bindings = [b for b in queue._bindings if b.exchange.name != name]
+
+
+@asyncio.coroutine
+def _replay(steps_per_channel, loop):
+    yield from asyncio.gather(
+        *[_replay_channel(steps) for steps in steps_per_channel if steps], loop=loop)
+
+
+@asyncio.coroutine
+def _replay_channel(steps):
+    # Frames on a channel are processed in order, so the -OK to the last one
+    # means all of them are done
+    for step in steps[:-1]:
+        yield from step(True)
+    yield from steps[-1](False)
+
+
+class _Proxy(object):
+    """ Forwards everything, which is not recorded, to the current object """
+    _target = None
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class RecoveringChannel(_Proxy):
+    """
+    A :class:`Channel` on a :class:`RecoveringConnection`.
+    Has the same methods as :class:`Channel`.
+    """
+    def __init__(self, connection, channel):
+        self._connection = connection
+        self._target = channel
+        self._qos = None
+        self._return_handler = None
+        self._exchanges = []
+        self._queues = []
+
+    @asyncio.coroutine
+    def declare_exchange(self, name, type, *, nowait=False, **kwargs):
+        exchange = yield from self._target.declare_exchange(name, type, nowait=nowait, **kwargs)
+        proxy = RecoveringExchange(self, exchange, kwargs)
+        # The default exchange always exists
+        if name:
+            self._exchanges = [e for e in self._exchanges if e.name != name]
+            self._exchanges.append(proxy)
+        return proxy
+
+    @asyncio.coroutine
+    def declare_queue(self, name='', *, nowait=False, **kwargs):
+        queue = yield from self._target.declare_queue(name, nowait=nowait, **kwargs)
+        # Redeclaring a queue keeps its bindings and consumers. A server-named
+        # queue is a new queue every time.
+        for proxy in self._queues:
+            if name and proxy._requested_name == name:
+                proxy._target = queue
+                proxy._declare_kwargs = kwargs
+                return proxy
+        proxy = RecoveringQueue(self, queue, name, kwargs)
+        self._queues.append(proxy)
+        return proxy
+
+    @asyncio.coroutine
+    def set_qos(self, prefetch_size=0, prefetch_count=0, apply_globally=False):
+        yield from self._target.set_qos(prefetch_size, prefetch_count, apply_globally)
+        self._qos = (prefetch_size, prefetch_count, apply_globally)
+
+    def set_return_handler(self, handler):
+        self._target.set_return_handler(handler)
+        self._return_handler = handler
+
+    @asyncio.coroutine
+    def close(self):
+        self._connection._channels.remove(self)
+        yield from self._target.close()
+
+    @asyncio.coroutine
+    def _restore_channel(self, channel):
+        self._target = channel
+        if self._return_handler is not None:
+            channel.set_return_handler(self._return_handler)
+        if self._qos is not None:
+            yield from channel.set_qos(*self._qos)
+
+    def _exchange_steps(self):
+        return [e._restore for e in self._exchanges]
+
+    def _queue_steps(self):
+        return [q._restore for q in self._queues]
+
+    def _binding_steps(self):
+        return [b._restore for q in self._queues for b in q._bindings]
+
+
+class RecoveringExchange(_Proxy):
+    """
+    An :class:`Exchange` on a :class:`RecoveringConnection`.
+    Has the same methods as :class:`Exchange`.
+    """
+    def __init__(self, channel, exchange, declare_kwargs):
+        self._channel = channel
+        self._target = exchange
+        self._declare_kwargs = declare_kwargs
+
+    def publish(self, message, routing_key, *, mandatory=True):
+        self._target.publish(message, routing_key, mandatory=mandatory)
+
+    @asyncio.coroutine
+    def delete(self, *, if_unused=True):
+        yield from self._target.delete(if_unused=if_unused)
+        if self in self._channel._exchanges:
+            self._channel._exchanges.remove(self)
+        self._channel._connection._forget_exchange(self.name)
+
+    @asyncio.coroutine
+    def _restore(self, nowait):
+        self._target = yield from self._channel._target.declare_exchange(
+            self._target.name, self._target.type, nowait=nowait, **self._declare_kwargs)
+
+
+class RecoveringQueue(_Proxy):
+    """
+    A :class:`Queue` on a :class:`RecoveringConnection`.
+    Has the same methods as :class:`Queue`.
+
+    A queue declared with a server-generated name gets a new name when it
+    is recovered.
+    """
+    def __init__(self, channel, queue, requested_name, declare_kwargs):
+        self._channel = channel
+        self._target = queue
+        self._requested_name = requested_name
+        self._declare_kwargs = declare_kwargs
+        self._bindings = []
+        self._consumers = []
+
+    @asyncio.coroutine
+    def bind(self, exchange, routing_key, *, nowait=False, arguments=None):
+        binding = yield from self._target.bind(
+            exchange, routing_key, nowait=nowait, arguments=arguments)
+        proxy = RecoveringBinding(self, binding, arguments)
+        self._bindings = [b for b in self._bindings if b._key() != proxy._key()]
+        self._bindings.append(proxy)
+        return proxy
+
+    def consume(self, callback, **kwargs):
+        return _ConsumerContext(self._consume(callback, kwargs))
+
+    @asyncio.coroutine
+    def _consume(self, callback, kwargs):
+        consumer = yield from self._target.consume(callback, **kwargs)
+        proxy = RecoveringConsumer(self, consumer, callback, kwargs)
+        self._consumers.append(proxy)
+        return proxy
+
+    @asyncio.coroutine
+    def delete(self, *, if_unused=True, if_empty=True):
+        yield from self._target.delete(if_unused=if_unused, if_empty=if_empty)
+        if self in self._channel._queues:
+            self._channel._queues.remove(self)
+
+    @asyncio.coroutine
+    def _restore(self, nowait):
+        # We need the -OK to learn a server-generated name
+        self._target = yield from self._channel._target.declare_queue(
+            self._requested_name, nowait=nowait and bool(self._requested_name),
+            **self._declare_kwargs)
+
+
+class RecoveringBinding(_Proxy):
+    """
+    A :class:`QueueBinding` on a :class:`RecoveringConnection`.
+    Has the same methods as :class:`QueueBinding`.
+    """
+    def __init__(self, queue, binding, arguments):
+        self._queue = queue
+        self._target = binding
+        self._arguments = arguments
+
+    @asyncio.coroutine
+    def unbind(self, arguments=None):
+        yield from self._target.unbind(arguments)
+        if self in self._queue._bindings:
+            self._queue._bindings.remove(self)
+
+    def _key(self):
+        return (self._target.exchange.name, self._target.routing_key, self._arguments or {})
+
+    @asyncio.coroutine
+    def _restore(self, nowait):
+        self._target = yield from self._queue._target.bind(
+            self._target.exchange, self._target.routing_key,
+            nowait=nowait, arguments=self._arguments)
+
+
+class RecoveringConsumer(_Proxy):
+    """
+    A :class:`Consumer` on a :class:`RecoveringConnection`.
+    Has the same methods as :class:`Consumer`.
+    Its ``tag`` changes when it is recovered.
+    """
+    def __init__(self, queue, consumer, callback, consume_kwargs):
+        self._queue = queue
+        self._target = consumer
+        self._callback = callback
+        self._consume_kwargs = consume_kwargs
+
+    @asyncio.coroutine
+    def cancel(self):
+        if self in self._queue._consumers:
+            self._queue._consumers.remove(self)
+        yield from self._target.cancel()
+
+    @asyncio.coroutine
+    def _restore(self):
+        self._target = yield from self._queue._target.consume(
+            self._callback, **self._consume_kwargs)
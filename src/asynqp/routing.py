@@ -6,22 +6,44 @@ from .log import log
 
 class Dispatcher(object):
     def __init__(self):
-        self.handlers = {}
+        # Indexed by channel id, None for ids which are not in use
+        self.handlers = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
 
     def add_handler(self, channel_id, handler):
+        missing = channel_id + 1 - len(self.handlers)
+        if missing > 0:
+            self.handlers.extend([None] * missing)
+        assert self.handlers[channel_id] is None, "channel id is in use"
         self.handlers[channel_id] = handler
+        self._count += 1
 
     def remove_handler(self, channel_id):
-        del self.handlers[channel_id]
+        if self.get_handler(channel_id) is None:
+            raise KeyError(channel_id)
+        self.handlers[channel_id] = None
+        self._count -= 1
+
+    def get_handler(self, channel_id):
+        if channel_id < len(self.handlers):
+            return self.handlers[channel_id]
+        return None
 
     def dispatch(self, frame):
         if isinstance(frame, frames.HeartbeatFrame):
             return
-        handler = self.handlers[frame.channel_id]
+        handler = self.get_handler(frame.channel_id)
+        if handler is None:
+            # The channel was closed on our end already
+            log.warning("Discarding a frame for channel %d, which is not open", frame.channel_id)
+            return
         handler(frame)
 
     def dispatch_all(self, frame):
-        for handler in self.handlers.values():
+        for handler in [h for h in self.handlers if h is not None]:
             handler(frame)
 
 
@@ -36,6 +58,11 @@ class Sender(object):
             raise self._exception
         self.protocol.send_method(self.channel_id, method)
 
+    def send_frames(self, frames):
+        if self._exception is not None:
+            raise self._exception
+        self.protocol.send_frames(frames)
+
     def killall(self, exc):
         self._exception = exc
 
@@ -56,10 +83,20 @@ class Actor(object):
 
 
 class Synchroniser(object):
+    """
+    Matches replies to the requests awaiting them.
+
+    The broker answers synchronous methods in the order they were sent,
+    so several requests can be in flight at once: every reply goes to the
+    oldest request awaiting that method.
+    """
 
     def __init__(self, *, loop):
         self._loop = loop
         self._futures = collections.defaultdict(collections.deque)
+        # Futures awaiting one of several methods, like
+        # (spec.BasicGetOK, spec.BasicGetEmpty), with those methods
+        self._alternatives = {}
         self.connection_exc = None
 
     def await(self, *expected_methods):
@@ -71,22 +108,32 @@ class Synchroniser(object):
 
         for method in expected_methods:
             self._futures[method].append(fut)
+        if len(expected_methods) > 1:
+            self._alternatives[fut] = expected_methods
         return fut
 
     def notify(self, method, result=None):
-        while True:
-            try:
-                fut = self._futures[method].popleft()
-            except IndexError:
-                # XXX: we can't just ignore this.
-                log.error("Got an unexpected method notification %s", method)
-                return
-            # We can have done futures if they were awaited together, like
-            # (spec.BasicGetOK, spec.BasicGetEmpty).
-            if not fut.done():
-                break
+        """
+        Hand the reply to the oldest request awaiting ``method``.
 
+        Returns False if nobody takes it, because that request was cancelled.
+        """
+        try:
+            fut = self._futures[method].popleft()
+        except IndexError:
+            # XXX: we can't just ignore this.
+            log.error("Got an unexpected method notification %s", method)
+            return False
+        for other in self._alternatives.pop(fut, ()):
+            if other is not method:
+                self._futures[other].remove(fut)
+
+        # A cancelled request still takes its reply, or every reply after
+        # it would go to the wrong request
+        if fut.done():
+            return False
         fut.set_result(result)
+        return True
 
     def killall(self, exc):
         """ Connection/Channel was closed. All subsequent and ongoing requests
@@ -100,21 +147,35 @@ class Synchroniser(object):
                     continue
                 fut.set_exception(exc)
         self._futures.clear()
+        self._alternatives.clear()
 
 
 # When ready() is called, wait for a frame to arrive on the queue.
 # When the frame does arrive, dispatch it to the handler and do nothing
 # until someone calls ready() again.
+#
+# While paused (see pause()) frames are only queued up, until the last
+# pauser calls resume(). Once draining (see drain()) nothing pauses it anymore.
 class QueuedReader(object):
-    def __init__(self, handler, *, loop):
+    def __init__(self, handler, *, loop, flow_control=None):
         self.handler = handler
         self.is_waiting = False
         self.pending_frames = collections.deque()
         self._loop = loop
+        # Notified when this reader stops or starts releasing frames, so the
+        # transport can be paused once no channel is reading
+        self._flow_control = flow_control
+        self._paused = 0
+        self._draining = False
+
+    @property
+    def _holding(self):
+        """ True while frames are queued up rather than released """
+        return self._paused > 0 and not self._draining
 
     def ready(self):
         assert not self.is_waiting, "ready() got called while waiting for a frame to be read"
-        if self.pending_frames:
+        if self.pending_frames and not self._holding:
             frame = self.pending_frames.popleft()
             # We will call it in another tick just to be more strict about the
             # sequence of frames
@@ -123,10 +184,42 @@ class QueuedReader(object):
             self.is_waiting = True
 
     def feed(self, frame):
-        if self.is_waiting:
+        if isinstance(frame, frames.PoisonPillFrame):
+            # The frames held back won't be answered by anyone anymore
+            self.drain()
+        if self.is_waiting and not self._holding:
             self.is_waiting = False
             # We will call it in another tick just to be more strict about the
             # sequence of frames
             self._loop.call_soon(self.handler.handle, frame)
         else:
             self.pending_frames.append(frame)
+
+    def pause(self):
+        self._paused += 1
+        if self._paused == 1 and not self._draining and self._flow_control is not None:
+            self._flow_control.reader_paused()
+
+    def resume(self):
+        assert self._paused, "resume() got called on a reader which is not paused"
+        self._paused -= 1
+        if self._paused or self._draining:
+            return
+        self._released()
+
+    def drain(self):
+        """ Release every frame from now on, however often the reader is paused.
+            For a closing channel, whose CloseOK would be held back otherwise.
+        """
+        if self._draining:
+            return
+        self._draining = True
+        if self._paused:
+            self._released()
+
+    def _released(self):
+        if self._flow_control is not None:
+            self._flow_control.reader_resumed()
+        if self.is_waiting and self.pending_frames:
+            self.is_waiting = False
+            self._loop.call_soon(self.handler.handle, self.pending_frames.popleft())
@@ -0,0 +1,364 @@
+import asyncio
+import bisect
+import collections
+import functools
+import itertools
+import sys
+import uuid
+
+from . import frames
+from . import spec
+from .exceptions import AMQPError
+from .message import Message
+from .log import log
+
+PY_35 = sys.version_info >= (3, 5)
+
+# RabbitMQ's pseudo-queue for replies, see https://www.rabbitmq.com/direct-reply-to.html
+REPLY_TO = 'amq.rabbitmq.reply-to'
+
+
+class RpcClient(object):
+    """
+    Makes request/response calls to services listening on AMQP queues.
+
+    Requests carry RabbitMQ's ``amq.rabbitmq.reply-to`` pseudo-queue as
+    their ``reply_to`` address, so no reply queue needs to be declared.
+    Replies are matched to requests by their ``correlation_id``, which lets
+    any number of calls be in flight at once.
+
+    RPC clients are created using :meth:`Channel.rpc_client() <Channel.rpc_client>`.
+
+    .. code-block:: python
+
+        client = await channel.rpc_client(timeout=5)
+        reply = await client.call('rpc.exchange', 'service.method', asynqp.Message({'x': 1}))
+
+    Direct replies arrive on the channel the request was published on, so
+    the client publishes on its own channel. Use the channel for nothing
+    else which consumes.
+
+    .. attribute:: timeout
+
+        the default timeout of a call in seconds, or ``None`` to wait forever
+    """
+    def __init__(self, channel, *, timeout=None, loop):
+        self.channel = channel
+        self.timeout = timeout
+        self._loop = loop
+        self._consumer = None
+        # correlation id -> Future of the reply
+        self._calls = {}
+        # Correlation ids are unique per client, a counter on top of that is
+        # cheaper than a uuid per call
+        self._prefix = uuid.uuid4().hex + '.'
+        self._counter = itertools.count()
+        self._closed = False
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Start consuming replies.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        queue = self.channel.queue_factory.create(REPLY_TO, False, True, True, {})
+        # The pseudo-queue only works with no_ack
+        self._consumer = yield from queue.consume(_ReplyConsumer(self), no_ack=True)
+
+    def call(self, exchange_name, routing_key, message, *, timeout=None, mandatory=False):
+        """
+        Publish a request and wait for the reply.
+
+        The message's ``reply_to`` and ``correlation_id`` properties are set
+        by this method.
+
+        :param str exchange_name: the name of the exchange to publish the request to
+        :param str routing_key: the routing key with which to publish the request
+        :param asynqp.Message message: the request
+        :keyword float timeout: seconds to wait for the reply. Defaults to :attr:`timeout`.
+        :keyword bool mandatory: publish the request as mandatory. A request which
+            can't be routed is then returned to the channel's return handler
+            (see :meth:`Channel.set_return_handler`).
+
+        :return: a :class:`~asyncio.Future` of the reply, an
+            :class:`~asynqp.message.IncomingMessage`. It raises
+            :class:`asyncio.TimeoutError` if the reply doesn't arrive in time.
+        """
+        if self._closed:
+            raise RuntimeError("RPC client is closed")
+
+        correlation_id = self._prefix + str(next(self._counter))
+        message.reply_to = REPLY_TO
+        message.correlation_id = correlation_id
+        self.channel.sender.send_BasicPublish(exchange_name, routing_key, mandatory, message)
+
+        fut = asyncio.Future(loop=self._loop)
+        self._calls[correlation_id] = fut
+        timeout = self.timeout if timeout is None else timeout
+        handle = None
+        if timeout is not None:
+            handle = self._loop.call_later(timeout, _time_out, fut)
+        # However the call ends, it is forgotten
+        fut.add_done_callback(functools.partial(self._forget, correlation_id, handle))
+        return fut
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Stop consuming replies. Calls still waiting for a reply are cancelled.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for fut in list(self._calls.values()):
+            fut.cancel()
+        if self._consumer is not None:
+            yield from self._consumer.cancel()
+
+    def _forget(self, correlation_id, handle, fut):
+        if self._calls.get(correlation_id) is fut:
+            del self._calls[correlation_id]
+        if handle is not None:
+            handle.cancel()
+
+    def _reply(self, msg):
+        fut = self._calls.get(msg.correlation_id)
+        if fut is None:
+            log.warning("Discarding a reply to an unknown call %r, it probably timed out", msg.correlation_id)
+            return
+        if not fut.done():
+            fut.set_result(msg)
+
+    def _error(self, exc):
+        self._closed = True
+        for fut in list(self._calls.values()):
+            if not fut.done():
+                fut.set_exception(exc)
+
+
+def _time_out(fut):
+    if not fut.done():
+        fut.set_exception(asyncio.TimeoutError())
+
+
+class _ReplyConsumer(object):
+    """ Consumer callback of an :class:`RpcClient` """
+    __slots__ = ('_client',)
+
+    def __init__(self, client):
+        self._client = client
+
+    def __call__(self, msg):
+        self._client._reply(msg)
+
+    def on_error(self, exc):
+        self._client._error(exc)
+
+
+class RpcServer(object):
+    """
+    Answers requests arriving on a queue, such as those made by an :class:`RpcClient`.
+
+    RPC servers are created using :meth:`Channel.rpc_server() <Channel.rpc_server>`.
+
+    ``handler`` is called with each request and returns the reply: a
+    :class:`Message`, or a body to make one of. The reply is published to the
+    request's ``reply_to`` address with its ``correlation_id``, and the
+    request is acked right after it. If the handler raises, the request is
+    rejected and the exception is passed to the event loop's exception handler.
+
+    At most ``concurrency`` requests are handled at once. Replies and acks
+    of requests which finish in the same iteration of the event loop are
+    written to the socket together.
+
+    .. attribute:: latency
+
+        a :class:`LatencyHistogram` of the time from a request's arrival
+        to its reply being written
+    """
+    def __init__(self, channel, handler, *, concurrency, executor=None,
+                 requeue_on_error=False, loop):
+        self.channel = channel
+        self.handler = handler
+        self.concurrency = concurrency
+        self.executor = executor
+        self.requeue_on_error = requeue_on_error
+        self.latency = LatencyHistogram()
+        self._loop = loop
+        self._consumer = None
+        self._running = set()
+        # (request, arrival time) waiting for a free slot
+        self._backlog = collections.deque()
+        # Frames of replies and acks, and the arrival times of their requests
+        self._outgoing = []
+        self._answered = []
+        self._flush_handle = None
+        self._exc = None
+
+    # Magical ``consume()`` interface for callbacks
+
+    def __call__(self, msg):
+        arrived = self._loop.time()
+        if len(self._running) < self.concurrency:
+            self._start(msg, arrived)
+        else:
+            self._backlog.append((msg, arrived))
+
+    def on_error(self, exc):
+        # Unacked requests will be redelivered by the broker
+        self._exc = exc
+        self._backlog.clear()
+
+    def _set_consumer_handle(self, consumer):
+        self._consumer = consumer
+
+    def _start(self, msg, arrived):
+        if self.executor is not None:
+            fut = self._loop.run_in_executor(self.executor, self.handler, msg)
+        else:
+            fut = asyncio.async(self.handler(msg), loop=self._loop)
+        self._running.add(fut)
+        fut.add_done_callback(functools.partial(self._handled, msg, arrived))
+
+    def _handled(self, msg, arrived, fut):
+        self._running.discard(fut)
+        if self._exc is None:
+            self._respond(msg, fut)
+            self._answered.append(arrived)
+            if self._flush_handle is None:
+                self._flush_handle = self._loop.call_soon(self._flush)
+        if self._backlog:
+            self._start(*self._backlog.popleft())
+
+    def _respond(self, msg, fut):
+        exc = None if fut.cancelled() else fut.exception()
+        if exc is not None:
+            self._loop.call_exception_handler({
+                'message': 'Exception in RPC handler',
+                'exception': exc,
+                'future': fut,
+            })
+        if fut.cancelled() or exc is not None:
+            self._outgoing.append(frames.MethodFrame(
+                self.channel.id, spec.BasicReject(msg.delivery_tag, self.requeue_on_error)))
+            return
+
+        reply = fut.result()
+        if reply is not None and msg.reply_to:
+            if not isinstance(reply, Message):
+                reply = Message(reply)
+            if msg.correlation_id is not None:
+                reply.correlation_id = msg.correlation_id
+            self._outgoing.extend(self.channel.sender.publish_frames(
+                '', msg.reply_to, False, reply))
+        self._outgoing.append(frames.MethodFrame(
+            self.channel.id, spec.BasicAck(msg.delivery_tag, False)))
+
+    def _flush(self):
+        self._flush_handle = None
+        outgoing, self._outgoing = self._outgoing, []
+        answered, self._answered = self._answered, []
+        try:
+            self.channel.sender.send_frames(outgoing)
+        except AMQPError:
+            # The channel is gone, the requests will be redelivered
+            return
+        now = self._loop.time()
+        for arrived in answered:
+            self.latency.record(now - arrived)
+
+    # Public API
+
+    @property
+    def tag(self):
+        return self._consumer.tag
+
+    @asyncio.coroutine
+    def cancel(self):
+        """
+        Stop consuming requests. Waits for requests which are being handled
+        to be answered.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        yield from self._consumer.cancel()
+        yield from self.join()
+
+    @asyncio.coroutine
+    def join(self):
+        """
+        Wait until all requests delivered so far have been answered.
+
+        This method is a :ref:`coroutine <coroutine>`.
+        """
+        while self._running:
+            yield from asyncio.wait(list(self._running), loop=self._loop)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+
+    # Python 3.5 API
+
+    if PY_35:
+
+        @asyncio.coroutine
+        def __aenter__(self):
+            return self
+
+        @asyncio.coroutine
+        def __aexit__(self, exc_type, exc, tb):
+            yield from self.cancel()
+
+
+class LatencyHistogram(object):
+    """
+    Counts latencies in buckets, from 100 microseconds to 10 seconds with
+    four buckets per power of ten.
+
+    .. attribute:: bounds
+
+        the upper bounds of the buckets, in seconds
+
+    .. attribute:: counts
+
+        the number of latencies in each bucket. The last count is of latencies
+        above the last bound.
+
+    .. attribute:: count
+
+        the number of latencies recorded
+
+    .. attribute:: total
+
+        the sum of all latencies recorded, in seconds
+    """
+    bounds = tuple(10 ** (exponent / 4) for exponent in range(-16, 5))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, latency):
+        self.counts[bisect.bisect_left(self.bounds, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def percentile(self, percent):
+        """
+        :param float percent: e.g. ``99`` for the 99th percentile
+        :return: the upper bound of the bucket in which the percentile lies,
+            ``None`` if nothing was recorded or it is above the last bound.
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
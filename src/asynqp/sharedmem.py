@@ -0,0 +1,149 @@
+import collections
+import mmap
+import os
+import tempfile
+
+
+class SharedMemoryPool(object):
+    """
+    A pool of recycled shared memory segments,
+    used to hand large message bodies to worker processes without pickling them.
+
+    Pass it to :meth:`Queue.executor_consumer() <Queue.executor_consumer>`
+    together with a :class:`~concurrent.futures.ProcessPoolExecutor`.
+    Bodies of at least ``threshold`` bytes are then written straight into a segment
+    as their frames arrive, and the worker process receives a handle to the segment
+    instead of a copy of the body. The segment goes back to the pool once the message
+    has been acked.
+
+    Segments are memory-mapped files in ``/dev/shm`` where it exists,
+    and in the temporary directory otherwise.
+
+    :param int threshold: bodies smaller than this are sent to the worker as usual.
+    :param int max_free: the maximum number of unused segments kept for reuse.
+        Any more are unlinked as they are released.
+    """
+    def __init__(self, *, threshold=64 * 1024, max_free=16):
+        self.threshold = threshold
+        self.max_free = max_free
+        # segment size -> free segments of that size
+        self._free = collections.defaultdict(list)
+        self._free_count = 0
+
+    def acquire(self, size):
+        """ Get a segment with room for at least ``size`` bytes """
+        capacity = _round_up(size)
+        free = self._free[capacity]
+        if free:
+            segment = free.pop()
+            self._free_count -= 1
+        else:
+            segment = SharedSegment.create(capacity)
+        return segment
+
+    def release(self, segment):
+        """ Return a segment, acquired from this pool, for reuse """
+        if self._free_count < self.max_free:
+            self._free[_round_up(segment.size)].append(segment)
+            self._free_count += 1
+        else:
+            _destroy(segment)
+
+    def close(self):
+        """ Unlink all free segments. Segments in use are unlinked as they are released. """
+        for segments in self._free.values():
+            for segment in segments:
+                _destroy(segment)
+        self._free.clear()
+        self._free_count = 0
+        self.max_free = 0
+
+
+class SharedSegment(object):
+    """
+    A memory-mapped file which other processes can map by its ``name``.
+
+    .. attribute :: name
+
+        The path of the file.
+
+    .. attribute :: size
+
+        The size of the segment in bytes.
+
+    .. attribute :: buf
+
+        A writable :class:`memoryview` of the segment, or ``None`` once it has been closed.
+    """
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        with open(name, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), size)
+        self.buf = memoryview(self._mmap)
+
+    @classmethod
+    def create(cls, size):
+        fd, name = tempfile.mkstemp(prefix='asynqp-', dir=_shm_dir())
+        try:
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        return cls(name, size)
+
+    def close(self):
+        """ Unmap the segment. Views of :attr:`buf` must have been released first """
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+            self._mmap.close()
+
+    def unlink(self):
+        """ Remove the file. Processes which have it mapped keep their mapping """
+        try:
+            os.unlink(self.name)
+        except FileNotFoundError:
+            pass
+
+
+class SharedBody(object):
+    """
+    Picklable handle to a message body stored in a shared memory segment.
+    """
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __getstate__(self):
+        return self.name, self.size
+
+    def __setstate__(self, state):
+        self.name, self.size = state
+
+    def open(self):
+        """ Attach to the segment. Returns a ``(segment, memoryview)`` pair """
+        segment = SharedSegment(self.name, os.path.getsize(self.name))
+        return segment, segment.buf[:self.size]
+
+
+def _shm_dir():
+    # /dev/shm is a tmpfs on Linux, so its files never touch the disk
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return None
+
+
+def _round_up(size):
+    # Power-of-two size classes, so segments can be reused for bodies of
+    # similar sizes
+    capacity = 4096
+    while capacity < size:
+        capacity <<= 1
+    return capacity
+
+
+def _destroy(segment):
+    segment.close()
+    segment.unlink()
@@ -48,8 +48,11 @@ class MockServerContext(LoopContext):
 
 
 class OpenConnectionContext(MockServerContext):
+    declaration_cache = False
+
     def given_an_open_connection(self):
-        connection_info = {'username': 'guest', 'password': 'guest', 'virtual_host': '/'}
+        connection_info = {'username': 'guest', 'password': 'guest', 'virtual_host': '/',
+                           'declaration_cache': self.declaration_cache}
         task = asyncio.async(open_connection(self.loop, self.transport, self.protocol, self.dispatcher, connection_info))
         self.tick()
 
@@ -66,8 +69,6 @@ class OpenConnectionContext(MockServerContext):
 
     def cleanup_connection(self):
         self.connection.protocol.heartbeat_monitor.stop()
-        self.loop.run_until_complete(
-            self.connection.protocol.heartbeat_monitor.wait_closed())
 
 
 class OpenChannelContext(OpenConnectionContext):
@@ -66,6 +66,59 @@ class WhenTheServerClosesAChannel(OpenChannelContext):
         self.server.should_have_received_method(self.channel.id, spec.ChannelCloseOK())
 
 
+class WhenOpeningAChannelAfterAnotherOneWasClosed(OpenChannelContext):
+    def given_a_closed_channel(self):
+        self.second = self.open_channel(2)
+        task = asyncio.async(self.channel.close())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.ChannelCloseOK())
+        task.result()
+        self.server.reset()
+
+    def when_I_open_another_channel(self):
+        self.result = self.open_channel(1)
+
+    def it_should_reuse_the_lowest_free_id(self):
+        self.server.should_have_received_method(1, spec.ChannelOpen(''))
+        assert self.result.id == 1
+
+
+class WhenOpeningAChannelAfterTheServerClosedOne(OpenChannelContext):
+    def given_the_server_closed_the_channel(self):
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'i am tired of you', 40, 50))
+
+    def when_I_open_another_channel(self):
+        self.result = self.open_channel(1)
+
+    def it_should_reuse_the_id(self):
+        assert self.result.id == 1
+
+
+class WhenServerAndClientCloseAChannelAtATimeTheIdIsHeld(OpenChannelContext):
+    def given_both_sides_closed_the_channel(self):
+        asyncio.async(self.channel.close(), loop=self.loop)
+        self.tick()
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'i am tired of you', 40, 50))
+
+    def when_I_open_another_channel(self):
+        self.async_partial(self.connection.open_channel())
+
+    def it_should_not_reuse_the_id_before_CloseOK_arrives(self):
+        self.server.should_have_received_method(2, spec.ChannelOpen(''))
+
+
+class WhenOpeningMoreChannelsThanChannelMax(OpenChannelContext):
+    def given_the_server_allows_one_channel(self):
+        self.connection.connection_info['channel_max'] = 1
+
+    def when_I_open_another_channel(self):
+        self.task = asyncio.async(self.connection.open_channel())
+        self.tick()
+
+    def it_should_raise_AMQPError(self):
+        assert isinstance(self.task.exception(), asynqp.AMQPError)
+
+
 class WhenAnotherMethodArrivesWhileTheChannelIsClosing(OpenChannelContext):
     def given_that_i_closed_the_channel(self):
         self.async_partial(self.channel.close())
@@ -142,6 +195,106 @@ class WhenBasicQOSOkArrives(OpenChannelContext):
         assert self.task.done()
 
 
+class DeclareTopologyContext(OpenChannelContext):
+    def given_a_topology(self):
+        self.exchanges = [{'name': 'my.exchange', 'type': 'topic'}]
+        self.queues = [{'name': 'my.queue', 'durable': False}, {'name': 'my.other.queue'}]
+        self.bindings = [
+            {'queue': 'my.queue', 'exchange': 'my.exchange', 'routing_key': 'a.*'},
+            {'queue': 'my.other.queue', 'exchange': 'my.exchange', 'routing_key': 'b.*'}]
+
+    def declare_topology(self):
+        return asyncio.async(self.channel.declare_topology(
+            exchanges=self.exchanges, queues=self.queues, bindings=self.bindings))
+
+
+class WhenDeclaringATopology(DeclareTopologyContext):
+    def when_I_declare_the_topology(self):
+        self.task = self.declare_topology()
+        self.tick()
+
+    def it_should_send_every_declaration_without_waiting_for_replies(self):
+        self.server.should_have_received_methods(self.channel.id, [
+            spec.ExchangeDeclare(0, 'my.exchange', 'topic', False, True, False, False, False, {}),
+            spec.QueueDeclare(0, 'my.queue', False, False, False, False, False, {}),
+            spec.QueueDeclare(0, 'my.other.queue', False, True, False, False, False, {}),
+            spec.QueueBind(0, 'my.queue', 'my.exchange', 'a.*', False, {}),
+            spec.QueueBind(0, 'my.other.queue', 'my.exchange', 'b.*', False, {})])
+
+    def it_should_wait_for_the_replies(self):
+        assert not self.task.done()
+
+
+class WhenTheRepliesToATopologyArrive(DeclareTopologyContext):
+    def given_I_declared_the_topology(self):
+        self.task = self.declare_topology()
+        self.tick()
+
+    def when_the_replies_arrive(self):
+        for method in [spec.ExchangeDeclareOK(),
+                       spec.QueueDeclareOK('my.queue', 0, 0),
+                       spec.QueueDeclareOK('my.other.queue', 0, 0),
+                       spec.QueueBindOK(),
+                       spec.QueueBindOK()]:
+            self.server.send_method(self.channel.id, method)
+        self.tick()
+        self.topology = self.task.result()
+
+    def it_should_return_the_exchanges(self):
+        assert self.topology.exchanges['my.exchange'].type == 'topic'
+
+    def it_should_return_the_queues(self):
+        assert not self.topology.queues['my.queue'].durable
+        assert self.topology.queues['my.other.queue'].durable
+
+    def it_should_return_the_bindings(self):
+        assert [(b.queue.name, b.exchange.name, b.routing_key) for b in self.topology.bindings] == [
+            ('my.queue', 'my.exchange', 'a.*'), ('my.other.queue', 'my.exchange', 'b.*')]
+
+    def it_should_not_report_errors(self):
+        assert self.topology.errors == []
+
+
+class WhenTheBrokerRefusesADeclarationInATopology(DeclareTopologyContext):
+    def given_I_declared_the_topology(self):
+        self.task = self.declare_topology()
+        self.tick()
+
+    def when_the_second_declaration_is_refused(self):
+        self.server.send_method(self.channel.id, spec.ExchangeDeclareOK())
+        self.server.send_method(self.channel.id, spec.ChannelClose(406, "the precondition, she failed", 50, 10))
+        self.tick()
+        self.topology = self.task.result()
+
+    def it_should_return_what_was_declared(self):
+        assert list(self.topology.exchanges) == ['my.exchange']
+        assert self.topology.queues == {}
+
+    def it_should_report_the_refused_declaration_first(self):
+        item, exc = self.topology.errors[0]
+        assert item is self.queues[0]
+        assert isinstance(exc, exceptions.PreconditionFailed)
+
+    def it_should_report_the_later_declarations(self):
+        assert [item for item, _ in self.topology.errors[1:]] == [self.queues[1]] + self.bindings
+
+
+class WhenATopologyBindsAQueueWhichIsNotDeclared(DeclareTopologyContext):
+    def given_a_binding_to_an_unknown_queue(self):
+        self.bindings.append({'queue': 'unknown', 'exchange': 'my.exchange', 'routing_key': ''})
+        self.server.reset()
+
+    def when_I_declare_the_topology(self):
+        self.task = self.declare_topology()
+        self.tick()
+
+    def it_should_throw_ValueError(self):
+        assert isinstance(self.task.exception(), ValueError)
+
+    def it_should_not_send_anything(self):
+        self.server.should_not_have_received_any()
+
+
 class WhenBasicReturnArrivesAndIHaveDefinedAHandler(OpenChannelContext):
     def given_a_message(self):
         self.expected_message = asynqp.Message('body')
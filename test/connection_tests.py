@@ -1,9 +1,10 @@
 import asyncio
 import sys
 import contexts
+import asynqp
 from asynqp import spec, exceptions
 from asynqp.connection import open_connection
-from .base_contexts import MockServerContext, OpenConnectionContext
+from .base_contexts import MockServerContext, OpenConnectionContext, LoopContext
 
 
 class WhenRespondingToConnectionStart(MockServerContext):
@@ -39,6 +40,61 @@ class WhenRespondingToConnectionTune(MockServerContext):
         self.server.should_have_received_methods(0, [tune_ok_method, open_method])
 
 
+class TuningContext(MockServerContext):
+    def start_connection(self, **preferences):
+        self.connection_info = {'username': 'guest', 'password': 'guest', 'virtual_host': '/'}
+        self.connection_info.update(preferences)
+        self.async_partial(open_connection(self.loop, self.transport, self.protocol, self.dispatcher, self.connection_info))
+        self.server.send_method(0, spec.ConnectionStart(0, 9, {}, 'PLAIN AMQPLAIN', 'en_US'))
+
+    def cleanup_heartbeat(self):
+        self.protocol.heartbeat_monitor.stop()
+
+
+class WhenTheClientPrefersLowerTuningValues(TuningContext):
+    def given_a_connection_with_preferences(self):
+        self.start_connection(frame_max=65536, channel_max=10, heartbeat=30)
+
+    def when_ConnectionTune_arrives(self):
+        self.server.send_method(0, spec.ConnectionTune(0, 131072, 600))
+
+    def it_should_agree_to_the_lower_values(self):
+        self.server.should_have_received_method(0, spec.ConnectionTuneOK(10, 65536, 30))
+
+    def it_should_use_the_negotiated_frame_max(self):
+        assert self.connection_info['frame_max'] == 65536
+
+
+class WhenTheClientPrefersHigherTuningValues(TuningContext):
+    def given_a_connection_with_preferences(self):
+        self.start_connection(frame_max=1048576, channel_max=2048, heartbeat=1200)
+
+    def when_ConnectionTune_arrives(self):
+        self.server.send_method(0, spec.ConnectionTune(1024, 131072, 600))
+
+    def it_should_agree_to_the_servers_limits(self):
+        self.server.should_have_received_method(0, spec.ConnectionTuneOK(1024, 131072, 600))
+
+
+class WhenTheClientTurnsHeartbeatsOff(TuningContext):
+    def given_a_connection_with_preferences(self):
+        self.start_connection(heartbeat=0)
+
+    def when_ConnectionTune_arrives(self):
+        self.server.send_method(0, spec.ConnectionTune(0, 131072, 600))
+
+    def it_should_ask_for_no_heartbeats(self):
+        self.server.should_have_received_method(0, spec.ConnectionTuneOK(0, 131072, 0))
+
+
+class WhenConnectingWithATooSmallFrameMax(LoopContext):
+    def when_I_connect(self):
+        self.exception = contexts.catch(self.loop.run_until_complete, asynqp.connect(frame_max=1024, loop=self.loop))
+
+    def it_should_raise_ValueError(self):
+        assert isinstance(self.exception, ValueError)
+
+
 class WhenRespondingToConnectionClose(OpenConnectionContext):
     def when_the_close_frame_arrives(self):
         self.server.send_method(0, spec.ConnectionClose(123, 'you muffed up', 10, 20))
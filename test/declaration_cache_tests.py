@@ -0,0 +1,164 @@
+import asyncio
+from asynqp import spec
+from .base_contexts import OpenChannelContext
+
+
+class DeclarationCacheContext(OpenChannelContext):
+    declaration_cache = True
+
+    def declare_exchange(self, name='my.exchange', **kwargs):
+        task = asyncio.async(self.channel.declare_exchange(name, 'topic', **kwargs))
+        self.tick()
+        if not task.done():
+            self.server.send_method(self.channel.id, spec.ExchangeDeclareOK())
+        return task.result()
+
+    def declare_queue(self, name='my.queue', reply_name=None, **kwargs):
+        task = asyncio.async(self.channel.declare_queue(name, **kwargs))
+        self.tick()
+        if not task.done():
+            self.server.send_method(self.channel.id, spec.QueueDeclareOK(reply_name or name, 0, 0))
+        return task.result()
+
+
+class WhenRedeclaringAnExchangeWithTheSameArguments(DeclarationCacheContext):
+    def given_a_declared_exchange(self):
+        self.declare_exchange(arguments={'alternate-exchange': 'other'})
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.exchange = self.declare_exchange(arguments={'alternate-exchange': 'other'})
+
+    def it_should_not_send_anything(self):
+        self.server.should_not_have_received_any()
+
+    def it_should_return_the_exchange(self):
+        assert self.exchange.name == 'my.exchange'
+
+
+class WhenRedeclaringAQueueWithDifferentArguments(DeclarationCacheContext):
+    def given_a_declared_queue(self):
+        self.declare_queue()
+        self.server.reset()
+
+    def when_I_redeclare_with_other_arguments(self):
+        self.declare_queue(durable=False)
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.QueueDeclare(0, 'my.queue', False, False, False, False, False, {}))
+
+
+class WhenRedeclaringAServerNamedQueue(DeclarationCacheContext):
+    def given_a_server_named_queue(self):
+        self.declare_queue('', reply_name='amq.gen-1')
+        self.server.reset()
+
+    def when_I_declare_another_one(self):
+        self.queue = self.declare_queue('', reply_name='amq.gen-2')
+
+    def it_should_declare_a_new_queue(self):
+        assert self.queue.name == 'amq.gen-2'
+
+
+class WhenRedeclaringAnAutoDeleteQueue(DeclarationCacheContext):
+    def given_an_auto_delete_queue(self):
+        self.declare_queue(auto_delete=True)
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_queue(auto_delete=True)
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.QueueDeclare(0, 'my.queue', False, True, False, True, False, {}))
+
+
+class WhenRedeclaringAnExpiringQueue(DeclarationCacheContext):
+    def given_a_queue_with_a_ttl(self):
+        self.declare_queue(arguments={'x-expires': 1000})
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_queue(arguments={'x-expires': 1000})
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.QueueDeclare(0, 'my.queue', False, True, False, False, False, {'x-expires': 1000}))
+
+
+class WhenRedeclaringAnAutoDeleteExchange(DeclarationCacheContext):
+    def given_an_auto_delete_exchange(self):
+        self.declare_exchange(auto_delete=True)
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_exchange(auto_delete=True)
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.ExchangeDeclare(0, 'my.exchange', 'topic', False, True, True, False, False, {}))
+
+
+class WhenATopologyDeclaresWhatTheBrokerDeletesByItself(DeclarationCacheContext):
+    def when_I_declare_auto_delete_and_expiring_declarations(self):
+        task = asyncio.async(self.channel.declare_topology(
+            exchanges=[{'name': 'my.exchange', 'type': 'topic', 'auto_delete': True}],
+            queues=[{'name': 'my.queue', 'auto_delete': True},
+                    {'name': 'other.queue', 'arguments': {'x-expires': 1000}}]))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.ExchangeDeclareOK())
+        self.server.send_method(self.channel.id, spec.QueueDeclareOK('my.queue', 0, 0))
+        self.server.send_method(self.channel.id, spec.QueueDeclareOK('other.queue', 0, 0))
+        task.result()
+
+    def it_should_not_cache_them(self):
+        assert not self.connection.declaration_cache._declared
+
+
+class WhenRedeclaringADeletedQueue(DeclarationCacheContext):
+    def given_a_deleted_queue(self):
+        queue = self.declare_queue()
+        task = asyncio.async(queue.delete())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.QueueDeleteOK(0))
+        task.result()
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_queue()
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.QueueDeclare(0, 'my.queue', False, True, False, False, False, {}))
+
+
+class WhenTheBrokerClosesAChannelWithAnError(DeclarationCacheContext):
+    def given_a_declared_exchange(self):
+        self.declare_exchange()
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'not found', 50, 10))
+        # The closed channel's id is reused
+        self.channel = self.open_channel(1)
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_exchange()
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.ExchangeDeclare(0, 'my.exchange', 'topic', False, True, False, False, False, {}))
+
+
+class WhenTheDeclarationCacheIsNotEnabled(DeclarationCacheContext):
+    declaration_cache = False
+
+    def given_a_declared_exchange(self):
+        self.declare_exchange()
+        self.server.reset()
+
+    def when_I_redeclare(self):
+        self.declare_exchange()
+
+    def it_should_declare_it_on_the_broker(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.ExchangeDeclare(0, 'my.exchange', 'topic', False, True, False, False, False, {}))
@@ -1,7 +1,10 @@
 import asynqp
 import asyncio
+import os
+import tempfile
 import uuid
 from datetime import datetime
+import contexts
 from unittest.mock import patch
 
 from asynqp import spec
@@ -159,6 +162,238 @@ class WhenPublishingALongMessage(ExchangeContext):
         ], any_order=False)
 
 
+class WhenPublishingWithAPreparedPublisher(ExchangeContext):
+    def given_a_publisher(self):
+        self.timestamp = datetime(2014, 5, 4)
+        self.publisher = self.exchange.prepare_publisher(
+            'routing.key', content_type='application/json', delivery_mode=2,
+            headers={'x': 1}, timestamp=self.timestamp)
+        self.body = b'a' * (self.frame_max - 8) + b'bc'
+
+    def when_I_publish_a_body(self):
+        self.publisher.publish(self.body)
+
+    def it_should_send_the_same_frames_as_publishing_a_message(self):
+        msg = asynqp.Message(
+            self.body, content_type='application/json', delivery_mode=2,
+            headers={'x': 1}, timestamp=self.timestamp)
+        expected_frames = self.channel.sender.publish_frames(self.exchange.name, 'routing.key', True, msg)
+        self.server.should_have_received_frames(expected_frames, any_order=False)
+
+
+class WhenAPreparedPublisherPublishesTwice(ExchangeContext):
+    def given_a_publisher_without_a_timestamp(self):
+        self.publisher = self.exchange.prepare_publisher('routing.key', mandatory=False)
+        self.server.reset()
+
+    def when_I_publish_two_bodies(self):
+        self.publisher.publish(b'first')
+        self.publisher.publish(b'')
+
+    def it_should_send_each_message_in_a_single_write(self):
+        assert len(self.server.data) == 2
+
+    def it_should_leave_out_the_timestamp(self):
+        header_frame = self.server.frames()[1]
+        assert header_frame.payload.properties[9] is None
+
+    def it_should_send_the_body_lengths(self):
+        headers = [f.payload for f in self.server.frames() if isinstance(f, frames.ContentHeaderFrame)]
+        assert [h.body_length for h in headers] == [5, 0]
+
+    def it_should_send_no_body_frame_for_an_empty_body(self):
+        assert len(self.server.frames()) == 5
+
+
+class ChunkIterator(object):
+    """ An async iterator over ``chunks``, which waits for ``gate`` first """
+    def __init__(self, chunks, gate=None):
+        self.chunks = list(chunks)
+        self.gate = gate
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if self.gate is not None:
+            yield from self.gate
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+
+class StreamingPublishContext(ExchangeContext):
+    def publish_stream(self, source, **kwargs):
+        task = asyncio.async(self.exchange.publish_stream(source, 'routing.key', **kwargs))
+        self.tick()
+        return task
+
+    def should_have_sent_body(self, body):
+        header_frame, *body_frames = [
+            f for f in self.server.frames()
+            if isinstance(f, (frames.ContentHeaderFrame, frames.ContentBodyFrame))]
+        assert header_frame.payload.body_length == len(body)
+        assert all(len(f.payload) <= self.frame_max - 8 for f in body_frames)
+        assert b''.join(bytes(f.payload) for f in body_frames) == body
+
+
+class WhenStreamingABodyFromABuffer(StreamingPublishContext):
+    def given_a_buffer(self):
+        self.body = bytearray(b'abc' * self.frame_max)
+
+    def when_I_publish_the_buffer(self):
+        self.task = self.publish_stream(self.body)
+
+    def it_should_send_a_BasicPublish_method(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.BasicPublish(0, self.exchange.name, 'routing.key', True, False))
+
+    def it_should_send_the_body_in_frames(self):
+        self.should_have_sent_body(bytes(self.body))
+
+    def it_should_finish(self):
+        assert self.task.result() is None
+
+
+class WhenStreamingABodyFromAFile(StreamingPublishContext):
+    def given_a_file(self):
+        fd, self.path = tempfile.mkstemp()
+        self.body = os.urandom(5 * self.frame_max + 17)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.body)
+
+    def when_I_publish_the_file(self):
+        self.task = self.publish_stream(self.path)
+
+    def it_should_send_the_body_in_frames(self):
+        self.should_have_sent_body(self.body)
+
+    def cleanup_the_file(self):
+        os.remove(self.path)
+
+
+class WhenStreamingAnEmptyFile(StreamingPublishContext):
+    def given_an_empty_file(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def when_I_publish_the_file(self):
+        self.task = self.publish_stream(self.path)
+
+    def it_should_send_a_header_without_body_frames(self):
+        self.should_have_sent_body(b'')
+
+    def cleanup_the_file(self):
+        os.remove(self.path)
+
+
+class WhenStreamingABodyFromAnAsyncIterator(StreamingPublishContext):
+    def given_an_async_iterator(self):
+        self.chunks = [b'a' * (self.frame_max + 5), b'', b'b' * 10]
+        self.iterator = ChunkIterator(self.chunks)
+
+    def when_I_publish_the_iterator(self):
+        self.task = self.publish_stream(self.iterator, length=self.frame_max + 15)
+
+    def it_should_split_the_chunks_into_frames(self):
+        self.should_have_sent_body(b''.join(self.chunks))
+
+
+class WhenStreamingAnAsyncIteratorWithoutALength(StreamingPublishContext):
+    def when_I_publish_the_iterator(self):
+        self.task = self.publish_stream(ChunkIterator([b'abc']))
+
+    def it_should_throw_TypeError(self):
+        assert isinstance(self.task.exception(), TypeError)
+
+
+class WhenAStreamedBodyEndsEarly(StreamingPublishContext):
+    def when_the_iterator_ends_short_of_the_length(self):
+        self.task = self.publish_stream(ChunkIterator([b'abc']), length=10)
+
+    def it_should_throw_ValueError(self):
+        assert isinstance(self.task.exception(), ValueError)
+
+    def it_should_make_the_channel_unusable(self):
+        assert contexts.catch(self.exchange.publish, asynqp.Message(b'x'), 'routing.key') is not None
+
+
+class WhenAStreamedBodyIsLongerThanItsLength(StreamingPublishContext):
+    def given_nothing_was_sent_yet(self):
+        self.server.reset()
+
+    def when_the_iterator_produces_more_than_the_length(self):
+        self.task = self.publish_stream(ChunkIterator([b'abcdef']), length=3)
+
+    def it_should_throw_ValueError(self):
+        assert isinstance(self.task.exception(), ValueError)
+
+    def it_should_not_publish_the_message(self):
+        self.server.should_not_have_received_any()
+
+
+class WhenTheBrokerClosesTheChannelWhileABodyIsStreamed(StreamingPublishContext):
+    def given_a_body_which_is_being_streamed(self):
+        self.gate = asyncio.Future()
+        self.task = self.publish_stream(ChunkIterator([b'abc'], self.gate), length=3)
+        self.server.reset()
+
+    def when_the_broker_closes_the_channel(self):
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'Not found', 0, 0))
+        self.tick()
+        self.gate.set_result(None)
+        self.tick()
+
+    def it_should_answer_with_ChannelCloseOK(self):
+        self.server.should_have_received_method(self.channel.id, spec.ChannelCloseOK())
+
+    def it_should_fail_the_publish(self):
+        assert isinstance(self.task.exception(), exceptions.NotFound)
+
+
+class WhenTheTransportIsFullWhileABodyIsStreamed(StreamingPublishContext):
+    def given_a_full_transport(self):
+        self.body = b'x' * (3 * self.channel.sender.stream_write_size)
+        self.protocol.pause_writing()
+        self.server.reset()
+
+    def when_I_publish_a_large_body(self):
+        self.task = self.publish_stream(self.body)
+        self.tick()
+        self.sent_while_full = len(self.server.data)
+        self.protocol.resume_writing()
+        self.loop.run_until_complete(self.task)
+
+    def it_should_stop_writing_while_the_transport_is_full(self):
+        assert self.sent_while_full == 1
+
+    def it_should_send_the_rest_once_the_transport_drains(self):
+        self.should_have_sent_body(self.body)
+
+
+class WhenPublishingOnAChannelWhileABodyIsStreamed(StreamingPublishContext):
+    def given_a_body_which_is_being_streamed(self):
+        self.gate = asyncio.Future()
+        self.task = self.publish_stream(ChunkIterator([b'abc'], self.gate), length=3)
+        self.server.reset()
+
+    def when_I_publish_another_message_meanwhile(self):
+        self.exchange.publish(asynqp.Message(b'other'), 'routing.key')
+        self.tick()
+        self.held_back = not self.server.frames()
+        self.gate.set_result(None)
+        self.tick()
+        self.tick()
+
+    def it_should_hold_the_message_back(self):
+        assert self.held_back
+
+    def it_should_send_the_message_once_the_body_is_sent(self):
+        bodies = [bytes(f.payload) for f in self.server.frames() if isinstance(f, frames.ContentBodyFrame)]
+        assert bodies == [b'abc', b'other']
+
+
 class WhenDeletingAnExchange(ExchangeContext):
     def when_I_delete_the_exchange(self):
         self.async_partial(self.exchange.delete(if_unused=True))
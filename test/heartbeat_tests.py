@@ -1,8 +1,11 @@
 import asyncio
+import asynqp
 from unittest import mock
+from asynqp import protocol
+from asynqp import spec
 from asynqp.frames import HeartbeatFrame
 from asynqp.exceptions import ConnectionLostError
-from .base_contexts import MockServerContext
+from .base_contexts import MockServerContext, LoopContext
 
 
 class WhenServerWaitsForHeartbeat(MockServerContext):
@@ -15,9 +18,6 @@ class WhenServerWaitsForHeartbeat(MockServerContext):
 
     def cleanup_tasks(self):
         self.protocol.heartbeat_monitor.stop()
-        self.loop.run_until_complete(
-            asyncio.wait_for(self.protocol.heartbeat_monitor.wait_closed(),
-                             timeout=0.2))
 
 
 class WhenServerRespondsToHeartbeat(MockServerContext):
@@ -34,9 +34,25 @@ class WhenServerRespondsToHeartbeat(MockServerContext):
 
     def cleanup_tasks(self):
         self.protocol.heartbeat_monitor.stop()
-        self.loop.run_until_complete(
-            asyncio.wait_for(self.protocol.heartbeat_monitor.wait_closed(),
-                             timeout=0.2))
+
+
+class WhenOtherFramesAreSentWithinTheInterval(MockServerContext):
+    def given_i_started_heartbeating(self):
+        # Long enough for the gaps between frames not to depend on timing
+        self.protocol.start_heartbeat(0.1)
+        self.server.reset()
+
+    def when_frames_keep_being_sent(self):
+        for _ in range(30):
+            self.protocol.send_method(1, spec.BasicAck(1, False))
+            self.server.send_frame(HeartbeatFrame())
+            self.loop.run_until_complete(asyncio.sleep(0.005))
+
+    def it_should_not_send_heartbeats(self):
+        assert HeartbeatFrame() not in self.server.frames()
+
+    def cleanup_tasks(self):
+        self.protocol.heartbeat_monitor.stop()
 
 
 class WhenServerDoesNotRespondToHeartbeat(MockServerContext):
@@ -45,7 +61,8 @@ class WhenServerDoesNotRespondToHeartbeat(MockServerContext):
 
     def when_the_server_dies(self):
         with mock.patch("asynqp.routing.Dispatcher.dispatch_all") as mocked:
-            self.loop.run_until_complete(asyncio.sleep(0.021))
+            # Checked every half interval
+            self.loop.run_until_complete(asyncio.sleep(0.031))
             self.mocked = mocked
 
     def it_should_dispatch_a_poison_pill(self):
@@ -55,6 +72,56 @@ class WhenServerDoesNotRespondToHeartbeat(MockServerContext):
 
     def cleanup_tasks(self):
         self.protocol.heartbeat_monitor.stop()
-        self.loop.run_until_complete(
-            asyncio.wait_for(self.protocol.heartbeat_monitor.wait_closed(),
-                             timeout=0.2))
+
+
+class WhenServerDoesNotRespondWhileReadingIsPaused(MockServerContext):
+    def given_i_started_heartbeating_with_reading_paused(self):
+        self.protocol.reading_paused = True
+        self.protocol.start_heartbeat(0.01)
+
+    def when_the_server_dies(self):
+        with mock.patch("asynqp.routing.Dispatcher.dispatch_all") as mocked:
+            self.loop.run_until_complete(asyncio.sleep(0.031))
+            self.mocked = mocked
+
+    def it_should_still_dispatch_a_poison_pill(self):
+        assert self.mocked.called
+
+    def cleanup_tasks(self):
+        self.protocol.heartbeat_monitor.stop()
+
+
+class ManyConnectionsContext(LoopContext):
+    def given_many_heartbeating_connections(self):
+        self.protocols = [protocol.AMQP(asynqp.routing.Dispatcher(), self.loop) for _ in range(10)]
+        for i, p in enumerate(self.protocols):
+            p.connection_made(mock.Mock())
+            p.start_heartbeat(61 if i % 2 else 31)
+        self.scheduler = protocol.HeartbeatScheduler.for_loop(self.loop)
+
+    def cleanup_the_connections(self):
+        for p in self.protocols:
+            p.heartbeat_monitor.stop()
+
+
+class WhenManyConnectionsHeartbeat(ManyConnectionsContext):
+    def when_I_look_at_the_scheduler(self):
+        self.same = protocol.HeartbeatScheduler.for_loop(self.loop)
+
+    def it_should_be_shared_by_the_loop(self):
+        assert self.same is self.scheduler
+
+    def it_should_use_one_timer_per_interval(self):
+        assert len(self.scheduler._buckets[31]) == 5
+        assert len(self.scheduler._buckets[61]) == 5
+        assert 31 in self.scheduler._timers and 61 in self.scheduler._timers
+
+
+class WhenAllConnectionsWithAnIntervalStopHeartbeating(ManyConnectionsContext):
+    def when_they_stop(self):
+        for p in self.protocols[::2]:
+            p.heartbeat_monitor.stop()
+
+    def it_should_drop_their_bucket(self):
+        assert 31 not in self.scheduler._timers
+        assert 61 in self.scheduler._timers
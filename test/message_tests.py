@@ -1,7 +1,9 @@
+import array
 import asyncio
 import json
 import uuid
 from datetime import datetime
+import contexts
 import asynqp
 from asynqp import amqptypes
 from asynqp import message
@@ -101,6 +103,46 @@ class WhenIPassInBytes:
         assert self.message.body == self.body
 
 
+class WhenIPassInABuffer:
+    def when_I_make_a_message_with_an_array(self):
+        self.array = array.array('i', [1, 2, 3])
+        self.message = asynqp.Message(self.array)
+
+    def it_should_view_the_bytes_of_the_array(self):
+        assert self.message.body == self.array.tobytes()
+        assert len(self.message.body) == 3 * self.array.itemsize
+
+    def it_should_not_copy_the_array(self):
+        assert self.message.body.obj is self.array
+
+
+class WhenIPassInANonContiguousBuffer:
+    def when_I_make_a_message_with_every_other_byte(self):
+        self.exception = contexts.catch(asynqp.Message, memoryview(b'abcdef')[::2])
+
+    def it_should_throw_TypeError(self):
+        assert isinstance(self.exception, TypeError)
+
+
+class WhenGettingFramesForABufferMessage:
+    def given_a_message_with_a_bytearray_body(self):
+        self.buffer = bytearray(b'much longer body')
+        self.message = asynqp.Message(self.buffer)
+
+    def when_I_get_the_frames(self):
+        self.frames = message.get_frame_payloads(self.message, 5)
+
+    def it_should_split_the_body_into_frames(self):
+        assert [bytes(f) for f in self.frames] == [b'much ', b'longe', b'r bod', b'y']
+
+    def it_should_not_copy_the_body(self):
+        assert all(f.obj is self.buffer for f in self.frames)
+
+    def it_should_serialise_frames_like_bytes(self):
+        assert (frames.ContentBodyFrame(1, self.frames[0]).serialise()
+                == frames.ContentBodyFrame(1, b'much ').serialise())
+
+
 class WhenGettingFramesForAShortMessage:
     def given_a_message(self):
         self.message = asynqp.Message('body')
@@ -0,0 +1,145 @@
+import asyncio
+import copy
+import contexts
+import asynqp
+from asynqp import spec, frames, message, routing
+from .base_contexts import QueueContext
+
+
+class QueuePollerContext(QueueContext):
+    def given_a_poller(self):
+        self.received = []
+        self.poller = self.connection.queue_poller(self.received.append, min_interval=0.01, max_interval=0.04)
+        self.server.reset()
+
+    def get_ok(self, delivery_tag, body):
+        msg = asynqp.Message(body)
+        self.server.send_method(self.channel.id, spec.BasicGetOK(delivery_tag, False, '', self.queue.name, 0))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        body = message.get_frame_payloads(msg, 100)[0]
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, body))
+        self.tick()
+
+    def get_empty(self):
+        self.server.send_method(self.channel.id, spec.BasicGetEmpty(''))
+        self.tick()
+
+    def polled(self):
+        return self.server.frames().count(
+            frames.MethodFrame(self.channel.id, spec.BasicGet(0, self.queue.name, False)))
+
+    def sleep(self, seconds):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def cleanup_the_poller(self):
+        self.poller.close()
+
+
+class WhenAddingAQueueToAPoller(QueuePollerContext):
+    def when_I_add_the_queue(self):
+        self.poller.add(self.queue)
+        self.tick()
+
+    def it_should_poll_the_queue_right_away(self):
+        assert self.polled() == 1
+
+
+class WhenAddingAQueueOfAnotherConnectionToAPoller(QueuePollerContext):
+    def given_a_queue_declared_elsewhere(self):
+        self.other_queue = copy.copy(self.queue)
+        self.other_queue.sender = routing.Sender(self.channel.id, object())
+
+    def when_I_add_the_queue(self):
+        self.exception = contexts.catch(self.poller.add, self.other_queue)
+
+    def it_should_throw_ValueError(self):
+        assert isinstance(self.exception, ValueError)
+
+    def it_should_not_poll_the_queue(self):
+        self.tick()
+        assert self.polled() == 0
+
+
+class WhenAPolledQueueIsEmpty(QueuePollerContext):
+    def given_a_polled_queue(self):
+        self.poller.add(self.queue)
+        self.tick()
+
+    def when_the_queue_is_empty_again_and_again(self):
+        self.get_empty()
+        self.get_empty_after = self.poller._queues[self.queue].interval
+        self.sleep(0.015)
+        self.get_empty()
+        self.sleep(0.025)
+        self.get_empty()
+        self.sleep(0.045)
+        self.get_empty()
+
+    def it_should_back_off_exponentially(self):
+        assert self.get_empty_after == 0.01
+        assert self.polled() == 4
+
+    def it_should_not_back_off_beyond_the_max_interval(self):
+        assert self.poller._queues[self.queue].interval == 0.04
+
+
+class WhenAMessageArrivesOnABackedOffQueue(QueuePollerContext):
+    def given_a_backed_off_queue(self):
+        self.poller.add(self.queue)
+        self.tick()
+        self.get_empty()
+        self.sleep(0.015)
+        self.server.reset()
+
+    def when_a_message_arrives(self):
+        self.get_ok(1, b'body')
+        self.tick()
+
+    def it_should_deliver_the_message(self):
+        assert [m.body for m in self.received] == [b'body']
+
+    def it_should_poll_again_right_away(self):
+        assert self.polled() == 1
+
+    def it_should_reset_the_backoff(self):
+        assert self.poller._queues[self.queue].interval == 0
+
+
+class WhenAQueueIsRemovedFromThePoller(QueuePollerContext):
+    def given_a_backed_off_queue(self):
+        self.poller.add(self.queue)
+        self.tick()
+        self.get_empty()
+        self.server.reset()
+
+    def when_I_remove_the_queue(self):
+        self.poller.remove(self.queue)
+        self.sleep(0.02)
+
+    def it_should_stop_polling_it(self):
+        assert self.polled() == 0
+
+
+class WhenTheChannelOfAPolledQueueIsClosed(QueuePollerContext):
+    def given_a_poller_with_an_error_handler(self):
+        self.errors = []
+        self.poller.callback = self
+        self.poller.add(self.queue)
+        self.tick()
+
+    def when_the_server_closes_the_channel(self):
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'not found', 50, 10))
+        self.tick()
+
+    def it_should_report_the_error(self):
+        assert isinstance(self.errors[0], asynqp.NotFound)
+
+    def it_should_stop_polling_the_queue(self):
+        assert self.poller._queues == {}
+
+    def on_error(self, exc):
+        self.errors.append(exc)
+
+    def __call__(self, msg):
+        pass
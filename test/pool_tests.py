@@ -0,0 +1,292 @@
+import asyncio
+import contexts
+import asynqp
+from unittest import mock
+from asynqp import spec
+from asynqp.pool import ConnectionPool
+from .base_contexts import OpenConnectionContext, LoopContext
+
+
+class ChannelPoolContext(OpenConnectionContext):
+    def open_pool(self, size, max_size=None, **kwargs):
+        task = asyncio.async(self.connection.channel_pool(size, max_size, **kwargs))
+        self.tick()
+        for channel_id in range(1, size + 1):
+            self.server.send_method(channel_id, spec.ChannelOpenOK(''))
+        self.tick()
+        return task.result()
+
+    def acquire(self):
+        task = asyncio.async(self.pool.acquire())
+        self.tick()
+        return task
+
+
+class WhenOpeningAChannelPool(ChannelPoolContext):
+    def when_I_open_a_pool(self):
+        self.pool = self.open_pool(2, 4)
+
+    def it_should_open_size_channels(self):
+        self.server.should_have_received_method(1, spec.ChannelOpen(''))
+        self.server.should_have_received_method(2, spec.ChannelOpen(''))
+        self.server.should_not_have_received_method(3, spec.ChannelOpen(''))
+
+    def it_should_keep_them_idle(self):
+        assert len(self.pool._idle) == 2
+
+
+class WhenAcquiringAnIdleChannel(ChannelPoolContext):
+    def given_a_pool(self):
+        self.pool = self.open_pool(1)
+        self.server.reset()
+
+    def when_I_acquire_a_channel(self):
+        self.task = self.acquire()
+
+    def it_should_return_the_open_channel(self):
+        assert self.task.result().id == 1
+
+    def it_should_not_open_another_one(self):
+        self.server.should_not_have_received_any()
+
+
+class WhenAllChannelsAreLeased(ChannelPoolContext):
+    def given_a_pool_with_a_single_leased_channel(self):
+        self.pool = self.open_pool(1)
+        self.channel = self.acquire().result()
+
+    def when_I_acquire_a_channel(self):
+        self.task = self.acquire()
+
+    def it_should_wait(self):
+        assert not self.task.done()
+
+
+class WhenALeasedChannelIsReleasedWhileAnotherAcquireWaits(ChannelPoolContext):
+    def given_a_pool_with_a_waiting_acquire(self):
+        self.pool = self.open_pool(1)
+        self.channel = self.acquire().result()
+        self.task = self.acquire()
+
+    def when_the_channel_is_released(self):
+        self.pool.release(self.channel)
+        self.tick()
+
+    def it_should_hand_the_channel_to_the_waiting_acquire(self):
+        assert self.task.result() is self.channel
+
+
+class WhenAcquiringBelowMaxSize(ChannelPoolContext):
+    def given_a_pool_with_a_single_leased_channel(self):
+        self.pool = self.open_pool(1, 2)
+        self.acquire()
+
+    def when_I_acquire_a_channel(self):
+        self.task = self.acquire()
+        self.server.send_method(2, spec.ChannelOpenOK(''))
+
+    def it_should_open_a_new_channel(self):
+        assert self.task.result().id == 2
+
+
+class WhenAClosedChannelIsReleased(ChannelPoolContext):
+    def given_a_leased_channel(self):
+        self.pool = self.open_pool(1)
+        self.channel = self.acquire().result()
+
+    def when_the_server_closes_the_channel_before_release(self):
+        self.server.send_method(1, spec.ChannelClose(404, 'not found', 50, 10))
+        self.pool.release(self.channel)
+        self.tick()
+
+    def it_should_open_a_replacement_in_the_background(self):
+        self.server.should_have_received_method(1, spec.ChannelOpen(''))
+
+    def it_should_lease_the_replacement(self):
+        self.server.send_method(1, spec.ChannelOpenOK(''))
+        channel = self.acquire().result()
+        assert channel is not self.channel
+        assert channel.id == 1
+
+
+class WhenAnExtraChannelIsIdleForTooLong(ChannelPoolContext):
+    def given_a_pool_with_an_extra_channel(self):
+        self.pool = self.open_pool(1, 2, idle_timeout=0.01)
+        first = self.acquire().result()
+        second = self.acquire()
+        self.server.send_method(2, spec.ChannelOpenOK(''))
+        self.pool.release(first)
+        self.pool.release(second.result())
+
+    def when_the_idle_timeout_passes(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.server.send_method(1, spec.ChannelCloseOK())
+
+    def it_should_close_the_least_recently_used_channel(self):
+        self.server.should_have_received_method(1, spec.ChannelClose(0, 'Channel closed by application', 0, 0))
+
+    def it_should_keep_size_channels(self):
+        assert [c.id for c, _ in self.pool._idle] == [2]
+
+
+class WhenUsingThePoolAsAContextManager(ChannelPoolContext):
+    def given_a_pool(self):
+        self.pool = self.open_pool(1)
+
+    def when_I_lease_a_channel_in_a_with_block(self):
+        context = self.pool.acquire()
+        self.channel = self.loop.run_until_complete(context.__aenter__())
+        self.leased = len(self.pool._in_use)
+        self.loop.run_until_complete(context.__aexit__(None, None, None))
+
+    def it_should_lease_the_channel(self):
+        assert self.leased == 1
+
+    def it_should_return_it_to_the_pool(self):
+        assert [c for c, _ in self.pool._idle] == [self.channel]
+
+
+class WhenTheChannelPoolIsClosed(ChannelPoolContext):
+    def given_a_pool_with_a_waiting_acquire(self):
+        self.pool = self.open_pool(1)
+        self.acquire()
+        self.task = self.acquire()
+
+    def when_I_close_the_pool(self):
+        self.loop.run_until_complete(self.pool.close())
+
+    def it_should_fail_the_waiting_acquire(self):
+        assert isinstance(self.task.exception(), RuntimeError)
+
+
+class FakeConnection(object):
+    def __init__(self, address):
+        self.address = address
+        self.closed = False
+        self.transport = mock.Mock()
+        self.transport.get_write_buffer_size.return_value = 0
+        self.channel = mock.Mock()
+        self.channel.is_closed.return_value = False
+
+    def is_closed(self):
+        return self.closed
+
+    @asyncio.coroutine
+    def open_channel(self):
+        return self.channel
+
+    @asyncio.coroutine
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolContext(LoopContext):
+    def given_a_pool_connecting_to_two_nodes(self):
+        self.addresses = ['node1', 'node2']
+        self.connected = []
+
+    @asyncio.coroutine
+    def connect(self, index, attempt):
+        connection = FakeConnection(self.addresses[(index + attempt) % 2])
+        self.connected.append(connection)
+        return connection
+
+    def open_pool(self, size, **kwargs):
+        pool = ConnectionPool(self.connect, size, loop=self.loop, **kwargs)
+        self.loop.run_until_complete(pool.open())
+        return pool
+
+
+class WhenOpeningAConnectionPool(ConnectionPoolContext):
+    def when_I_open_a_pool(self):
+        self.pool = self.open_pool(4)
+
+    def it_should_spread_the_connections_over_the_nodes(self):
+        addresses = [connection.address for connection, _ in self.pool._members]
+        assert addresses == ['node1', 'node2', 'node1', 'node2']
+
+
+class WhenPublishingWithTheLeastBufferedPolicy(ConnectionPoolContext):
+    def given_a_pool_with_a_busy_connection(self):
+        self.pool = self.open_pool(2)
+        self.busy, self.idle = [connection for connection, _ in self.pool._members]
+        self.busy.transport.get_write_buffer_size.return_value = 4096
+        self.msg = asynqp.Message('body')
+
+    def when_I_publish(self):
+        self.pool.publish('my.exchange', self.msg, 'routing.key')
+
+    def it_should_publish_on_the_idle_connection(self):
+        self.idle.channel.sender.send_BasicPublish.assert_called_once_with(
+            'my.exchange', 'routing.key', True, self.msg)
+        assert not self.busy.channel.sender.send_BasicPublish.called
+
+
+class WhenPublishingWithTheRoundRobinPolicy(ConnectionPoolContext):
+    def given_a_round_robin_pool(self):
+        self.pool = self.open_pool(2, policy='round_robin')
+
+    def when_I_publish_four_times(self):
+        for _ in range(4):
+            self.pool.publish('', asynqp.Message('body'), 'routing.key')
+
+    def it_should_take_turns(self):
+        for connection in self.connected:
+            assert connection.channel.sender.send_BasicPublish.call_count == 2
+
+
+class WhenAPoolMemberIsLost(ConnectionPoolContext):
+    def given_a_pool_with_a_dead_connection(self):
+        self.pool = self.open_pool(2)
+        self.dead, self.live = [connection for connection, _ in self.pool._members]
+        self.dead.closed = True
+
+    def when_I_pick_a_connection(self):
+        self.picked = self.pool.connection()
+        self.tick()
+
+    def it_should_skip_the_dead_connection(self):
+        assert self.picked is self.live
+
+    def it_should_reconnect_to_the_next_node(self):
+        replacement = self.pool._members[0][0]
+        assert replacement is self.connected[2]
+        assert replacement.address == 'node2'
+
+
+class WhenOnlyThePublishingChannelOfAPoolMemberIsClosed(ConnectionPoolContext):
+    def given_a_pool_with_a_closed_channel(self):
+        self.pool = self.open_pool(1)
+        self.connected[0].channel.is_closed.return_value = True
+
+    def when_I_pick_a_connection(self):
+        self.exception = contexts.catch(self.pool.connection)
+        self.connected[0].channel = mock.Mock()
+        self.connected[0].channel.is_closed.return_value = False
+        self.tick()
+
+    def it_should_raise_AMQPConnectionError(self):
+        assert isinstance(self.exception, asynqp.AMQPConnectionError)
+
+    def it_should_reopen_the_channel_on_the_same_connection(self):
+        assert self.pool.connection() is self.connected[0]
+        assert len(self.connected) == 1
+
+
+class WhenTheConnectionPoolIsClosed(ConnectionPoolContext):
+    def given_a_pool(self):
+        self.pool = self.open_pool(2)
+
+    def when_I_close_the_pool(self):
+        self.loop.run_until_complete(self.pool.close())
+
+    def it_should_close_every_connection(self):
+        assert all(c.closed for c in self.connected)
+
+
+class WhenThePoolsAreExported(object):
+    def it_should_export_ChannelPool(self):
+        assert asynqp.ChannelPool is asynqp.pool.ChannelPool
+
+    def it_should_export_ConnectionPool(self):
+        assert asynqp.ConnectionPool is asynqp.pool.ConnectionPool
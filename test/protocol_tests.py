@@ -50,6 +50,50 @@ class WhenAFrameDoesNotEndInFrameEnd(MockServerContext):
         assert isinstance(self.exception, asynqp.AMQPError)
 
 
+class WhenAnOversizedFrameHeaderArrivesBeforeTuning(MockServerContext):
+    def establish_a_header_claiming_4GB(self):
+        self.raw = b'\x03\x00\x01\xFF\xFF\xFF\xF0'
+
+    def because_only_the_header_arrives(self):
+        self.exception = contexts.catch(self.server.send_bytes, self.raw)
+
+    def it_should_raise_a_connection_error(self):
+        assert isinstance(self.exception, asynqp.AMQPConnectionError)
+
+    def it_MUST_close_the_connection(self):
+        assert self.transport.closed
+
+
+class WhenAFrameLargerThanTheNegotiatedFrameMaxArrives(MockServerContext):
+    def establish_the_frame_max(self):
+        self.protocol.set_frame_max(8192)
+        self.raw = b'\x03\x00\x01\x00\x00\x20\x00' + b'x' * 100
+
+    def because_the_frame_starts_arriving(self):
+        self.exception = contexts.catch(self.server.send_bytes, self.raw)
+
+    def it_should_raise_a_connection_error(self):
+        assert isinstance(self.exception, asynqp.AMQPConnectionError)
+
+    def it_MUST_close_the_connection(self):
+        assert self.transport.closed
+
+
+class WhenAFrameOfTheNegotiatedFrameMaxArrivesInPieces(MockDispatcherContext):
+    def establish_the_frame(self):
+        self.protocol.set_frame_max(8192)
+        self.expected_frame = asynqp.frames.ContentBodyFrame(1, b'x' * (8192 - 8))
+        self.raw = self.expected_frame.serialise()
+
+    def because_the_frame_arrives_in_pieces(self):
+        for i in range(0, len(self.raw), 1000):
+            self.protocol.data_received(self.raw[i:i + 1000])
+        self.tick()
+
+    def it_should_dispatch_the_frame(self):
+        self.dispatcher.dispatch.assert_called_once_with(self.expected_frame)
+
+
 class WhenHalfAFrameArrives(MockDispatcherContext):
     @classmethod
     def examples_of_incomplete_frames(cls):
@@ -1,4 +1,8 @@
 import asyncio
+import concurrent.futures
+import mmap
+import pickle
+import threading
 from datetime import datetime
 import contexts
 import asynqp
@@ -97,6 +101,78 @@ class WhenQueueBindOKArrives(QueueContext, ExchangeContext):
         assert self.binding.exchange is self.exchange
 
 
+class WhenBindingAQueueWithNowait(QueueContext, ExchangeContext):
+    def when_I_bind_the_queue_with_nowait(self):
+        self.task = asyncio.async(self.queue.bind(self.exchange, 'routing.key', nowait=True))
+        self.tick()
+
+    def it_should_send_QueueBind_with_nowait(self):
+        expected_method = spec.QueueBind(0, self.queue.name, self.exchange.name, 'routing.key', True, {})
+        self.server.should_have_received_method(self.channel.id, expected_method)
+
+    def it_should_not_wait_for_QueueBindOK(self):
+        assert self.task.result().queue is self.queue
+
+
+class WhenManyBindsAreInFlightOnAChannel(QueueContext, ExchangeContext):
+    def given_ten_concurrent_binds(self):
+        self.server.reset()
+        self.tasks = [asyncio.async(self.queue.bind(self.exchange, 'key.{}'.format(i)))
+                      for i in range(10)]
+        self.tick()
+        self.sent_before_any_reply = len(self.server.data)
+
+    def when_all_the_replies_arrive_at_once(self):
+        replies = [frames.MethodFrame(self.channel.id, spec.QueueBindOK()) for _ in self.tasks]
+        self.server.send_bytes(b''.join(frame.serialise() for frame in replies))
+        self.wait_for(asyncio.gather(*self.tasks))
+
+    def it_should_send_every_bind_before_any_reply(self):
+        assert self.sent_before_any_reply == 10
+
+    def it_should_complete_every_bind(self):
+        assert [t.result().routing_key for t in self.tasks] == ['key.{}'.format(i) for i in range(10)]
+
+
+class WhenOneOfSeveralWaitingDeclaresIsCancelled(OpenChannelContext):
+    def given_two_declares_in_flight(self):
+        self.first = asyncio.async(self.channel.declare_queue(''))
+        self.second = asyncio.async(self.channel.declare_queue(''))
+        self.tick()
+
+    def when_the_first_is_cancelled_and_both_replies_arrive(self):
+        self.first.cancel()
+        self.tick()
+        self.server.send_method(self.channel.id, spec.QueueDeclareOK('amq.gen-1', 0, 0))
+        self.server.send_method(self.channel.id, spec.QueueDeclareOK('amq.gen-2', 0, 0))
+        self.tick()
+
+    def it_should_give_the_second_its_own_reply(self):
+        assert self.second.result().name == 'amq.gen-2'
+
+    def it_should_go_on_reading_the_channel(self):
+        task = asyncio.async(self.channel.declare_queue('my.queue'))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.QueueDeclareOK('my.queue', 0, 0))
+        self.tick()
+        assert task.result().name == 'my.queue'
+
+
+class WhenAWaitingConsumeIsCancelled(QueueContext):
+    def given_a_consume_in_flight(self):
+        self.task = asyncio.async(self.queue.consume(lambda msg: None))
+        self.tick()
+
+    def when_the_call_is_cancelled_before_the_reply_arrives(self):
+        self.task.cancel()
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        self.tick()
+
+    def it_should_cancel_the_consumer_on_the_broker(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicCancel('made.up.tag', False))
+
+
 class WhenUnbindingAQueue(BoundQueueContext):
     def when_I_unbind_the_queue(self):
         self.async_partial(self.binding.unbind(arguments={'x-ignore': ''}))
@@ -196,6 +272,156 @@ class WhenConnectionClosedOnGet(QueueContext):
         assert self.task.exception() is not None
 
 
+class GetManyContext(QueueContext):
+    def get_ok(self, delivery_tag, body):
+        msg = asynqp.Message(body)
+        self.server.send_method(self.channel.id, spec.BasicGetOK(delivery_tag, False, '', self.queue.name, 0))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        body = message.get_frame_payloads(msg, 100)[0]
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, body))
+
+    def get_empty(self):
+        self.server.send_method(self.channel.id, spec.BasicGetEmpty(''))
+
+
+class WhenIAskForManyMessages(GetManyContext):
+    def given_nothing_was_sent_yet(self):
+        self.server.reset()
+
+    def when_I_get_many_messages(self):
+        self.async_partial(self.queue.get_many(3))
+
+    def it_should_send_all_the_BasicGets_in_one_write(self):
+        assert len(self.server.data) == 1
+        self.server.should_have_received_methods(self.channel.id, [spec.BasicGet(0, self.queue.name, False)] * 3)
+
+
+class WhenGetManyRunsIntoAnEmptyQueue(GetManyContext):
+    def given_I_asked_for_three_messages(self):
+        self.task = asyncio.async(self.queue.get_many(3))
+        self.tick()
+
+    def when_two_messages_and_GetEmpty_arrive(self):
+        self.get_ok(1, b'one')
+        self.get_ok(2, b'two')
+        self.get_empty()
+        self.tick()
+
+    def it_should_return_the_messages_in_order(self):
+        assert [m.body for m in self.task.result()] == [b'one', b'two']
+
+
+class WhenAMessageArrivesAfterGetEmptyInAGetMany(GetManyContext):
+    def given_I_asked_for_two_messages(self):
+        self.task = asyncio.async(self.queue.get_many(2))
+        self.tick()
+
+    def when_GetEmpty_arrives_before_a_message(self):
+        self.get_empty()
+        self.get_ok(1, b'late')
+        self.tick()
+
+    def it_should_not_lose_the_message(self):
+        assert [m.body for m in self.task.result()] == [b'late']
+
+
+class WhenAGetManyIsCancelled(GetManyContext):
+    def given_a_get_many_with_one_reply(self):
+        self.task = asyncio.async(self.queue.get_many(3))
+        self.tick()
+        self.get_ok(1, b'one')
+        self.tick()
+
+    def when_I_cancel_the_get_many(self):
+        self.task.cancel()
+        self.tick()
+        self.get_empty()
+        self.get_empty()
+        self.later = asyncio.async(self.queue.get())
+        self.tick()
+        self.get_ok(2, b'two')
+        self.tick()
+
+    def it_should_requeue_the_message_it_got(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicReject(1, True))
+
+    def it_should_leave_the_channel_usable(self):
+        assert self.later.result().body == b'two'
+
+
+class WhenAGetManyIsCancelledAsAMessageArrives(GetManyContext):
+    def given_a_get_many_which_is_cancelled_by_its_first_reply(self):
+        self.task = asyncio.async(self.queue.get_many(2))
+        self.tick()
+        synchroniser = self.channel.synchroniser
+        notify = synchroniser.notify
+
+        def notify_and_cancel(method, result=None):
+            synchroniser.notify = notify
+            notified = notify(method, result)
+            self.task.cancel()
+            return notified
+        synchroniser.notify = notify_and_cancel
+
+    def when_the_message_arrives(self):
+        self.get_ok(1, b'one')
+        self.tick()
+        self.get_empty()
+        self.tick()
+
+    def it_should_requeue_the_message(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicReject(1, True))
+
+    def it_should_be_cancelled(self):
+        assert self.task.cancelled()
+
+
+class WhenMessagesArriveForACancelledGetMany(GetManyContext):
+    def given_a_get_many_with_one_reply(self):
+        self.task = asyncio.async(self.queue.get_many(3))
+        self.tick()
+        self.get_ok(1, b'one')
+        self.tick()
+        self.task.cancel()
+        self.tick()
+
+    def when_the_other_replies_carry_messages(self):
+        self.get_ok(2, b'two')
+        self.get_ok(3, b'three')
+        self.later = asyncio.async(self.queue.get())
+        self.tick()
+        self.get_ok(4, b'four')
+        self.tick()
+
+    def it_should_requeue_every_message_nobody_got(self):
+        self.server.should_have_received_methods(self.channel.id, [
+            spec.BasicReject(1, True),
+            spec.BasicReject(2, True),
+            spec.BasicReject(3, True)], any_order=True)
+
+    def it_should_leave_the_channel_usable(self):
+        assert self.later.result().body == b'four'
+
+
+class WhenMessagesArriveForACancelledNoAckGetMany(GetManyContext):
+    def given_a_no_ack_get_many_with_one_reply(self):
+        self.task = asyncio.async(self.queue.get_many(2, no_ack=True))
+        self.tick()
+        self.get_ok(1, b'one')
+        self.tick()
+        self.task.cancel()
+        self.tick()
+        self.server.reset()
+
+    def when_the_other_reply_carries_a_message(self):
+        self.get_ok(2, b'two')
+        self.tick()
+
+    def it_should_not_reject_it(self):
+        self.server.should_not_have_received_any()
+
+
 class WhenISubscribeToAQueue(QueueContext):
     def when_I_start_a_consumer(self):
         self.async_partial(self.queue.consume(lambda msg: None, no_local=False, no_ack=False, exclusive=False, arguments={'x-priority': 1}))
@@ -468,3 +694,683 @@ class WhenIDeclareQueueWithNoWait(OpenChannelContext):
         self.server.should_have_received_method(
             self.channel.id, spec.QueueDeclare(
                 0, '123', False, True, True, False, True, {}))
+
+
+class ExecutorConsumerContext(QueueContext):
+    def start_executor_consumer(self, handler, executor, **kwargs):
+        task = asyncio.async(self.queue.executor_consumer(handler, executor, **kwargs))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        return task.result()
+
+    def deliver_msg(self, delivery_tag, body):
+        msg = asynqp.Message(body, timestamp=datetime(2014, 5, 5))
+        method = spec.BasicDeliver('made.up.tag', delivery_tag, False, 'my.exchange', 'routing.key')
+        self.server.send_method(self.channel.id, method)
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, msg.body))
+        self.tick()
+
+    def join(self):
+        self.loop.run_until_complete(asyncio.wait_for(self.consumer.join(), 0.5))
+
+    def cleanup_the_executor(self):
+        self.executor.shutdown()
+
+
+class WhenAnExecutorConsumerHandlerFinishes(ExecutorConsumerContext):
+    def given_an_executor_consumer(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+        self.handled = []
+        self.consumer = self.start_executor_consumer(self.handled.append, self.executor)
+
+    def when_a_message_is_handled(self):
+        self.deliver_msg(123, b'body')
+        self.join()
+
+    def it_should_run_the_handler(self):
+        assert [m.body for m in self.handled] == [b'body']
+
+    def it_should_ack_the_message(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(123, False))
+
+
+class WhenAnExecutorConsumerHandlerRaises(ExecutorConsumerContext):
+    def given_an_executor_consumer(self):
+        self.loop.set_exception_handler(self.exception_handler)
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+        self.consumer = self.start_executor_consumer(self.handler, self.executor, requeue_on_error=False)
+
+    def when_a_message_is_handled(self):
+        self.deliver_msg(123, b'body')
+        self.join()
+
+    def it_should_reject_the_message(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicReject(123, False))
+
+    def it_should_report_the_exception(self):
+        assert isinstance(self.exceptions[0], ValueError)
+
+    def handler(self, msg):
+        raise ValueError(msg)
+
+    def cleanup_the_exception_handler(self):
+        self.loop.set_exception_handler(testing_exception_handler)
+
+
+class WhenExecutorConsumerHandlersFinishOutOfOrderWithOrderedAck(ExecutorConsumerContext):
+    def given_an_ordered_executor_consumer(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+        self.first_may_finish = threading.Event()
+        self.consumer = self.start_executor_consumer(self.handler, self.executor, ordered_ack=True)
+        self.deliver_msg(1, b'slow')
+        self.deliver_msg(2, b'fast')
+
+    def when_the_second_handler_finishes_first(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.acks_before = self.acked_tags()
+        self.first_may_finish.set()
+        self.join()
+
+    def it_should_not_ack_the_second_message_early(self):
+        assert self.acks_before == []
+
+    def it_should_ack_in_delivery_order(self):
+        assert self.acked_tags() == [1, 2]
+
+    def handler(self, msg):
+        if msg.body == b'slow':
+            self.first_may_finish.wait(1)
+
+    def acked_tags(self):
+        return [f.payload.delivery_tag for f in self.server.frames()
+                if isinstance(f.payload, spec.BasicAck)]
+
+
+class InlineProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+    """ Runs submitted calls right away, but insists the arguments pickle """
+    def submit(self, fn, *args):
+        fn, args = pickle.loads(pickle.dumps((fn, args)))
+        fut = concurrent.futures.Future()
+        fut.set_result(fn(*args))
+        return fut
+
+
+def detached_handler(msg):
+    detached_handler.received.append(msg)
+
+
+class WhenAnExecutorConsumerUsesAProcessPool(ExecutorConsumerContext):
+    def given_an_executor_consumer_with_a_process_pool(self):
+        detached_handler.received = []
+        self.executor = InlineProcessPoolExecutor(1)
+        self.consumer = self.start_executor_consumer(detached_handler, self.executor)
+
+    def when_a_message_is_handled(self):
+        self.deliver_msg(123, b'body')
+        self.join()
+
+    def it_should_pass_a_plain_message_with_the_body_and_properties(self):
+        msg, = detached_handler.received
+        assert type(msg) is asynqp.Message
+        assert msg == asynqp.Message(b'body', timestamp=datetime(2014, 5, 5))
+
+    def it_should_ack_the_message(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(123, False))
+
+
+class WhenAConsumerAllocatesTheBodyBuffer(QueueContext):
+    def given_a_consumer_which_allocates_bodies(self):
+        self.consumer = self.ConsumerWithAllocateBody()
+        asyncio.async(self.queue.consume(self.consumer))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        self.tick()
+
+    def when_a_message_arrives_in_two_frames(self):
+        msg = asynqp.Message(b'0123456789')
+        self.server.send_method(self.channel.id, spec.BasicDeliver('made.up.tag', 123, False, 'my.exchange', 'routing.key'))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        for payload in message.get_frame_payloads(msg, 6):
+            self.server.send_frame(frames.ContentBodyFrame(self.channel.id, payload))
+        self.tick()
+
+    def it_should_ask_for_a_buffer_of_the_body_length(self):
+        assert self.consumer.requested == [10]
+
+    def it_should_assemble_the_body_in_the_buffer(self):
+        assert self.consumer.buffer == b'0123456789'
+
+    def it_should_deliver_a_view_of_the_buffer(self):
+        msg, = self.consumer.received
+        assert isinstance(msg.body, memoryview)
+        assert msg.body.obj is self.consumer.buffer
+
+    class ConsumerWithAllocateBody:
+        def __init__(self):
+            self.requested = []
+            self.received = []
+            self.buffer = None
+
+        def __call__(self, msg):
+            self.received.append(msg)
+
+        def allocate_body(self, body_length):
+            self.requested.append(body_length)
+            self.buffer = bytearray(body_length)
+            return self.buffer
+
+
+class SpillingConsumerContext(QueueContext):
+    def given_a_consumer_which_spills_large_bodies(self):
+        self.messages = []
+        asyncio.async(self.queue.consume(self.messages.append, spill_threshold=8))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        self.tick()
+
+    def deliver_msg(self, delivery_tag, body):
+        msg = asynqp.Message(body)
+        self.server.send_method(self.channel.id, spec.BasicDeliver('made.up.tag', delivery_tag, False, 'my.exchange', 'routing.key'))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        for payload in message.get_frame_payloads(msg, 6):
+            self.server.send_frame(frames.ContentBodyFrame(self.channel.id, payload))
+        self.tick()
+
+
+class WhenMessagesAboveAndBelowTheSpillThresholdArrive(SpillingConsumerContext):
+    def when_a_small_and_a_large_message_arrive(self):
+        self.deliver_msg(1, b'small')
+        self.deliver_msg(2, b'0123456789')
+
+    def it_should_keep_the_small_body_in_memory(self):
+        assert self.messages[0].body == b'small'
+        assert isinstance(self.messages[0].body, bytes)
+
+    def it_should_assemble_the_large_body_in_a_file(self):
+        assert self.messages[1].body == b'0123456789'
+        assert isinstance(self.messages[1].body.obj, mmap.mmap)
+
+
+class WhenASpilledMessageIsAcked(SpillingConsumerContext):
+    def given_a_spilled_message(self):
+        self.deliver_msg(1, b'0123456789')
+        self.msg, = self.messages
+        self.spilled = self.msg.body.obj
+
+    def when_I_ack_the_message(self):
+        self.msg.ack()
+        self.tick()
+
+    def it_should_send_BasicAck(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(1, False))
+
+    def it_should_close_the_file(self):
+        assert self.spilled.closed
+
+
+class WhenASpilledMessageIsRejected(SpillingConsumerContext):
+    def given_a_spilled_message_with_another_view_of_its_body(self):
+        self.deliver_msg(1, b'0123456789')
+        self.msg, = self.messages
+        self.view = self.msg.body[2:4]
+
+    def when_I_reject_the_message(self):
+        self.msg.reject()
+        self.tick()
+
+    def it_should_send_BasicReject(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicReject(1, True))
+
+    def it_should_leave_the_other_view_readable(self):
+        assert self.view == b'23'
+
+
+class BoundedQueuedConsumerContext(QueueContext):
+    def start_queued_consumer(self, **kwargs):
+        task = asyncio.async(self.queue.queued_consumer(**kwargs))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        return task.result()
+
+    def deliver_msg(self, delivery_tag, body=b'body'):
+        msg = asynqp.Message(body)
+        method = spec.BasicDeliver('made.up.tag', delivery_tag, False, 'my.exchange', 'routing.key')
+        self.server.send_method(self.channel.id, method)
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, msg.body))
+        self.tick()
+
+
+class WhenAQueuedConsumerBufferIsFull(BoundedQueuedConsumerContext):
+    def given_a_consumer_with_a_buffer_limit(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=2)
+
+    def when_more_messages_arrive_than_the_limit(self):
+        for tag in range(1, 4):
+            self.deliver_msg(tag)
+
+    def it_should_stop_reading_frames_for_the_channel(self):
+        assert len(self.consumer._buffer) == 2
+
+    def it_should_stop_reading_from_the_socket(self):
+        assert self.transport.reading_paused
+
+
+class WhenAFullQueuedConsumerIsDrainedToTheLowWaterMark(BoundedQueuedConsumerContext):
+    def given_a_full_consumer(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=2)
+        for tag in range(1, 4):
+            self.deliver_msg(tag)
+
+    def when_I_take_a_message(self):
+        self.first = self.loop.run_until_complete(self.consumer.get())
+        self.tick()
+        self.tick()
+
+    def it_should_read_the_pending_message(self):
+        assert len(self.consumer._buffer) == 2
+
+
+class WhenAFullQueuedConsumerWithNothingPendingIsDrained(BoundedQueuedConsumerContext):
+    def given_a_full_consumer(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=2)
+        self.deliver_msg(1)
+        self.deliver_msg(2)
+
+    def when_I_take_a_message(self):
+        self.loop.run_until_complete(self.consumer.get())
+
+    def it_should_resume_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+
+class WhenAQueuedConsumerExceedsItsByteLimit(BoundedQueuedConsumerContext):
+    def given_a_consumer_with_a_byte_limit(self):
+        self.consumer = self.start_queued_consumer(max_buffered_bytes=10)
+
+    def when_a_large_message_arrives_followed_by_another(self):
+        self.deliver_msg(1, b'x' * 20)
+        self.deliver_msg(2)
+
+    def it_should_stop_reading_frames_for_the_channel(self):
+        assert len(self.consumer._buffer) == 1
+
+
+class WhenOnlyOneOfTwoChannelsIsFull(BoundedQueuedConsumerContext):
+    def given_another_channel(self):
+        self.other_channel = self.open_channel(2)
+        self.consumer = self.start_queued_consumer(max_buffered_messages=1)
+
+    def when_the_consumer_fills_up(self):
+        self.deliver_msg(1)
+
+    def it_should_keep_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+
+class WhenClosingAChannelWithAFullQueuedConsumer(BoundedQueuedConsumerContext):
+    def given_a_full_consumer_with_a_pending_message(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=1)
+        self.deliver_msg(1)
+        self.deliver_msg(2)
+
+    def when_I_close_the_channel(self):
+        self.task = asyncio.async(self.channel.close())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.ChannelCloseOK())
+        self.wait_for(self.task)
+
+    def it_should_read_the_ChannelCloseOK(self):
+        assert self.task.done()
+
+    def it_should_resume_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+
+class WhenClosingAConnectionWithAFullQueuedConsumer(BoundedQueuedConsumerContext):
+    def given_a_full_consumer(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=1)
+        self.deliver_msg(1)
+
+    def when_I_close_the_connection(self):
+        self.task = asyncio.async(self.connection.close())
+        self.tick()
+
+    def it_should_resume_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+    def cleanup_the_close(self):
+        self.server.send_method(0, spec.ConnectionCloseOK())
+
+
+class WhenCancellingTheHandleOfAFullQueuedConsumer(BoundedQueuedConsumerContext):
+    def given_a_full_consumer_with_a_pending_message(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=1)
+        self.deliver_msg(1)
+        self.deliver_msg(2)
+
+    def when_I_cancel_the_underlying_consumer(self):
+        self.task = asyncio.async(self.consumer._consumer.cancel())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicCancelOK('made.up.tag'))
+        self.wait_for(self.task)
+
+    def it_should_read_the_BasicCancelOK(self):
+        assert self.task.done()
+
+    def it_should_keep_the_messages_which_arrived(self):
+        assert len(self.consumer._buffer) == 2
+
+
+class WhenEveryChannelStaysPaused(BoundedQueuedConsumerContext):
+    def given_a_full_consumer(self):
+        self.protocol.max_pause = 0.01
+        self.consumer = self.start_queued_consumer(max_buffered_messages=1)
+        self.deliver_msg(1)
+
+    def when_the_longest_pause_has_passed(self):
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.resumed = not self.transport.reading_paused
+        self.server.send_frame(frames.HeartbeatFrame())
+
+    def it_should_read_from_the_socket_again(self):
+        assert self.resumed
+
+    def it_should_pause_again_once_something_was_read(self):
+        assert self.transport.reading_paused
+
+    def cleanup_the_poll(self):
+        self.protocol._cancel_poll()
+
+
+class WhenABatchIsBiggerThanTheBuffer(BoundedQueuedConsumerContext):
+    def given_a_batch_bigger_than_the_buffer(self):
+        self.consumer = self.start_queued_consumer(max_buffered_messages=2)
+        self.task = asyncio.async(self.consumer.getmany(max_items=4))
+        self.tick()
+
+    def when_the_buffer_fills_up(self):
+        self.deliver_msg(1)
+        self.deliver_msg(2)
+        self.deliver_msg(3)
+
+    def it_should_return_what_the_buffer_holds(self):
+        assert [m.delivery_tag for m in self.task.result()] == [1, 2]
+
+
+class WhenGettingABatchBeforeItIsFull(BoundedQueuedConsumerContext):
+    def given_a_consumer_with_one_message(self):
+        self.consumer = self.start_queued_consumer()
+        self.deliver_msg(1)
+        self.task = asyncio.async(self.consumer.getmany(max_items=3))
+        self.tick()
+
+    def when_the_rest_of_the_batch_arrives(self):
+        self.still_waiting = not self.task.done()
+        self.deliver_msg(2)
+        self.deliver_msg(3)
+        self.deliver_msg(4)
+        self.tick()
+
+    def it_should_wait_for_the_batch_to_fill(self):
+        assert self.still_waiting
+
+    def it_should_return_a_full_batch(self):
+        assert [m.delivery_tag for m in self.task.result()] == [1, 2, 3]
+
+    def it_should_leave_the_rest_buffered(self):
+        assert len(self.consumer._buffer) == 1
+
+
+class WhenTheBatchWindowExpires(BoundedQueuedConsumerContext):
+    def given_a_consumer_with_two_messages(self):
+        self.consumer = self.start_queued_consumer()
+        self.deliver_msg(1)
+        self.deliver_msg(2)
+
+    def when_I_wait_for_a_batch_which_does_not_fill(self):
+        self.result = self.loop.run_until_complete(
+            self.consumer.getmany(max_items=10, timeout=0.01))
+
+    def it_should_return_what_arrived(self):
+        assert [m.delivery_tag for m in self.result] == [1, 2]
+
+
+class WhenTheBatchWindowExpiresWithNoMessages(BoundedQueuedConsumerContext):
+    def given_a_batch_window_which_expired(self):
+        self.consumer = self.start_queued_consumer()
+        self.task = asyncio.async(self.consumer.getmany(max_items=10, timeout=0.01))
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+
+    def when_a_message_arrives(self):
+        self.still_waiting = not self.task.done()
+        self.deliver_msg(1)
+        self.tick()
+
+    def it_should_wait_for_the_first_message(self):
+        assert self.still_waiting
+
+    def it_should_return_it_right_away(self):
+        assert [m.delivery_tag for m in self.task.result()] == [1]
+
+
+class WhenGettingABatchLimitedByBytes(BoundedQueuedConsumerContext):
+    def given_a_consumer_waiting_for_a_batch(self):
+        self.consumer = self.start_queued_consumer()
+        self.task = asyncio.async(self.consumer.getmany(max_bytes=10))
+        self.tick()
+
+    def when_enough_bytes_arrive(self):
+        self.deliver_msg(1, b'x' * 6)
+        self.deliver_msg(2, b'x' * 6)
+        self.deliver_msg(3, b'x' * 6)
+        self.tick()
+
+    def it_should_return_once_the_batch_is_full(self):
+        assert [m.delivery_tag for m in self.task.result()] == [1, 2]
+
+
+class WhenAConsumerIsCancelledWhileWaitingForABatch(BoundedQueuedConsumerContext):
+    def given_a_consumer_waiting_for_a_batch(self):
+        self.consumer = self.start_queued_consumer()
+        self.task = asyncio.async(self.consumer.getmany(max_items=10))
+        self.tick()
+
+    def when_the_consumer_is_cancelled(self):
+        asyncio.async(self.consumer.cancel())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicCancelOK('made.up.tag'))
+        self.tick()
+
+    def it_should_raise_ConsumerCancelled(self):
+        assert isinstance(self.task.exception(), exceptions.ConsumerCancelled)
+
+
+class WhenSeveralGetsAreWaitingOnAQueuedConsumer(BoundedQueuedConsumerContext):
+    def given_two_pending_gets(self):
+        self.consumer = self.start_queued_consumer()
+        self.first = asyncio.async(self.consumer.get())
+        self.second = asyncio.async(self.consumer.get())
+        self.tick()
+
+    def when_two_messages_arrive(self):
+        self.deliver_msg(1, b'one')
+        self.deliver_msg(2, b'two')
+        self.tick()
+
+    def it_should_hand_one_message_to_each_in_order(self):
+        assert self.first.result().body == b'one'
+        assert self.second.result().body == b'two'
+
+
+class WhenAWaitingGetIsCancelled(BoundedQueuedConsumerContext):
+    def given_a_cancelled_get_and_another_pending_get(self):
+        self.consumer = self.start_queued_consumer()
+        self.cancelled = asyncio.async(self.consumer.get())
+        self.pending = asyncio.async(self.consumer.get())
+        self.tick()
+        self.cancelled.cancel()
+        self.tick()
+
+    def when_a_message_arrives(self):
+        self.deliver_msg(1)
+        self.tick()
+
+    def it_should_go_to_the_other_get(self):
+        assert self.pending.result().body == b'body'
+
+
+class WhenAConsumerIsCancelledWhileWaitingForAMessage(BoundedQueuedConsumerContext):
+    def given_a_consumer_waiting_for_a_message(self):
+        self.consumer = self.start_queued_consumer()
+        self.task = asyncio.async(self.consumer.get())
+        self.tick()
+
+    def when_the_consumer_is_cancelled(self):
+        asyncio.async(self.consumer.cancel())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicCancelOK('made.up.tag'))
+        self.tick()
+
+    def it_should_raise_ConsumerCancelled(self):
+        assert isinstance(self.task.exception(), exceptions.ConsumerCancelled)
+
+
+class StreamingConsumerContext(QueueContext):
+    def start_streaming_consumer(self, **kwargs):
+        self.messages = []
+        task = asyncio.async(self.queue.consume(self.messages.append, stream=True, **kwargs))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('made.up.tag'))
+        return task.result()
+
+    def deliver_header(self, delivery_tag, body_length):
+        msg = asynqp.Message(b'x' * body_length)
+        method = spec.BasicDeliver('made.up.tag', delivery_tag, False, 'my.exchange', 'routing.key')
+        self.server.send_method(self.channel.id, method)
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        self.tick()
+
+    def deliver_chunks(self, *chunks):
+        for chunk in chunks:
+            self.server.send_frame(frames.ContentBodyFrame(self.channel.id, chunk))
+        self.tick()
+
+
+class WhenTheHeaderOfAStreamedMessageArrives(StreamingConsumerContext):
+    def given_a_streaming_consumer(self):
+        self.start_streaming_consumer()
+
+    def when_the_header_arrives(self):
+        self.deliver_header(1, 6)
+
+    def it_should_deliver_the_message_before_its_body(self):
+        assert len(self.messages) == 1
+
+    def it_should_give_the_message_a_body_stream(self):
+        assert isinstance(self.messages[0].body, asynqp.BodyStream)
+
+    def it_should_know_the_length_of_the_body(self):
+        assert self.messages[0].body.length == 6
+
+
+class WhenAStreamedBodyIsRead(StreamingConsumerContext):
+    def given_a_streamed_message(self):
+        self.start_streaming_consumer()
+        self.deliver_header(1, 6)
+        self.deliver_chunks(b'abc', b'def')
+
+    def when_I_read_the_body_chunk_by_chunk(self):
+        body = self.messages[0].body
+        self.chunks = [self.loop.run_until_complete(body.read_chunk()) for _ in range(3)]
+
+    def it_should_return_the_chunks_in_order_then_an_empty_one(self):
+        assert self.chunks == [b'abc', b'def', b'']
+
+
+class WhenAStreamedBodyExceedsItsBuffer(StreamingConsumerContext):
+    def given_a_consumer_with_a_small_buffer(self):
+        self.start_streaming_consumer(max_buffered_bytes=4)
+        self.deliver_header(1, 12)
+
+    def when_more_of_the_body_arrives_than_fits(self):
+        self.deliver_chunks(b'aaaa', b'bbbb', b'cccc')
+
+    def it_should_stop_reading_frames_for_the_channel(self):
+        assert list(self.messages[0].body._chunks) == [b'aaaa']
+
+    def it_should_stop_reading_from_the_socket(self):
+        assert self.transport.reading_paused
+
+
+class WhenAFullStreamedBodyIsRead(StreamingConsumerContext):
+    def given_a_full_body_stream(self):
+        self.start_streaming_consumer(max_buffered_bytes=4)
+        self.deliver_header(1, 12)
+        self.deliver_chunks(b'aaaa', b'bbbb', b'cccc')
+
+    def when_I_read_the_body(self):
+        self.body = self.loop.run_until_complete(self.messages[0].body.read())
+
+    def it_should_read_the_rest_of_the_body(self):
+        assert self.body == b'aaaabbbbcccc'
+
+    def it_should_resume_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+
+class WhenAStreamedBodyIsDiscarded(StreamingConsumerContext):
+    def given_a_full_body_stream(self):
+        self.start_streaming_consumer(max_buffered_bytes=4)
+        self.deliver_header(1, 12)
+        self.deliver_chunks(b'aaaa', b'bbbb', b'cccc')
+
+    def when_I_discard_the_body(self):
+        self.messages[0].body.discard()
+        self.tick()
+        self.tick()
+        self.deliver_header(2, 3)
+
+    def it_should_go_on_to_the_next_message(self):
+        assert [m.delivery_tag for m in self.messages] == [1, 2]
+
+    def it_should_resume_reading_from_the_socket(self):
+        assert not self.transport.reading_paused
+
+
+class WhenTheChannelClosesDuringAStreamedBody(StreamingConsumerContext):
+    def given_a_partly_read_body(self):
+        self.start_streaming_consumer()
+        self.deliver_header(1, 10)
+        self.deliver_chunks(b'abc')
+        self.task = asyncio.async(self.messages[0].body.read())
+        self.tick()
+
+    def when_the_channel_is_closed(self):
+        self.server.send_method(
+            self.channel.id, spec.ChannelClose(404, 'Bad queue', 40, 50))
+        self.tick()
+
+    def it_should_raise_from_the_body(self):
+        assert isinstance(self.task.exception(), exceptions.NotFound)
+
+
+class WhenAStreamedMessageIsAcked(StreamingConsumerContext):
+    def given_a_streamed_message_which_was_read(self):
+        self.start_streaming_consumer()
+        self.deliver_header(1, 3)
+        self.deliver_chunks(b'abc')
+        self.loop.run_until_complete(self.messages[0].body.read())
+
+    def when_I_ack_the_message(self):
+        self.messages[0].ack()
+        self.tick()
+
+    def it_should_send_BasicAck(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(1, False))
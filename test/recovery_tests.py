@@ -0,0 +1,208 @@
+import asyncio
+import asynqp
+from asynqp import spec, protocol
+from asynqp.connection import open_connection
+from asynqp.recovery import RecoveringConnection
+from asynqp.routing import Dispatcher
+from .base_contexts import LoopContext, OpenConnectionContext
+from .util import FakeBroker
+
+
+class RecoveringConnectionContext(LoopContext):
+    def given_a_recovering_connection(self):
+        self.brokers = []
+        self.connection = RecoveringConnection(
+            self.connect, min_delay=0.001, max_delay=0.001, loop=self.loop)
+        self.run(self.connection.open())
+
+    def cleanup_the_connection(self):
+        self.run(self.connection.close())
+
+    @asyncio.coroutine
+    def connect(self):
+        broker = FakeBroker(self.loop)
+        dispatcher = Dispatcher()
+        amqp = protocol.AMQP(dispatcher, self.loop)
+        broker.connect(amqp)
+        self.brokers.append(broker)
+        connection_info = {'username': 'guest', 'password': 'guest', 'virtual_host': '/'}
+        return (yield from open_connection(self.loop, broker, amqp, dispatcher, connection_info))
+
+    def run(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 1, loop=self.loop))
+
+    def lose_connection_and_recover(self):
+        self.brokers[-1].lose_connection()
+        self.tick()
+        self.tick()
+        self.run(self.connection.wait_recovered())
+
+    @property
+    def broker(self):
+        return self.brokers[-1]
+
+
+class WhenAConnectionWithTopologyIsLost(RecoveringConnectionContext):
+    def given_a_declared_topology(self):
+        self.channel = self.run(self.connection.open_channel())
+        self.run(self.channel.set_qos(prefetch_count=10))
+        self.exchange = self.run(self.channel.declare_exchange('my.exchange', 'topic'))
+        self.queue = self.run(self.channel.declare_queue('my.queue', durable=False))
+        self.run(self.queue.bind(self.exchange, 'routing.key'))
+        self.callback = lambda msg: None
+        self.consumer = self.run(self.queue.consume(self.callback, no_ack=True))
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_reconnect(self):
+        assert len(self.brokers) == 2
+        assert not self.connection.connection.is_closed()
+
+    def it_should_restore_the_qos(self):
+        assert self.broker.received(spec.BasicQos) == [(1, spec.BasicQos(0, 10, False))]
+
+    def it_should_redeclare_the_exchange_and_queue_without_waiting(self):
+        assert self.broker.received(spec.ExchangeDeclare) == [
+            (1, spec.ExchangeDeclare(0, 'my.exchange', 'topic', False, True, False, False, False, {}))]
+        assert self.broker.received(spec.QueueDeclare) == [
+            (1, spec.QueueDeclare(0, 'my.queue', False, False, False, False, False, {}))]
+
+    def it_should_rebind_the_queue(self):
+        assert self.broker.received(spec.QueueBind) == [
+            (1, spec.QueueBind(0, 'my.queue', 'my.exchange', 'routing.key', False, {}))]
+
+    def it_should_restart_the_consumer(self):
+        assert self.broker.received(spec.BasicConsume) == [
+            (1, spec.BasicConsume(0, 'my.queue', '', False, True, False, False, {}))]
+        assert self.consumer.tag == 'ctag-1'
+
+    def it_should_measure_the_recovery_time(self):
+        assert 0 < self.connection.recovery_time < 1
+
+    def it_should_publish_on_the_new_connection(self):
+        self.exchange.publish(asynqp.Message('body'), 'routing.key')
+        assert self.broker.received(spec.BasicPublish)
+
+
+class WhenRecoveringManyDeclarations(RecoveringConnectionContext):
+    def given_several_exchanges_and_bindings(self):
+        self.channel = self.run(self.connection.open_channel())
+        self.queue = self.run(self.channel.declare_queue('my.queue'))
+        for i in range(3):
+            exchange = self.run(self.channel.declare_exchange('exchange.{}'.format(i), 'fanout'))
+            self.run(self.queue.bind(exchange, ''))
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_only_wait_for_the_last_declaration_of_each_kind(self):
+        nowait = [m.no_wait for _, m in self.broker.received(spec.ExchangeDeclare)]
+        assert nowait == [True, True, False]
+        nowait = [m.no_wait for _, m in self.broker.received(spec.QueueBind)]
+        assert nowait == [True, True, False]
+
+
+class WhenRecoveringRedeclaredQueuesAndBindings(RecoveringConnectionContext):
+    def given_a_queue_declared_and_bound_again_and_again(self):
+        self.channel = self.run(self.connection.open_channel())
+        exchange = self.run(self.channel.declare_exchange('my.exchange', 'topic'))
+        self.queues = []
+        for _ in range(3):
+            queue = self.run(self.channel.declare_queue('my.queue'))
+            self.run(queue.bind(exchange, 'routing.key'))
+            self.queues.append(queue)
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_keep_a_single_queue(self):
+        assert self.queues[0] is self.queues[1] is self.queues[2]
+
+    def it_should_redeclare_the_queue_once(self):
+        assert len(self.broker.received(spec.QueueDeclare)) == 1
+
+    def it_should_rebind_the_queue_once(self):
+        assert len(self.broker.received(spec.QueueBind)) == 1
+
+
+class WhenRecoveringAServerNamedQueue(RecoveringConnectionContext):
+    def given_a_server_named_queue_with_a_consumer(self):
+        self.channel = self.run(self.connection.open_channel())
+        self.queue = self.run(self.channel.declare_queue(exclusive=True))
+        self.run(self.queue.consume(lambda msg: None))
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_let_the_server_name_it_again(self):
+        assert self.broker.received(spec.QueueDeclare)[0][1].queue == ''
+
+    def it_should_consume_from_the_new_name(self):
+        assert self.queue.name == 'amq.gen-1'
+        assert self.broker.received(spec.BasicConsume)[0][1].queue == 'amq.gen-1'
+
+
+class WhenRecoveringAfterADeleteAndCancel(RecoveringConnectionContext):
+    def given_a_deleted_queue_and_a_cancelled_consumer(self):
+        self.channel = self.run(self.connection.open_channel())
+        deleted = self.run(self.channel.declare_queue('deleted.queue'))
+        self.run(deleted.delete())
+        queue = self.run(self.channel.declare_queue('my.queue'))
+        consumer = self.run(queue.consume(lambda msg: None))
+        self.run(consumer.cancel())
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_not_redeclare_the_deleted_queue(self):
+        assert [m.queue for _, m in self.broker.received(spec.QueueDeclare)] == ['my.queue']
+
+    def it_should_not_restart_the_cancelled_consumer(self):
+        assert not self.broker.received(spec.BasicConsume)
+
+
+class WhenTheFirstReconnectAttemptFails(RecoveringConnectionContext):
+    def given_a_broker_which_is_down(self):
+        self.attempts = 0
+        connect = self.connection._connect
+
+        @asyncio.coroutine
+        def flaky_connect():
+            self.attempts += 1
+            if self.attempts == 1:
+                raise ConnectionRefusedError()
+            return (yield from connect())
+        self.connection._connect = flaky_connect
+
+    def when_the_connection_is_lost(self):
+        self.lose_connection_and_recover()
+
+    def it_should_retry(self):
+        assert self.attempts == 2
+        assert not self.connection.connection.is_closed()
+
+
+class WhenARecoveringConnectionIsClosedByTheApplication(RecoveringConnectionContext):
+    def when_I_close_the_connection(self):
+        self.run(self.connection.close())
+        self.tick()
+
+    def it_should_not_reconnect(self):
+        assert len(self.brokers) == 1
+        assert not self.connection.is_recovering()
+
+    def cleanup_the_connection(self):
+        pass
+
+
+class WhenTheConnectionIsLost(OpenConnectionContext):
+    def when_the_connection_is_lost(self):
+        try:
+            self.protocol.connection_lost(ConnectionResetError())
+        except asynqp.ConnectionLostError:
+            pass
+        self.tick()
+
+    def it_should_resolve_the_closed_future_with_the_error(self):
+        assert isinstance(self.connection.closed.result(), asynqp.ConnectionLostError)
@@ -0,0 +1,239 @@
+import asyncio
+import asynqp
+from asynqp import spec, frames, message
+from .base_contexts import OpenChannelContext, QueueContext
+from .util import testing_exception_handler
+
+
+class RpcClientContext(OpenChannelContext):
+    def given_an_rpc_client(self):
+        task = asyncio.async(self.channel.rpc_client())
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('reply.tag'))
+        self.client = task.result()
+
+    def reply(self, correlation_id, body='reply'):
+        msg = asynqp.Message(body, correlation_id=correlation_id)
+        self.server.send_method(self.channel.id, spec.BasicDeliver('reply.tag', 1, False, '', 'amq.rabbitmq.reply-to.x'))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        body = message.get_frame_payloads(msg, 100)[0]
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, body))
+        self.tick()
+
+
+class WhenStartingAnRpcClient(OpenChannelContext):
+    def when_I_start_an_rpc_client(self):
+        self.async_partial(self.channel.rpc_client())
+
+    def it_should_consume_the_direct_reply_to_queue_without_acks(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.BasicConsume(0, 'amq.rabbitmq.reply-to', '', False, True, False, False, {}))
+
+
+class WhenMakingAnRpcCall(RpcClientContext):
+    def given_a_request(self):
+        self.request = asynqp.Message('request')
+        self.server.reset()
+
+    def when_I_make_a_call(self):
+        self.fut = self.client.call('rpc.exchange', 'service', self.request)
+        self.tick()
+
+    def it_should_publish_the_request(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.BasicPublish(0, 'rpc.exchange', 'service', False, False))
+
+    def it_should_ask_for_a_direct_reply(self):
+        assert self.request.reply_to == 'amq.rabbitmq.reply-to'
+
+    def it_should_wait_for_the_reply(self):
+        assert not self.fut.done()
+
+
+class WhenRepliesToConcurrentCallsArriveOutOfOrder(RpcClientContext):
+    def given_two_calls(self):
+        self.first_request = asynqp.Message('first')
+        self.second_request = asynqp.Message('second')
+        self.first = self.client.call('', 'service', self.first_request)
+        self.second = self.client.call('', 'service', self.second_request)
+
+    def when_the_replies_arrive(self):
+        self.reply(self.second_request.correlation_id, 'second reply')
+        self.reply(self.first_request.correlation_id, 'first reply')
+
+    def it_should_give_every_call_its_own_reply(self):
+        assert self.first.result().body == b'first reply'
+        assert self.second.result().body == b'second reply'
+
+    def it_should_forget_the_calls(self):
+        assert self.client._calls == {}
+
+
+class WhenAnRpcCallTimesOut(RpcClientContext):
+    def given_a_call(self):
+        self.request = asynqp.Message('request')
+        self.fut = self.client.call('', 'service', self.request, timeout=0.01)
+
+    def when_the_timeout_passes_before_the_reply(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.reply(self.request.correlation_id)
+
+    def it_should_raise_TimeoutError(self):
+        assert isinstance(self.fut.exception(), asyncio.TimeoutError)
+
+    def it_should_forget_the_call(self):
+        assert self.client._calls == {}
+
+
+class WhenTheChannelOfAnRpcClientIsClosed(RpcClientContext):
+    def given_a_call(self):
+        self.fut = self.client.call('', 'service', asynqp.Message('request'))
+
+    def when_the_server_closes_the_channel(self):
+        self.server.send_method(self.channel.id, spec.ChannelClose(404, 'not found', 50, 10))
+        self.tick()
+
+    def it_should_fail_the_call(self):
+        assert isinstance(self.fut.exception(), asynqp.NotFound)
+
+
+class RpcServerContext(QueueContext):
+    def given_an_rpc_server(self):
+        self.handled = []
+        self.gates = {}
+        task = asyncio.async(self.channel.rpc_server(self.queue, self.handler, concurrency=2))
+        self.tick()
+        self.server.send_method(self.channel.id, spec.BasicQosOK())
+        self.server.send_method(self.channel.id, spec.BasicConsumeOK('server.tag'))
+        self.rpc_server = task.result()
+        self.server.reset()
+
+    def request(self, tag, body, correlation_id='abc'):
+        msg = asynqp.Message(body, reply_to='reply.queue', correlation_id=correlation_id)
+        self.server.send_method(self.channel.id, spec.BasicDeliver('server.tag', tag, False, '', 'my.nice.queue'))
+        header = message.get_header_payload(msg, spec.BasicGet.method_type[0])
+        self.server.send_frame(frames.ContentHeaderFrame(self.channel.id, header))
+        body = message.get_frame_payloads(msg, 100)[0]
+        self.server.send_frame(frames.ContentBodyFrame(self.channel.id, body))
+        self.tick()
+
+    @asyncio.coroutine
+    def handler(self, msg):
+        self.handled.append(msg.body)
+        gate = self.gates.get(msg.body)
+        if gate is not None:
+            yield from gate
+        return b'reply to ' + msg.body
+
+
+class WhenStartingAnRpcServer(QueueContext):
+    def when_I_start_an_rpc_server(self):
+        self.async_partial(self.channel.rpc_server(self.queue, self.handler, concurrency=8))
+        self.server.send_method(self.channel.id, spec.BasicQosOK())
+
+    def it_should_limit_the_prefetch_to_the_concurrency(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicQos(0, 8, False))
+
+    def it_should_consume_the_queue(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.BasicConsume(0, 'my.nice.queue', '', False, False, False, False, {}))
+
+    @asyncio.coroutine
+    def handler(self, msg):
+        pass
+
+
+class WhenAnRpcServerAnswersARequest(RpcServerContext):
+    def when_a_request_arrives(self):
+        self.request(1, 'request')
+        self.tick()
+
+    def it_should_publish_the_reply_to_the_reply_to_address(self):
+        self.server.should_have_received_method(
+            self.channel.id, spec.BasicPublish(0, '', 'reply.queue', False, False))
+
+    def it_should_keep_the_correlation_id(self):
+        expected = asynqp.Message(b'reply to request', correlation_id='abc')
+        header = message.get_header_payload(expected, spec.BasicPublish.method_type[0])
+        self.server.should_have_received_frame(frames.ContentHeaderFrame(self.channel.id, header))
+
+    def it_should_write_the_reply_and_the_ack_at_once(self):
+        assert len(self.server.data) == 1
+        assert self.server.frames()[-1] == frames.MethodFrame(self.channel.id, spec.BasicAck(1, False))
+
+    def it_should_record_the_latency(self):
+        assert self.rpc_server.latency.count == 1
+
+
+class WhenAnRpcServerIsAtItsConcurrencyLimit(RpcServerContext):
+    def given_two_requests_being_handled(self):
+        self.gates = {b'first': asyncio.Future(), b'second': asyncio.Future()}
+        self.request(1, 'first')
+        self.request(2, 'second')
+
+    def when_a_third_request_arrives(self):
+        self.request(3, 'third')
+        self.tick()
+        self.waiting = list(self.handled)
+        self.gates[b'first'].set_result(None)
+        for _ in range(4):
+            self.tick()
+
+    def it_should_not_handle_the_third_request_yet(self):
+        assert self.waiting == [b'first', b'second']
+
+    def it_should_handle_it_once_a_slot_is_free(self):
+        assert self.handled == [b'first', b'second', b'third']
+
+    def it_should_ack_the_finished_requests(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(1, False))
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(3, False))
+        self.server.should_not_have_received_method(self.channel.id, spec.BasicAck(2, False))
+
+    def cleanup_the_handler(self):
+        self.gates[b'second'].set_result(None)
+        self.tick()
+
+
+class WhenAnRpcServerHandlerRaises(RpcServerContext):
+    def given_a_failing_handler(self):
+        self.loop.set_exception_handler(self.exception_handler)
+        self.gates = {b'request': asyncio.Future()}
+        self.gates[b'request'].set_exception(ValueError())
+
+    def when_a_request_arrives(self):
+        self.request(1, 'request')
+        self.tick()
+
+    def it_should_reject_the_request(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicReject(1, False))
+
+    def it_should_not_reply(self):
+        self.server.should_not_have_received_method(
+            self.channel.id, spec.BasicPublish(0, '', 'reply.queue', False, False))
+
+    def it_should_report_the_exception(self):
+        assert isinstance(self.exceptions[0], ValueError)
+
+    def cleanup_the_exception_handler(self):
+        self.loop.set_exception_handler(testing_exception_handler)
+
+
+class WhenLatenciesAreRecorded(object):
+    def given_a_histogram(self):
+        self.histogram = asynqp.LatencyHistogram()
+
+    def when_I_record_some_latencies(self):
+        for latency in [0.001] * 98 + [0.5, 20]:
+            self.histogram.record(latency)
+
+    def it_should_count_them(self):
+        assert self.histogram.count == 100
+        assert sum(self.histogram.counts) == 100
+
+    def it_should_find_the_bucket_of_a_percentile(self):
+        assert self.histogram.percentile(50) == 0.001
+
+    def it_should_have_no_bound_above_the_last_bucket(self):
+        assert self.histogram.percentile(100) is None
@@ -0,0 +1,114 @@
+import os
+import pickle
+from asynqp import spec
+from asynqp import sharedmem
+from .queue_tests import ExecutorConsumerContext, InlineProcessPoolExecutor
+
+
+class WhenReleasingASharedMemorySegment:
+    def given_a_pool_with_a_segment_in_use(self):
+        self.pool = sharedmem.SharedMemoryPool()
+        self.segment = self.pool.acquire(5000)
+
+    def when_I_release_the_segment_and_acquire_one_of_a_similar_size(self):
+        self.pool.release(self.segment)
+        self.result = self.pool.acquire(6000)
+
+    def it_should_reuse_the_segment(self):
+        assert self.result is self.segment
+
+    def it_should_be_big_enough(self):
+        assert self.result.size >= 6000
+
+    def cleanup_the_pool(self):
+        self.pool.release(self.result)
+        self.pool.close()
+
+
+class WhenReleasingMoreSegmentsThanThePoolKeeps:
+    def given_a_pool_which_keeps_one_free_segment(self):
+        self.pool = sharedmem.SharedMemoryPool(max_free=1)
+        self.segments = [self.pool.acquire(100), self.pool.acquire(100)]
+
+    def when_I_release_both(self):
+        for segment in self.segments:
+            self.pool.release(segment)
+
+    def it_should_keep_one(self):
+        assert self.pool._free[4096] == [self.segments[0]]
+
+    def it_should_unlink_the_other(self):
+        assert not os.path.exists(self.segments[1].name)
+
+    def cleanup_the_pool(self):
+        self.pool.close()
+
+
+class WhenPicklingASharedBody:
+    def given_a_segment_with_a_body(self):
+        self.pool = sharedmem.SharedMemoryPool()
+        self.segment = self.pool.acquire(5)
+        self.segment.buf[:5] = b'hello'
+
+    def when_I_pickle_a_handle_and_open_the_segment(self):
+        handle = pickle.loads(pickle.dumps(sharedmem.SharedBody(self.segment.name, 5)))
+        segment, view = handle.open()
+        self.result = bytes(view)
+        view.release()
+        segment.close()
+
+    def it_should_see_the_body(self):
+        assert self.result == b'hello'
+
+    def cleanup_the_pool(self):
+        self.pool.release(self.segment)
+        self.pool.close()
+
+
+def shared_body_handler(msg):
+    shared_body_handler.received.append((type(msg.body), bytes(msg.body)))
+
+
+class WhenAnExecutorConsumerHandsALargeBodyToAProcessPool(ExecutorConsumerContext):
+    def given_an_executor_consumer_with_a_shared_memory_pool(self):
+        shared_body_handler.received = []
+        self.pool = sharedmem.SharedMemoryPool(threshold=10, max_free=1)
+        self.executor = InlineProcessPoolExecutor(1)
+        self.consumer = self.start_executor_consumer(
+            shared_body_handler, self.executor, shared_memory=self.pool)
+
+    def when_a_large_message_is_handled(self):
+        self.body = b'x' * 100
+        self.deliver_msg(123, self.body)
+        self.join()
+
+    def it_should_pass_the_body_through_shared_memory(self):
+        assert shared_body_handler.received == [(memoryview, self.body)]
+
+    def it_should_ack_the_message(self):
+        self.server.should_have_received_method(self.channel.id, spec.BasicAck(123, False))
+
+    def it_should_return_the_segment_to_the_pool(self):
+        assert self.pool._free_count == 1
+
+    def cleanup_the_pool(self):
+        self.pool.close()
+
+
+class WhenAnExecutorConsumerHandsASmallBodyToAProcessPool(ExecutorConsumerContext):
+    def given_an_executor_consumer_with_a_shared_memory_pool(self):
+        shared_body_handler.received = []
+        self.pool = sharedmem.SharedMemoryPool(threshold=10)
+        self.executor = InlineProcessPoolExecutor(1)
+        self.consumer = self.start_executor_consumer(
+            shared_body_handler, self.executor, shared_memory=self.pool)
+
+    def when_a_small_message_is_handled(self):
+        self.deliver_msg(123, b'small')
+        self.join()
+
+    def it_should_pass_the_body_as_bytes(self):
+        assert shared_body_handler.received == [(bytes, b'small')]
+
+    def cleanup_the_pool(self):
+        self.pool.close()
@@ -2,7 +2,7 @@ import asyncio
 from contextlib import contextmanager
 from unittest import mock
 import asynqp.frames
-from asynqp import protocol
+from asynqp import protocol, spec
 from asynqp.exceptions import ConnectionLostError
 
 
@@ -38,9 +38,12 @@ class MockServer(object):
     def reset(self):
         self.data = []
 
+    def frames(self):
+        """ All frames received, several frames may arrive in one write """
+        return [frame for data in self.data for frame in read_all(data)]
+
     def should_have_received_frames(self, expected_frames, any_order=False):
-        results = (read(x) for x in self.data)
-        frames = [x for x in results if x is not None]
+        frames = self.frames()
         if any_order:
             for frame in expected_frames:
                 assert frame in frames, "{} should have been in {}".format(frame, frames)
@@ -59,8 +62,7 @@ class MockServer(object):
         self.should_have_received_methods(channel_number, [method], any_order=True)
 
     def should_not_have_received_method(self, channel_number, method):
-        results = (read(x) for x in self.data)
-        frames = [x for x in results if x is not None]
+        frames = self.frames()
 
         frame = asynqp.frames.MethodFrame(channel_number, method)
         assert frame not in frames, "{} should not have been in {}".format(frame, frames)
@@ -76,10 +78,17 @@ def read(data):
     if data == b'AMQP\x00\x00\x09\x01':
         return
 
-    result = protocol.FrameReader().read_frame(data)
-    if result is None:
+    received = protocol.FrameReader().read_frames(data)
+    if not received:
         return
-    return result[0]
+    return received[0]
+
+
+def read_all(data):
+    if data == b'AMQP\x00\x00\x09\x01':
+        return
+
+    yield from protocol.FrameReader().read_frames(data)
 
 
 def windows(l, size):
@@ -90,10 +99,17 @@ class FakeTransport(object):
     def __init__(self, server):
         self.server = server
         self.closed = False
+        self.reading_paused = False
 
     def write(self, data):
         self.server.data.append(data)
 
+    def pause_reading(self):
+        self.reading_paused = True
+
+    def resume_reading(self):
+        self.reading_paused = False
+
     def close(self):
         self.closed = True
 
@@ -120,3 +136,102 @@ def silence_expected_destroy_pending_log(expected_coro_name=''):
 
     with mock.patch.object(asyncio, 'async', async):
         yield
+
+
+class FakeBroker(object):
+    """
+    A transport which answers like a broker would, so a whole connection can
+    be driven without scripting every frame.
+    Records every method it receives in `methods` as (channel id, method) pairs.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.protocol = None
+        self.reader = protocol.FrameReader()
+        self.methods = []
+        self.closed = False
+        self.reading_paused = False
+        self._generated = 0
+
+    def connect(self, protocol):
+        self.protocol = protocol
+        protocol.connection_made(self)
+
+    def write(self, data):
+        if data.startswith(b'AMQP'):
+            self.reply(0, spec.ConnectionStart(0, 9, {}, 'PLAIN AMQPLAIN', 'en_US'))
+            return
+        for frame in self.reader.read_frames(data):
+            if isinstance(frame, asynqp.frames.MethodFrame):
+                self.methods.append((frame.channel_id, frame.payload))
+                self.answer(frame.channel_id, frame.payload)
+
+    def pause_reading(self):
+        self.reading_paused = True
+
+    def resume_reading(self):
+        self.reading_paused = False
+
+    def close(self):
+        self.closed = True
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def lose_connection(self):
+        self.closed = True
+        try:
+            self.protocol.connection_lost(ConnectionResetError())
+        except ConnectionLostError:
+            pass
+
+    def received(self, method_type):
+        return [(c, m) for c, m in self.methods if isinstance(m, method_type)]
+
+    def answer(self, channel_id, method):
+        if 'no_wait' in method.fields and method.no_wait.value:
+            return
+        if isinstance(method, spec.ConnectionStartOK):
+            reply = spec.ConnectionTune(0, 131072, 0)
+        elif isinstance(method, spec.ConnectionOpen):
+            reply = spec.ConnectionOpenOK('')
+        elif isinstance(method, spec.ConnectionClose):
+            reply = spec.ConnectionCloseOK()
+        elif isinstance(method, spec.ChannelOpen):
+            reply = spec.ChannelOpenOK('')
+        elif isinstance(method, spec.ChannelClose):
+            reply = spec.ChannelCloseOK()
+        elif isinstance(method, spec.ExchangeDeclare):
+            reply = spec.ExchangeDeclareOK()
+        elif isinstance(method, spec.QueueDeclare):
+            name = method.queue
+            if not name:
+                self._generated += 1
+                name = 'amq.gen-{}'.format(self._generated)
+            reply = spec.QueueDeclareOK(name, 0, 0)
+        elif isinstance(method, spec.QueueBind):
+            reply = spec.QueueBindOK()
+        elif isinstance(method, spec.QueueUnbind):
+            reply = spec.QueueUnbindOK()
+        elif isinstance(method, spec.QueueDelete):
+            reply = spec.QueueDeleteOK(0)
+        elif isinstance(method, spec.ExchangeDelete):
+            reply = spec.ExchangeDeleteOK()
+        elif isinstance(method, spec.BasicQos):
+            reply = spec.BasicQosOK()
+        elif isinstance(method, spec.BasicConsume):
+            self._generated += 1
+            reply = spec.BasicConsumeOK('ctag-{}'.format(self._generated))
+        elif isinstance(method, spec.BasicCancel):
+            reply = spec.BasicCancelOK(method.consumer_tag)
+        else:
+            return
+        self.reply(channel_id, reply)
+
+    def reply(self, channel_id, method):
+        data = asynqp.frames.MethodFrame(channel_id, method).serialise()
+        self.loop.call_soon(self._deliver, data)
+
+    def _deliver(self, data):
+        if not self.closed:
+            self.protocol.data_received(data)